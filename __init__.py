@@ -1,9 +1,165 @@
+import os
+
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
-from flask_restful import Api
 
-app = Flask(__name__)
-api = Api(app)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///database.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db = SQLAlchemy(app)
+db = SQLAlchemy()
+
+DEFAULT_CONFIG = {
+	'SQLALCHEMY_DATABASE_URI': None,
+	'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+	'CREATE_TABLES': False,
+	'VIDEO_STORAGE': 'sqlalchemy',
+	'VIDEO_COUNTER_LAYOUT': 'inline',
+	'VIDEO_SHARDS': 4,
+	'VIDEO_SHARD_PATH': 'shard-{}.db',
+	'VIDEO_CACHE_SERVER': None,
+	'VIDEO_CACHE_TTL': 300,
+	'VIDEO_CACHE_POOL_SIZE': 8,
+	'VIDEO_CACHE_LEASE_TTL': 10,
+	'SLOW_QUERY_THRESHOLD_MS': 100,
+	'SLOW_QUERY_LOG': 'slow_queries.log',
+	'SLOW_QUERY_LOG_MAX_BYTES': 10 * 1024 * 1024,
+	'SLOW_QUERY_LOG_BACKUPS': 5,
+	'ADMIN_TOKEN': None,
+	'QUERY_BUDGET_ENFORCE': None,
+	'VIDEO_HISTORY': False,
+	'HISTORY_FLUSH_INTERVAL': 5,
+	'HISTORY_ROLLUP_INTERVAL': 60,
+	'HISTORY_MINUTE_RETENTION': 2 * 24 * 60 * 60,
+	'HISTORY_HOUR_RETENTION': 90 * 24 * 60 * 60,
+	'SQLITE_WAL': False,
+	'ADMISSION_CONTROL': False,
+	'ADMISSION_READ_LIMIT': 64,
+	'ADMISSION_WRITE_LIMIT': 16,
+	'ADMISSION_MAX_QUEUE': 128,
+	'ADMISSION_QUEUE_TIMEOUT_MS': 100,
+	'ADMISSION_RETRY_AFTER': 1,
+	'RATE_LIMIT': False,
+	'RATE_LIMIT_READ': (50, 100),
+	'RATE_LIMIT_WRITE': (10, 20),
+	'RATE_LIMIT_SQLITE_PATH': None,
+	'RATE_LIMIT_API_KEYS': None,
+	'DB_MAINTENANCE_INTERVAL': None,
+	'DB_MAINTENANCE_BUDGET_MS': 200,
+	'DB_MAINTENANCE_IDLE_REQUESTS': 10,
+	'SERVER_TIMING_SAMPLE_RATE': 0.0,
+	'PROFILING': False,
+	'PROFILE_SAMPLE_RATE': 0.0,
+	'PROFILE_MODE': 'sample',
+	'PROFILE_DIR': 'profiles',
+	'PROFILE_INTERVAL_MS': 5,
+	'PROFILE_FLUSH_INTERVAL': 10,
+	'ACCESS_LOG': None,
+	'ACCESS_LOG_MAX_BYTES': 10 * 1024 * 1024,
+	'ACCESS_LOG_BACKUPS': 5,
+	'ACCESS_LOG_QUEUE_SIZE': 10000,
+	'ACCESS_LOG_BATCH_SIZE': 512,
+	'ACCESS_LOG_FLUSH_INTERVAL': 1.0,
+	'CAPTURE_TRAFFIC': False,
+	'CAPTURE_PATH': 'traffic.jsonl',
+	'CAPTURE_SAMPLE_RATE': 0.01,
+	'CAPTURE_MAX_BODY': 64 * 1024,
+	'CAPTURE_MAX_BYTES': 100 * 1024 * 1024,
+	'CAPTURE_BACKUPS': 1,
+	'TRACING': False,
+	'TRACE_SAMPLE_RATE': 0.01,
+	'TRACE_SLOW_MS': 250,
+	'TRACE_TRUSTED_PEERS': (),
+	'TRACE_EXPORT': 'traces.jsonl',
+	'TRACE_MAX_BYTES': 10 * 1024 * 1024,
+	'TRACE_BACKUPS': 5,
+	'TRACE_BATCH_SIZE': 256,
+	'TRACE_FLUSH_INTERVAL': 1.0,
+	'TRACE_QUEUE_SIZE': 10000,
+	'METRICS': False,
+	'METRICS_DIR': None,
+	'METRICS_FLUSH_INTERVAL': 5,
+}
+
+
+def create_app(config=None, instance_path=None):
+	"""Build an isolated app with its own engines, caches and background jobs.
+
+	Settings are layered: ``DEFAULT_CONFIG``, then the file named by
+	``FLASK_REST_API_SETTINGS``, then ``config``. Runtime files such as the
+	slow query log go in the instance folder, ``instance_path`` if given.
+	Without ``SQLALCHEMY_DATABASE_URI`` a testing app gets a private in-memory
+	database, a debug app ``database.db`` in its instance folder, and only
+	production apps the ``database.db`` next to the package.
+	"""
+	app = Flask(__name__, instance_path=instance_path)
+	app.config.update(DEFAULT_CONFIG)
+	app.config.from_envvar('FLASK_REST_API_SETTINGS', silent=True)
+	if config:
+		app.config.update(config)
+	if not app.config['SQLALCHEMY_DATABASE_URI']:
+		app.config['SQLALCHEMY_DATABASE_URI'] = default_database_uri(app)
+	db.init_app(app)
+
+	from Flask_Rest_API import core
+	core.init_app(app)
+
+	if app.config['CREATE_TABLES']:
+		with app.app_context():
+			db.create_all()
+	return app
+
+
+def default_database_uri(app):
+	if app.testing:
+		return 'sqlite://'
+	if app.debug:
+		return 'sqlite:///' + instance_file(app, 'database.db')
+	return 'sqlite:///database.db'
+
+
+def instance_file(app, path):
+	"""``path`` resolved against the app's instance folder, which is created if needed."""
+	path = os.path.join(app.instance_path, path)
+	os.makedirs(os.path.dirname(path), exist_ok=True)
+	return path
+
+
+def _engines(app):
+	from Flask_Rest_API.storage import get_engines
+	with app.app_context():
+		return get_engines(app)
+
+
+def pre_fork(app):
+	"""Call in the parent before forking workers from a preloaded app."""
+	for extension in list(app.extensions.values()):
+		if hasattr(extension, 'pre_fork'):
+			extension.pre_fork()
+	for engine in _engines(app):
+		engine.dispose()
+
+
+def post_fork(app):
+	"""Call in each worker after fork so it opens its own connections."""
+	for engine in _engines(app):
+		engine.dispose()
+	for extension in list(app.extensions.values()):
+		if hasattr(extension, 'post_fork'):
+			extension.post_fork()
+
+
+def worker_exit(app):
+	"""Call in a worker before it exits to stop background jobs."""
+	for extension in list(app.extensions.values()):
+		if hasattr(extension, 'stop'):
+			extension.stop()
+
+
+_app = None
+
+
+def __getattr__(name):
+	# ``Flask_Rest_API.app`` is created on first use rather than at import time.
+	global _app
+	if name == 'app':
+		if _app is None:
+			_app = create_app()
+		return _app
+	raise AttributeError("module %r has no attribute %r" % (__name__, name))
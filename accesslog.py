@@ -0,0 +1,172 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+from flask import g, request
+
+from Flask_Rest_API import instance_file
+
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class JSONLWriter(object):
+	"""Appends JSON records to a file from a background thread.
+
+	Records wait in a bounded queue and are written in batches of up to
+	``batch_size``; the file is rotated at ``max_bytes`` keeping ``backups``
+	old files. When the queue is full records are dropped and counted, and
+	the count is written as a ``{"dropped": n}`` line. ``{pid}`` in the path
+	is replaced by the process id, so pre-fork workers never share a file.
+	``stop()`` writes what is still queued before the process exits.
+	"""
+
+	def __init__(self, path, max_bytes=0, backups=0, batch_size=512, flush_interval=1.0, max_queue=10000):
+		self.template = path
+		self.max_bytes = max_bytes
+		self.backups = backups
+		self.batch_size = batch_size
+		self.flush_interval = flush_interval
+		self.max_queue = max_queue
+		self.post_fork()
+
+	def post_fork(self):
+		self.path = self.template.replace('{pid}', str(os.getpid()))
+		self.queue = queue.Queue(self.max_queue)
+		self.dropped = 0
+		self.reported = 0
+		self.stream = None
+		self.thread = None
+		self.lock = threading.Lock()
+
+	def put(self, record):
+		if self.thread is None:
+			self.start()
+		try:
+			self.queue.put_nowait(record)
+		except queue.Full:
+			self.dropped += 1
+
+	def start(self):
+		with self.lock:
+			if self.thread is None:
+				self.thread = threading.Thread(target=self.run_forever, name='jsonl-writer', daemon=True)
+				self.thread.start()
+
+	def stop(self):
+		with self.lock:
+			if self.thread is not None:
+				# Blocks only while the thread drains a full queue.
+				self.queue.put(_STOP)
+				self.thread.join()
+				self.thread = None
+			if self.stream is not None:
+				self.stream.close()
+				self.stream = None
+
+	def run_forever(self):
+		stopping = False
+		while not stopping:
+			try:
+				batch = [self.queue.get(timeout=self.flush_interval)]
+			except queue.Empty:
+				batch = []
+			while len(batch) < self.batch_size:
+				try:
+					batch.append(self.queue.get_nowait())
+				except queue.Empty:
+					break
+			if any(record is _STOP for record in batch):
+				stopping = True
+				batch = [record for record in batch if record is not _STOP]
+			dropped = self.dropped
+			if dropped != self.reported:
+				batch.append({'time': time.time(), 'dropped': dropped - self.reported})
+				self.reported = dropped
+			if batch:
+				try:
+					self.write(batch)
+				except Exception:
+					logger.exception("Writing %d records to %s failed", len(batch), self.path)
+
+	def write(self, batch):
+		if self.stream is None:
+			self.stream = open(self.path, 'a')
+		self.stream.write(''.join(json.dumps(record) + '\n' for record in batch))
+		self.stream.flush()
+		if self.max_bytes and self.stream.tell() >= self.max_bytes:
+			self.rotate()
+
+	def rotate(self):
+		self.stream.close()
+		self.stream = None
+		if self.backups:
+			for i in range(self.backups - 1, 0, -1):
+				if os.path.exists('%s.%d' % (self.path, i)):
+					os.replace('%s.%d' % (self.path, i), '%s.%d' % (self.path, i + 1))
+			os.replace(self.path, self.path + '.1')
+		else:
+			os.remove(self.path)
+
+
+class AccessLog(object):
+	"""Structured JSON access log written off the request path.
+
+	Each response queues one record (route, video_id, status, latency, query
+	count, bytes) for a ``JSONLWriter`` on ``ACCESS_LOG``, relative to the
+	instance folder, so a slow disk never adds latency to requests; see
+	``JSONLWriter`` for batching, rotation and drop accounting. Pre-fork
+	workers should put ``{pid}`` in the path: workers sharing one file
+	interleave their batches and rotate it under each other.
+	"""
+
+	def __init__(self, app=None):
+		self.writer = None
+		if app is not None:
+			self.init_app(app)
+
+	def init_app(self, app):
+		path = app.config.get('ACCESS_LOG')
+		if not path:
+			return
+		self.writer = JSONLWriter(instance_file(app, path),
+			max_bytes=app.config.get('ACCESS_LOG_MAX_BYTES', 10 * 1024 * 1024),
+			backups=app.config.get('ACCESS_LOG_BACKUPS', 5),
+			batch_size=app.config.get('ACCESS_LOG_BATCH_SIZE', 512),
+			flush_interval=app.config.get('ACCESS_LOG_FLUSH_INTERVAL', 1.0),
+			max_queue=app.config.get('ACCESS_LOG_QUEUE_SIZE', 10000))
+		# Werkzeug's own per-request line would duplicate every record.
+		logging.getLogger('werkzeug').setLevel(logging.WARNING)
+		app.before_request(self.start_request)
+		app.after_request(self.log_request)
+		app.extensions['access_log'] = self
+
+	def post_fork(self):
+		self.writer.post_fork()
+
+	def stop(self):
+		self.writer.stop()
+
+	def start_request(self):
+		g.access_log_start = time.perf_counter()
+
+	def log_request(self, response):
+		start = g.get('access_log_start')
+		self.writer.put({
+			'time': time.time(),
+			'method': request.method,
+			'route': request.url_rule.rule if request.url_rule else None,
+			'path': request.path,
+			'video_id': (request.view_args or {}).get('video_id'),
+			'status': response.status_code,
+			'latency_ms': round((time.perf_counter() - start) * 1000, 3) if start is not None else None,
+			'queries': g.get('query_count', 0),
+			'bytes': response.calculate_content_length(),
+			'remote_addr': request.remote_addr,
+		})
+		return response
@@ -0,0 +1,53 @@
+import hmac
+from functools import wraps
+
+from flask import current_app, request
+from flask_restful import Resource, abort
+
+
+def is_admin():
+	token = current_app.config.get('ADMIN_TOKEN')
+	return bool(token) and hmac.compare_digest(request.headers.get('X-Admin-Token', ''), token)
+
+
+def admin_required(f):
+	@wraps(f)
+	def wrapper(*args, **kwargs):
+		if not is_admin():
+			abort(403, message="Admin token required")
+		return f(*args, **kwargs)
+	return wrapper
+
+
+class SlowQueries(Resource):
+	method_decorators = [admin_required]
+
+	def get(self):
+		slow_query_log = current_app.extensions.get('slow_query_log')
+		if not slow_query_log:
+			abort(404, message="Slow query log is disabled")
+		return {
+			'threshold_ms': slow_query_log.threshold_ms,
+			'path': slow_query_log.path,
+			'queries': list(slow_query_log.recent),
+		}
+
+
+class DatabaseStats(Resource):
+	method_decorators = [admin_required]
+
+	def get(self):
+		scheduler = current_app.extensions.get('db_maintenance')
+		if not scheduler:
+			abort(404, message="Database maintenance is not available for this engine")
+		return scheduler.stats()
+
+
+class AdmissionStats(Resource):
+	method_decorators = [admin_required]
+
+	def get(self):
+		controller = current_app.extensions.get('admission')
+		if not controller:
+			abort(404, message="Admission control is disabled")
+		return controller.stats()
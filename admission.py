@@ -0,0 +1,126 @@
+import json
+import re
+import threading
+import time
+
+LOW, NORMAL, HIGH = 0, 1, 2
+
+# Share of the queue each priority may occupy; lower priorities are shed first.
+QUEUE_SHARE = {LOW: 0.25, NORMAL: 0.75, HIGH: 1.0}
+
+DEFAULT_PRIORITIES = [
+	(r'^/admin/', HIGH),
+	(r'^/videos$', LOW),
+	(r'^/video/\d+/history$', LOW),
+]
+
+READ_METHODS = frozenset(('GET', 'HEAD', 'OPTIONS'))
+
+
+class _Budget(object):
+	def __init__(self, limit, max_queue):
+		self.limit = limit
+		self.max_queue = max_queue
+		self.in_flight = 0
+		self.queued = 0
+		self.admitted = 0
+		self.shed = 0
+		self.cond = threading.Condition()
+
+	def acquire(self, timeout, priority):
+		with self.cond:
+			if self.in_flight < self.limit and not self.queued:
+				self.in_flight += 1
+				self.admitted += 1
+				return True
+			if self.queued >= self.max_queue * QUEUE_SHARE[priority]:
+				self.shed += 1
+				return False
+			self.queued += 1
+			deadline = time.monotonic() + timeout
+			try:
+				while self.in_flight >= self.limit:
+					remaining = deadline - time.monotonic()
+					if remaining <= 0:
+						self.shed += 1
+						return False
+					self.cond.wait(remaining)
+				self.in_flight += 1
+				self.admitted += 1
+				return True
+			finally:
+				self.queued -= 1
+
+	def release(self):
+		with self.cond:
+			self.in_flight -= 1
+			self.cond.notify()
+
+	def stats(self):
+		with self.cond:
+			return {'limit': self.limit, 'in_flight': self.in_flight, 'queued': self.queued,
+				'admitted': self.admitted, 'shed': self.shed}
+
+
+class AdmissionController(object):
+	"""WSGI middleware limiting concurrent reads and writes.
+
+	Requests over a budget's concurrency limit wait in a queue for at most
+	``queue_timeout`` seconds and are answered with 503 and ``Retry-After``
+	when that target is exceeded or their priority's share of the queue is
+	full. Rejections happen before Flask sees the request, so no argument
+	parsing or DB work is spent on them.
+	"""
+
+	def __init__(self, app, read_limit=64, write_limit=16, max_queue=128, queue_timeout=0.1,
+			retry_after=1, priorities=None):
+		self.app = app
+		self.budgets = {'read': _Budget(read_limit, max_queue), 'write': _Budget(write_limit, max_queue)}
+		self.queue_timeout = queue_timeout
+		self.retry_after = str(retry_after)
+		self.priorities = [(re.compile(pattern), priority) for pattern, priority in
+			(DEFAULT_PRIORITIES if priorities is None else priorities)]
+
+	def priority(self, path):
+		for pattern, priority in self.priorities:
+			if pattern.match(path):
+				return priority
+		return NORMAL
+
+	def __call__(self, environ, start_response):
+		priority = self.priority(environ.get('PATH_INFO', ''))
+		budget = self.budgets['read' if environ['REQUEST_METHOD'] in READ_METHODS else 'write']
+		timeout = self.queue_timeout * QUEUE_SHARE[priority]
+		if not budget.acquire(timeout, priority):
+			body = json.dumps({'message': "Server is overloaded, retry later"}).encode()
+			start_response('503 SERVICE UNAVAILABLE', [
+				('Content-Type', 'application/json'),
+				('Content-Length', str(len(body))),
+				('Retry-After', self.retry_after),
+			])
+			return [body]
+		# Flask builds the whole response body inside the call, so the slot can
+		# be freed as soon as it returns.
+		try:
+			return self.app(environ, start_response)
+		finally:
+			budget.release()
+
+	def stats(self):
+		return dict((name, budget.stats()) for name, budget in self.budgets.items())
+
+
+def init_app(app):
+	if not app.config.get('ADMISSION_CONTROL'):
+		return
+	controller = AdmissionController(
+		app.wsgi_app,
+		read_limit=app.config.get('ADMISSION_READ_LIMIT', 64),
+		write_limit=app.config.get('ADMISSION_WRITE_LIMIT', 16),
+		max_queue=app.config.get('ADMISSION_MAX_QUEUE', 128),
+		queue_timeout=app.config.get('ADMISSION_QUEUE_TIMEOUT_MS', 100) / 1000.0,
+		retry_after=app.config.get('ADMISSION_RETRY_AFTER', 1),
+		priorities=app.config.get('ADMISSION_PRIORITIES'),
+	)
+	app.wsgi_app = controller
+	app.extensions['admission'] = controller
@@ -0,0 +1,282 @@
+"""asyncio-native serving of the Video endpoints.
+
+    python -m Flask_Rest_API.asgi --bind 127.0.0.1:8001
+
+``VideoASGI`` is an ASGI 3 application for ``/video/<id>`` that keeps tens of
+thousands of slow connections open without a thread each. Validation
+(``core.video_*_args``), serialization (``core.resource_fields``) and storage
+(the app's repository over ``VideoModel``) are the same as in the Flask app.
+Blocking repository calls run on a bounded thread pool, with writes
+serialized through a single-writer executor so SQLite never contends for its
+write lock. The Flask app's background jobs (view history flushing, database
+maintenance, metrics snapshots) start on ``lifespan.startup`` and stop on
+``lifespan.shutdown``, since no Flask request ever triggers them here.
+
+It runs under uvicorn when that is installed, or on the small HTTP/1.1 server
+below.
+"""
+import argparse
+import asyncio
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, unquote
+
+from flask_restful import marshal
+from werkzeug.exceptions import InternalServerError
+
+from Flask_Rest_API import create_app, worker_exit
+from Flask_Rest_API.core import resource_fields, update_values, update_video, video_put_args, video_update_args
+from Flask_Rest_API.storage import VideoExists, get_repository
+from Flask_Rest_API.validation import ValidationError
+
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY = 64 * 1024
+
+
+class HTTPError(Exception):
+	def __init__(self, status, message):
+		Exception.__init__(self, message)
+		self.status = status
+		self.message = message
+
+
+class VideoASGI(object):
+	def __init__(self, app=None, max_workers=16, single_writer=True):
+		self.app = app or create_app()
+		self.readers = ThreadPoolExecutor(max_workers, thread_name_prefix='asgi-db')
+		self.writers = ThreadPoolExecutor(1, thread_name_prefix='asgi-writer') if single_writer else self.readers
+
+	def _in_app(self, fn, *args):
+		with self.app.app_context():
+			return fn(*args)
+
+	async def run(self, executor, fn, *args):
+		return await asyncio.get_running_loop().run_in_executor(executor, self._in_app, fn, *args)
+
+	async def __call__(self, scope, receive, send):
+		if scope['type'] == 'lifespan':
+			await self.lifespan(receive, send)
+			return
+		if scope['type'] != 'http':
+			return
+		try:
+			status, payload = await self.dispatch(scope, receive)
+		except HTTPError as e:
+			status, payload = e.status, {'message': e.message}
+		except Exception:
+			# Answered like Flask-RESTful answers an unhandled exception.
+			logger.exception("Exception on %s [%s]", scope['path'], scope['method'])
+			status, payload = 500, {'message': InternalServerError.description}
+		body = json.dumps(payload).encode()
+		await send({'type': 'http.response.start', 'status': status, 'headers': [
+			(b'content-type', b'application/json'),
+			(b'content-length', str(len(body)).encode()),
+		]})
+		await send({'type': 'http.response.body', 'body': body})
+
+	async def lifespan(self, receive, send):
+		while True:
+			message = await receive()
+			if message['type'] == 'lifespan.startup':
+				await self.startup()
+				await send({'type': 'lifespan.startup.complete'})
+			elif message['type'] == 'lifespan.shutdown':
+				await self.shutdown()
+				await send({'type': 'lifespan.shutdown.complete'})
+				return
+
+	async def startup(self):
+		# The jobs the Flask app starts from before_first_request.
+		self.app.try_trigger_before_first_request_functions()
+
+	async def shutdown(self):
+		worker_exit(self.app)
+		self.readers.shutdown(wait=True)
+		self.writers.shutdown(wait=True)
+
+	async def dispatch(self, scope, receive):
+		parts = scope['path'].strip('/').split('/')
+		if len(parts) != 2 or parts[0] != 'video' or not parts[1].isdigit():
+			raise HTTPError(404, "The requested URL was not found on the server.")
+		video_id = int(parts[1])
+		method = scope['method']
+		if method == 'GET':
+			return 200, await self.get(video_id)
+		if method in ('PUT', 'PATCH'):
+			data = await self.read_args(scope, receive)
+			if method == 'PUT':
+				return 201, await self.put(video_id, data)
+			return 200, await self.patch(video_id, data)
+		raise HTTPError(405, "The method is not allowed for the requested URL.")
+
+	async def read_args(self, scope, receive):
+		headers = dict(scope['headers'])
+		length = headers.get(b'content-length', b'')
+		if length.isdigit() and int(length) > MAX_BODY:
+			raise HTTPError(413, "Request body too large")
+		body = b''
+		while True:
+			message = await receive()
+			body += message.get('body', b'')
+			if len(body) > MAX_BODY:
+				raise HTTPError(413, "Request body too large")
+			if not message.get('more_body'):
+				break
+		if headers.get(b'content-type', b'').split(b';')[0].strip() == b'application/json':
+			try:
+				data = json.loads(body or b'null')
+			except ValueError:
+				raise HTTPError(400, "Failed to decode JSON object")
+			if not isinstance(data, dict):
+				raise HTTPError(400, "Request body must be a JSON object")
+			return data
+		# Like request.values: query string first, then the form body.
+		data = dict(reversed(parse_qsl(body.decode('latin-1'), keep_blank_values=True)))
+		data.update(reversed(parse_qsl(scope['query_string'].decode('latin-1'), keep_blank_values=True)))
+		return data
+
+	def validate(self, schema, data):
+		try:
+			return schema.validate(data)
+		except ValidationError as e:
+			raise HTTPError(400, {e.field: e.message})
+
+	async def get(self, video_id):
+		result = await self.run(self.readers, lambda: get_repository().get(video_id))
+		if not result:
+			raise HTTPError(404, "Could not find video with that id")
+		return marshal(result, resource_fields)
+
+	async def put(self, video_id, data):
+		args = self.validate(video_put_args, data)
+
+		def create():
+			try:
+				return get_repository().create(video_id, args['name'], args['views'], args['likes'])
+			except VideoExists:
+				return None
+		video = await self.run(self.writers, create)
+		if not video:
+			raise HTTPError(409, "Video id taken...")
+		return marshal(video, resource_fields)
+
+	async def patch(self, video_id, data):
+		values = update_values(self.validate(video_update_args, data))
+		result = await self.run(self.writers, update_video, video_id, values)
+		if not result:
+			raise HTTPError(404, "Video doesn't exist, cannot update")
+		return marshal(result, resource_fields)
+
+
+def _error_response(writer, status, message):
+	body = json.dumps({'message': message}).encode()
+	writer.write(b'HTTP/1.1 %d \r\ncontent-type: application/json\r\ncontent-length: %d\r\nconnection: close\r\n\r\n%s'
+		% (status, len(body), body))
+
+
+async def _handle_connection(app, reader, writer):
+	try:
+		while True:
+			try:
+				head = await reader.readuntil(b'\r\n\r\n')
+			except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+				return
+			lines = head.decode('latin-1').split('\r\n')
+			request_line = lines[0].split(' ')
+			if len(request_line) != 3 or not request_line[2].startswith('HTTP/'):
+				_error_response(writer, 400, "Malformed request line")
+				await writer.drain()
+				return
+			method, target, version = request_line
+			headers = []
+			for line in lines[1:]:
+				if line:
+					name, _, value = line.partition(':')
+					headers.append((name.strip().lower().encode('latin-1'), value.strip().encode('latin-1')))
+			header_map = dict(headers)
+			# Bodies are only framed by Content-Length; check it before reading anything.
+			length = header_map.get(b'content-length', b'0')
+			error = None
+			if b'transfer-encoding' in header_map:
+				error = 411, "Content-Length required"
+			elif not length.isdigit():
+				error = 400, "Invalid Content-Length"
+			elif int(length) > MAX_BODY:
+				error = 413, "Request body too large"
+			if error:
+				_error_response(writer, *error)
+				await writer.drain()
+				return
+			try:
+				body = await reader.readexactly(int(length))
+			except (asyncio.IncompleteReadError, ConnectionError):
+				return
+			path, _, query = target.partition('?')
+			scope = {
+				'type': 'http',
+				'asgi': {'version': '3.0'},
+				'http_version': version[5:],
+				'method': method,
+				'path': unquote(path),
+				'raw_path': path.encode('latin-1'),
+				'query_string': query.encode('latin-1'),
+				'headers': headers,
+				'client': writer.get_extra_info('peername'),
+				'server': writer.get_extra_info('sockname'),
+			}
+			response = []
+
+			async def receive():
+				return {'type': 'http.request', 'body': body, 'more_body': False}
+
+			async def send(message):
+				response.append(message)
+
+			await app(scope, receive, send)
+			start, chunks = response[0], response[1:]
+			keep_alive = version == 'HTTP/1.1' and header_map.get(b'connection', b'').lower() != b'close'
+			out = [b'HTTP/1.1 %d \r\n' % start['status']]
+			out.extend(b'%s: %s\r\n' % (name, value) for name, value in start.get('headers', []))
+			out.append(b'connection: keep-alive\r\n\r\n' if keep_alive else b'connection: close\r\n\r\n')
+			out.extend(chunk.get('body', b'') for chunk in chunks)
+			writer.write(b''.join(out))
+			await writer.drain()
+			if not keep_alive:
+				return
+	finally:
+		writer.close()
+
+
+async def serve(app, host='127.0.0.1', port=8001, backlog=4096):
+	server = await asyncio.start_server(lambda r, w: _handle_connection(app, r, w), host, port, backlog=backlog)
+	# This server has no lifespan protocol of its own; run the app's hooks around it.
+	await app.startup()
+	try:
+		async with server:
+			await server.serve_forever()
+	finally:
+		await app.shutdown()
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Serve the Video API on asyncio")
+	parser.add_argument("--bind", default="127.0.0.1:8001")
+	parser.add_argument("--db-threads", type=int, default=16, help="Threads for blocking repository reads")
+	parser.add_argument("--builtin", action="store_true", help="Use the built-in server even if uvicorn is installed")
+	args = parser.parse_args()
+	host, _, port = args.bind.rpartition(':')
+	application = VideoASGI(max_workers=args.db_threads)
+	try:
+		if args.builtin:
+			raise ImportError
+		import uvicorn
+	except ImportError:
+		try:
+			asyncio.run(serve(application, host, int(port)))
+		except KeyboardInterrupt:
+			pass
+	else:
+		uvicorn.run(application, host=host, port=int(port), log_level='warning')
@@ -0,0 +1,115 @@
+"""Concurrent slow clients: pre-fork Flask server vs. the asyncio variant.
+
+    python -m Flask_Rest_API.benchmarks.connection_scaling --connections 100 1000 5000
+
+Every client opens a keep-alive connection, makes a request, holds the
+connection idle for ``--hold`` seconds (a mobile or long-poll client) and
+then makes a final request. Neither server spends a thread on an idle
+connection: ``serve.PooledWSGIServer`` parks it in a selector, and the
+asyncio server leaves it on the event loop. What is compared is the burst
+of requests arriving together. The Flask server runs each request whole on
+one of ``--threads`` pool threads, while the asyncio server parses and
+answers on the event loop and only hands storage calls to ``--threads``
+database threads. Time to first response shows how each server queues that
+burst. Keep ``--hold`` under the Flask server's keep-alive timeout (5
+seconds), or it closes the idle connections.
+"""
+import argparse
+import asyncio
+import os
+import resource
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+
+from Flask_Rest_API import db, models  # noqa: F401 registers the tables
+from Flask_Rest_API.benchmarks.serve_scaling import wait_until_up
+from Flask_Rest_API.benchmarks.stats import percentile
+
+
+SERVERS = {
+	'flask': lambda port, threads: [sys.executable, '-m', 'Flask_Rest_API.serve', '--bind', '127.0.0.1:%d' % port,
+		'--workers', '1', '--threads', str(threads)],
+	'asyncio': lambda port, threads: [sys.executable, '-m', 'Flask_Rest_API.asgi', '--bind', '127.0.0.1:%d' % port,
+		'--db-threads', str(threads)],
+}
+
+
+REQUEST = b'GET /video/1 HTTP/1.1\r\nHost: localhost\r\n%s\r\n'
+
+
+async def read_response(reader):
+	head = await reader.readuntil(b'\r\n\r\n')
+	length = 0
+	for line in head.split(b'\r\n'):
+		if line.lower().startswith(b'content-length:'):
+			length = int(line.split(b':', 1)[1])
+	await reader.readexactly(length)
+	return b' 200 ' in head.split(b'\r\n', 1)[0]
+
+
+async def slow_client(port, hold, timeout):
+	started = time.perf_counter()
+	try:
+		reader, writer = await asyncio.wait_for(asyncio.open_connection('127.0.0.1', port), timeout)
+		writer.write(REQUEST % b'')
+		ok = await asyncio.wait_for(read_response(reader), timeout)
+		first_response = time.perf_counter() - started
+		await asyncio.sleep(hold)
+		writer.write(REQUEST % b'Connection: close\r\n')
+		ok = await asyncio.wait_for(read_response(reader), timeout) and ok
+		writer.close()
+		return ok, first_response
+	except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+		return False, time.perf_counter() - started
+
+
+async def drive(port, connections, hold, timeout):
+	results = await asyncio.gather(*(slow_client(port, hold, timeout) for _ in range(connections)))
+	latencies = sorted(latency for ok, latency in results if ok)
+	return len(latencies), latencies
+
+
+def run(server, connections, args, root):
+	settings = os.path.join(root, 'settings.py')
+	with open(settings, 'w') as f:
+		f.write("SQLALCHEMY_DATABASE_URI = %r\n" % ('sqlite:///' + os.path.join(root, 'bench.db')))
+	env = dict(os.environ, FLASK_REST_API_SETTINGS=settings)
+	process = subprocess.Popen(SERVERS[server](args.port, args.threads), env=env, stderr=subprocess.DEVNULL)
+	try:
+		wait_until_up(args.port)
+		return asyncio.run(drive(args.port, connections, args.hold, args.timeout))
+	finally:
+		process.send_signal(signal.SIGTERM)
+		process.wait()
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--connections", type=int, nargs="+", default=[100, 1000, 5000])
+	parser.add_argument("--hold", type=float, default=1.0, help="Seconds each client keeps its connection idle")
+	parser.add_argument("--threads", type=int, default=16, help="Flask worker threads / asyncio DB threads")
+	parser.add_argument("--timeout", type=float, default=30)
+	parser.add_argument("--port", type=int, default=8766)
+	args = parser.parse_args()
+
+	soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+	resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+	root = tempfile.mkdtemp(prefix='conn-bench-')
+	try:
+		engine = create_engine('sqlite:///' + os.path.join(root, 'bench.db'))
+		db.metadata.create_all(engine)
+		engine.execute(models.VideoModel.__table__.insert().values(id=1, name='bench', views=1, likes=1))
+		print("%-8s %6s %6s %9s %9s" % ("server", "conns", "ok", "p50 TTFR", "p99 TTFR"))
+		for connections in args.connections:
+			for server in SERVERS:
+				ok, latencies = run(server, connections, args, root)
+				print("%-8s %6d %6d %9.2f %9.2f" % (server, connections, ok,
+					percentile(latencies, 0.5), percentile(latencies, 0.99)))
+	finally:
+		shutil.rmtree(root)
@@ -0,0 +1,150 @@
+"""Per-stage cost of serving the Video endpoints, with baselines.
+
+    python -m Flask_Rest_API.benchmarks.layers run --save baseline.json
+    python -m Flask_Rest_API.benchmarks.layers compare baseline.json --threshold 0.1
+    python -m Flask_Rest_API.benchmarks.layers compare baseline.json current.json
+
+Each stage of ``core.py`` is timed in isolation against a throwaway SQLite
+database: URL routing, ``video_put_args.parse_args``,
+``VideoModel.query.filter_by().first()``, the repository read,
+``marshal`` with ``resource_fields``, ``output_json`` and an increment with
+its commit, plus a whole ``GET /video/<id>`` through the test client for
+reference. Every stage is warmed up, then timed for ``--repeat`` rounds of
+``--number`` calls; the median and best rounds are kept and the spread
+between rounds is reported so noisy numbers are visible. ``compare``
+checks the best round, which is the least disturbed by other load on the
+machine, and exits with status 1 when any stage is more than
+``--threshold`` slower than the baseline.
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import timeit
+
+from flask_restful import marshal
+from flask_restful.representations.json import output_json
+
+from Flask_Rest_API import create_app, db
+from Flask_Rest_API.core import resource_fields, video_put_args
+from Flask_Rest_API.models import VideoModel
+from Flask_Rest_API.storage import get_repository
+
+
+PAYLOAD = {'name': 'John', 'views': 12000, 'likes': 10}
+
+
+def stages(app):
+	"""(name, callable, request context kwargs or None) for each stage."""
+	adapter = app.url_map.bind('localhost')
+	record = {'id': 1, 'name': 'John', 'views': 12000, 'likes': 10}
+	marshalled = marshal(record, resource_fields)
+	client = app.test_client()
+	return [
+		('routing', lambda: adapter.match('/video/1', 'GET'), None),
+		('parse_args', video_put_args.parse_args, dict(path='/video/1', method='PUT', data=PAYLOAD)),
+		('query.first', lambda: VideoModel.query.filter_by(id=1).first(), None),
+		('repository.get', lambda: get_repository().get(1), None),
+		('marshal', lambda: marshal(record, resource_fields), None),
+		('output_json', lambda: output_json(marshalled, 200), None),
+		('increment+commit', lambda: get_repository().increment(1, views=1), None),
+		('GET /video/1', lambda: client.get('/video/1'), None),
+	]
+
+
+def measure(fn, number, repeat, warmup):
+	for _ in range(warmup):
+		fn()
+	rounds = [total / number * 1e6 for total in timeit.repeat(fn, number=number, repeat=repeat)]
+	return {
+		'median_us': statistics.median(rounds),
+		'min_us': min(rounds),
+		'stdev_us': statistics.stdev(rounds) if len(rounds) > 1 else 0.0,
+		'rounds': len(rounds),
+		'number': number,
+	}
+
+
+def run(number, repeat, warmup, rows=1000):
+	workdir = tempfile.mkdtemp()
+	try:
+		app = create_app({
+			'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(workdir, 'layers.db'),
+			'CREATE_TABLES': True,
+			'SLOW_QUERY_LOG': os.path.join(workdir, 'slow.log'),
+		})
+		with app.app_context():
+			db.session.add_all(VideoModel(id=video_id, name='video %d' % video_id, views=video_id, likes=0)
+				for video_id in range(rows))
+			db.session.commit()
+			results = {}
+			for name, fn, request_kwargs in stages(app):
+				if request_kwargs:
+					with app.test_request_context(**request_kwargs):
+						results[name] = measure(fn, number, repeat, warmup)
+				else:
+					results[name] = measure(fn, number, repeat, warmup)
+				db.session.remove()
+		return results
+	finally:
+		shutil.rmtree(workdir, ignore_errors=True)
+
+
+def print_results(results):
+	print("%-18s %12s %12s %10s" % ("stage", "median us", "min us", "spread %"))
+	for name, result in results.items():
+		spread = result['stdev_us'] / result['median_us'] * 100 if result['median_us'] else 0.0
+		print("%-18s %12.2f %12.2f %10.1f" % (name, result['median_us'], result['min_us'], spread))
+
+
+def compare(baseline, current, threshold):
+	regressions = []
+	print("%-18s %12s %12s %9s" % ("stage", "baseline us", "current us", "change"))
+	for name, result in current.items():
+		base = baseline.get(name)
+		if base is None:
+			print("%-18s %12s %12.2f %9s" % (name, "-", result['min_us'], "new"))
+			continue
+		change = result['min_us'] / base['min_us'] - 1
+		flag = ''
+		if change > threshold:
+			flag = '  REGRESSION'
+			regressions.append(name)
+		print("%-18s %12.2f %12.2f %+8.1f%%%s" % (name, base['min_us'], result['min_us'], change * 100, flag))
+	return regressions
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--number", type=int, default=2000, help="Calls per timed round")
+	parser.add_argument("--repeat", type=int, default=7, help="Timed rounds per stage")
+	parser.add_argument("--warmup", type=int, default=200, help="Untimed calls before the first round")
+	commands = parser.add_subparsers(dest="command", required=True)
+	run_parser = commands.add_parser("run", help="Time every stage")
+	run_parser.add_argument("--save", help="Write the results to this JSON file as a baseline")
+	compare_parser = commands.add_parser("compare", help="Compare against a baseline and flag regressions")
+	compare_parser.add_argument("baseline")
+	compare_parser.add_argument("current", nargs="?", help="Saved results to compare; runs the stages when omitted")
+	compare_parser.add_argument("--threshold", type=float, default=0.1, help="Allowed slowdown, 0.1 is 10%%")
+	args = parser.parse_args()
+
+	if args.command == "compare" and args.current:
+		with open(args.current) as f:
+			results = json.load(f)
+	else:
+		results = run(args.number, args.repeat, args.warmup)
+	if args.command == "run":
+		print_results(results)
+		if args.save:
+			with open(args.save, 'w') as f:
+				json.dump(results, f, indent=2)
+	else:
+		with open(args.baseline) as f:
+			baseline = json.load(f)
+		regressions = compare(baseline, results, args.threshold)
+		if regressions:
+			print("\nRegressed beyond %.0f%%: %s" % (args.threshold * 100, ', '.join(regressions)))
+			sys.exit(1)
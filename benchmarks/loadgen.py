@@ -0,0 +1,183 @@
+"""Closed- and open-loop load generator for the video API.
+
+    python -m Flask_Rest_API.benchmarks.loadgen --target http://127.0.0.1:8000 --concurrency 32 --duration 30
+    python -m Flask_Rest_API.benchmarks.loadgen --target http://127.0.0.1:8000 --rate 500 --concurrency 64
+    python -m Flask_Rest_API.benchmarks.loadgen --test-client --writes 0.2 --distribution zipf --output run.json
+
+By default ``--concurrency`` threads each send a request as soon as the
+previous one completes, for ``--duration`` seconds after ``--warmup``. A
+closed loop slows down with the server and so under-reports tail latency
+(coordinated omission). With ``--rate`` requests are instead scheduled at
+that fixed rate per second, sent by up to ``--concurrency`` threads, and
+each latency is measured from the request's scheduled send time, so time
+spent waiting behind a slow response counts. A ``--writes``
+share are ``POST /video/<id>/increment``, the rest ``GET /video/<id>``,
+with ids drawn uniformly or from a Zipf distribution over ``--keys`` videos
+so a few hot keys get most traffic. The ids are created first unless
+``--no-seed`` is given. ``--test-client`` drives ``create_app()`` in process
+on a temporary database, seeded or, with ``--no-seed``, copied from the
+configured one. Throughput and p50/p95/p99/p999 latencies are
+printed per operation and can be saved as JSON to compare runs.
+"""
+import argparse
+import bisect
+import itertools
+import json
+import random
+import shutil
+import tempfile
+import threading
+import time
+
+from Flask_Rest_API.benchmarks.replay import HTTPTarget, TestClientTarget, scratch_app
+from Flask_Rest_API.benchmarks.stats import percentile
+
+
+PERCENTILES = (('p50', 0.5), ('p95', 0.95), ('p99', 0.99), ('p999', 0.999))
+
+FORM = 'application/x-www-form-urlencoded'
+
+
+class KeyChooser(object):
+	def __init__(self, keys, distribution='uniform', s=1.1):
+		self.keys = keys
+		self.cumulative = None
+		if distribution == 'zipf':
+			total = 0.0
+			self.cumulative = []
+			for rank in range(1, keys + 1):
+				total += 1.0 / rank ** s
+				self.cumulative.append(total)
+		elif distribution != 'uniform':
+			raise ValueError("Unknown distribution: %r" % distribution)
+
+	def choose(self, rng):
+		if self.cumulative is None:
+			return rng.randrange(self.keys)
+		return bisect.bisect(self.cumulative, rng.random() * self.cumulative[-1])
+
+
+def seed(target, keys):
+	for video_id in range(keys):
+		target.send('PUT', '/video/%d' % video_id, b'name=load&views=0&likes=0', FORM)
+
+
+def send(target, chooser, writes, rng):
+	video_id = chooser.choose(rng)
+	if rng.random() < writes:
+		op, method, path, body = 'write', 'POST', '/video/%d/increment' % video_id, b'views=1'
+	else:
+		op, method, path, body = 'read', 'GET', '/video/%d' % video_id, b''
+	try:
+		status, _ = target.send(method, path, body, FORM if body else None)
+	except Exception:
+		status = None
+	return op, status
+
+
+def worker(target, chooser, writes, measure_from, deadline, rng, samples):
+	while True:
+		now = time.perf_counter()
+		if now >= deadline:
+			return
+		op, status = send(target, chooser, writes, rng)
+		finished = time.perf_counter()
+		if now >= measure_from:
+			samples.append((op, status, finished - now))
+
+
+def open_worker(target, chooser, writes, counter, started, rate, measure_from, deadline, rng, samples):
+	while True:
+		scheduled = started + next(counter) / rate
+		if scheduled >= deadline:
+			return
+		delay = scheduled - time.perf_counter()
+		if delay > 0:
+			time.sleep(delay)
+		op, status = send(target, chooser, writes, rng)
+		finished = time.perf_counter()
+		if scheduled >= measure_from:
+			samples.append((op, status, finished - scheduled))
+
+
+def run(target, concurrency=16, duration=10, warmup=1, writes=0.1, chooser=None, seed_value=0, rate=None):
+	"""Samples of ``(op, status, seconds)``; closed loop, or open loop at ``rate`` requests/s."""
+	chooser = chooser or KeyChooser(1000)
+	started = time.perf_counter()
+	measure_from = started + warmup
+	deadline = measure_from + duration
+	samples = [[] for _ in range(concurrency)]
+	if rate:
+		# Threads take request numbers from one shared count(), which is atomic under the GIL.
+		counter = itertools.count()
+		threads = [threading.Thread(target=open_worker, args=(target, chooser, writes, counter, started, rate,
+			measure_from, deadline, random.Random(seed_value + i), samples[i])) for i in range(concurrency)]
+	else:
+		threads = [threading.Thread(target=worker, args=(target, chooser, writes, measure_from, deadline,
+			random.Random(seed_value + i), samples[i])) for i in range(concurrency)]
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+	return [sample for thread_samples in samples for sample in thread_samples]
+
+
+def summarize(samples, duration):
+	results = {}
+	for op in ('read', 'write', 'all'):
+		selected = [sample for sample in samples if op == 'all' or sample[0] == op]
+		latencies = sorted(latency * 1000 for _, _, latency in selected)
+		errors = sum(1 for _, status, _ in selected if status is None or status >= 400)
+		results[op] = dict([
+			('requests', len(selected)),
+			('errors', errors),
+			('throughput', len(selected) / duration),
+		] + [(name + '_ms', percentile(latencies, fraction)) for name, fraction in PERCENTILES]
+			+ [('max_ms', latencies[-1] if latencies else None)])
+	return results
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--target", default="http://127.0.0.1:8000")
+	parser.add_argument("--test-client", action="store_true", help="Drive create_app() in process instead of over HTTP")
+	parser.add_argument("--concurrency", type=int, default=16, help="Threads; with --rate, the most requests in flight")
+	parser.add_argument("--rate", type=float, help="Open loop: send this many requests per second on a fixed schedule")
+	parser.add_argument("--duration", type=float, default=10, help="Measured seconds")
+	parser.add_argument("--warmup", type=float, default=1, help="Seconds of load before measuring")
+	parser.add_argument("--writes", type=float, default=0.1, help="Share of requests that are increments")
+	parser.add_argument("--keys", type=int, default=1000)
+	parser.add_argument("--distribution", choices=('uniform', 'zipf'), default='uniform')
+	parser.add_argument("--zipf-s", type=float, default=1.1, help="Zipf exponent; higher is more skewed")
+	parser.add_argument("--seed", type=int, default=0, help="Random seed for key and operation choice")
+	parser.add_argument("--no-seed", dest="seed_keys", action="store_false", help="Assume the videos already exist")
+	parser.add_argument("--output", help="Save the configuration and results to this JSON file")
+	args = parser.parse_args()
+
+	scratch = None
+	if args.test_client:
+		from Flask_Rest_API import create_app
+		scratch = tempfile.mkdtemp(prefix='loadgen-')
+		target = TestClientTarget(scratch_app(scratch, copy_from=None if args.seed_keys else create_app()))
+	else:
+		target = HTTPTarget(args.target)
+	try:
+		if args.seed_keys:
+			seed(target, args.keys)
+		samples = run(target, args.concurrency, args.duration, args.warmup, args.writes,
+			KeyChooser(args.keys, args.distribution, args.zipf_s), args.seed, args.rate)
+	finally:
+		if scratch:
+			shutil.rmtree(scratch)
+	results = summarize(samples, args.duration)
+
+	print("%-6s %9s %7s %9s %9s %9s %9s %9s %9s" % ("op", "requests", "errors", "req/s", "p50 ms", "p95 ms",
+		"p99 ms", "p999 ms", "max ms"))
+	for op, result in results.items():
+		print("%-6s %9d %7d %9.1f %9.2f %9.2f %9.2f %9.2f %9.2f" % (op, result['requests'], result['errors'],
+			result['throughput'], result['p50_ms'], result['p95_ms'], result['p99_ms'], result['p999_ms'],
+			result['max_ms'] or float('nan')))
+	if args.output:
+		config = dict((key, value) for key, value in vars(args).items() if key != 'output')
+		with open(args.output, 'w') as f:
+			json.dump({'time': time.time(), 'config': config, 'results': results}, f, indent=2)
@@ -0,0 +1,47 @@
+"""Per-request cost of parsing the Video PUT payload: reqparse vs. Schema.
+
+    python -m Flask_Rest_API.benchmarks.parse
+"""
+import argparse
+import json
+import timeit
+
+from flask_restful import reqparse
+
+from Flask_Rest_API import create_app
+from Flask_Rest_API.core import video_put_args
+
+
+def reqparse_put_args():
+	parser = reqparse.RequestParser()
+	parser.add_argument("name", type=str, help="Name of the video is required", required=True)
+	parser.add_argument("views", type=int, help="Views of the video", required=True)
+	parser.add_argument("likes", type=int, help="Likes on the video", required=True)
+	return parser
+
+
+PAYLOAD = {'name': 'John', 'views': 12000, 'likes': 10}
+
+REQUESTS = {
+	'form': dict(method='PUT', data=PAYLOAD),
+	'json': dict(method='PUT', data=json.dumps(PAYLOAD), content_type='application/json'),
+}
+
+
+def measure(parse, number, repeat):
+	return min(timeit.repeat(parse, number=number, repeat=repeat)) / number
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--number", type=int, default=20000)
+	parser.add_argument("--repeat", type=int, default=5)
+	args = parser.parse_args()
+	app = create_app()
+	parsers = {'reqparse': reqparse_put_args().parse_args, 'schema': video_put_args.parse_args}
+	print("%-6s %-9s %10s" % ("body", "parser", "us/parse"))
+	for body, kwargs in REQUESTS.items():
+		for name, parse in parsers.items():
+			with app.test_request_context('/video/1', **kwargs):
+				assert parse()['views'] == PAYLOAD['views']
+				print("%-6s %-9s %10.2f" % (body, name, measure(parse, args.number, args.repeat) * 1e6))
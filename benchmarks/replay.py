@@ -0,0 +1,216 @@
+"""Replay captured traffic and compare latencies and responses.
+
+    python -m Flask_Rest_API.benchmarks.replay instance/traffic.jsonl --target http://127.0.0.1:8000 --speed 2
+    python -m Flask_Rest_API.benchmarks.replay instance/traffic.jsonl --test-client --speed 0
+
+Reads the JSONL written by ``CAPTURE_TRAFFIC`` and re-issues each request at
+its recorded offset divided by ``--speed`` (``0`` sends them back to back),
+from ``--concurrency`` threads. With ``--concurrency 1`` requests are sent
+strictly in recorded order. Reports latency percentiles next to the
+recorded ones, how far sends lagged the schedule, and every response whose
+status or body differs from the capture. ``--test-client`` replays in
+process against ``create_app()`` (configured through
+``FLASK_REST_API_SETTINGS``) instead of over HTTP, on a temporary copy of
+its database so replayed writes never reach the real one.
+"""
+import argparse
+import base64
+import http.client
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from Flask_Rest_API.benchmarks.stats import percentile
+
+
+# Methods resent after a failure that may have happened once the server had the request.
+SAFE_METHODS = ('GET', 'HEAD')
+
+PERCENTILES = (('p50', 0.5), ('p90', 0.9), ('p99', 0.99), ('p999', 0.999))
+
+
+def load(path):
+	records = []
+	with open(path) as f:
+		for line in f:
+			record = json.loads(line)
+			if 'method' in record:
+				records.append(record)
+	records.sort(key=lambda record: record['time'])
+	return records
+
+
+def _decode(record, key):
+	value = record.get(key) or ''
+	return base64.b64decode(value) if record.get(key + '_base64') else value.encode('utf-8')
+
+
+class HTTPTarget(object):
+	"""One keep-alive ``http.client`` connection per replay thread.
+
+	A request that fails after it may have reached the server is only sent
+	again for ``GET`` and ``HEAD``; resending a write could apply it twice.
+	"""
+
+	def __init__(self, url):
+		parts = urlsplit(url)
+		self.host, self.port = parts.hostname, parts.port or 80
+		self.local = threading.local()
+
+	def send(self, method, path, body, content_type):
+		headers = {'Content-Type': content_type} if content_type else {}
+		for attempt in (0, 1):
+			conn = getattr(self.local, 'conn', None)
+			if conn is None:
+				conn = self.local.conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+			try:
+				if conn.sock is None:
+					conn.connect()
+			except OSError:
+				# Nothing was sent, so any method can be tried once more.
+				self.reset(conn)
+				if attempt:
+					raise
+				continue
+			try:
+				conn.request(method, path, body or None, headers)
+				response = conn.getresponse()
+				return response.status, response.read()
+			except (OSError, http.client.HTTPException):
+				# Usually a keep-alive connection the server closed.
+				self.reset(conn)
+				if attempt or method not in SAFE_METHODS:
+					raise
+
+	def reset(self, conn):
+		conn.close()
+		self.local.conn = None
+
+
+class TestClientTarget(object):
+	def __init__(self, app):
+		self.app = app
+		self.local = threading.local()
+
+	def send(self, method, path, body, content_type):
+		client = getattr(self.local, 'client', None)
+		if client is None:
+			client = self.local.client = self.app.test_client()
+		response = client.open(path, method=method, data=body, content_type=content_type)
+		return response.status_code, response.get_data()
+
+
+def scratch_app(directory, copy_from=None):
+	"""``create_app()`` with its database and instance folder in the throwaway ``directory``.
+
+	With ``copy_from`` the database starts as a copy of that app's.
+	"""
+	from Flask_Rest_API import create_app, db
+	path = os.path.join(directory, 'scratch.db')
+	if copy_from is not None:
+		with copy_from.app_context():
+			source = db.engine.url.database
+		if source and os.path.exists(source):
+			src, dst = sqlite3.connect(source), sqlite3.connect(path)
+			try:
+				src.backup(dst)
+			finally:
+				src.close()
+				dst.close()
+	return create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + path, 'CREATE_TABLES': True}, instance_path=directory)
+
+
+def _same_body(expected, actual):
+	try:
+		return json.loads(expected) == json.loads(actual)
+	except ValueError:
+		return expected == actual
+
+
+def replay(records, target, speed=1.0, concurrency=8):
+	if not records:
+		return []
+	base = records[0]['time']
+	started = time.perf_counter()
+
+	def send(record):
+		due = started + ((record['time'] - base) / speed if speed else 0)
+		delay = due - time.perf_counter()
+		if delay > 0:
+			time.sleep(delay)
+		sent = time.perf_counter()
+		try:
+			status, body = target.send(record['method'], record['path'], _decode(record, 'body'), record.get('content_type'))
+		except Exception as e:
+			return {'record': record, 'error': repr(e), 'lag': sent - due}
+		return {'record': record, 'status': status, 'body': body, 'latency': time.perf_counter() - sent, 'lag': sent - due}
+
+	with ThreadPoolExecutor(concurrency) as pool:
+		return list(pool.map(send, records))
+
+
+def report(results, elapsed, show_diffs=10):
+	latencies = sorted(result['latency'] * 1000 for result in results if 'latency' in result)
+	recorded = sorted(result['record']['duration_ms'] for result in results if 'duration_ms' in result['record'])
+	lags = sorted(max(0.0, result['lag']) * 1000 for result in results)
+	diffs = []
+	for result in results:
+		record = result['record']
+		if 'error' in result:
+			diffs.append({'method': record['method'], 'path': record['path'], 'error': result['error']})
+		elif record.get('status') is not None and (result['status'] != record['status']
+				or not _same_body(_decode(record, 'response'), result['body'])):
+			diffs.append({'method': record['method'], 'path': record['path'],
+				'expected': [record['status'], _decode(record, 'response').decode('utf-8', 'replace')],
+				'actual': [result['status'], result['body'].decode('utf-8', 'replace')]})
+	summary = {
+		'requests': len(results),
+		'errors': sum(1 for result in results if 'error' in result),
+		'elapsed_s': elapsed,
+		'rate': len(results) / elapsed if elapsed else None,
+		'latency_ms': dict((name, percentile(latencies, fraction)) for name, fraction in PERCENTILES),
+		'recorded_latency_ms': dict((name, percentile(recorded, fraction)) for name, fraction in PERCENTILES),
+		'schedule_lag_ms': {'p99': percentile(lags, 0.99), 'max': lags[-1] if lags else None},
+		'diffs': len(diffs),
+	}
+	return summary, diffs[:show_diffs]
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("capture", help="JSONL file written by CAPTURE_TRAFFIC")
+	parser.add_argument("--target", default="http://127.0.0.1:8000")
+	parser.add_argument("--test-client", action="store_true", help="Replay in process through the Flask test client")
+	parser.add_argument("--speed", type=float, default=1.0, help="Rate multiplier; 0 sends requests back to back")
+	parser.add_argument("--concurrency", type=int, default=8)
+	parser.add_argument("--show-diffs", type=int, default=10)
+	parser.add_argument("--output", help="Write the summary and diffs to this JSON file")
+	args = parser.parse_args()
+
+	scratch = None
+	if args.test_client:
+		from Flask_Rest_API import create_app
+		scratch = tempfile.mkdtemp(prefix='replay-')
+		target = TestClientTarget(scratch_app(scratch, copy_from=create_app()))
+	else:
+		target = HTTPTarget(args.target)
+	records = load(args.capture)
+	started = time.perf_counter()
+	try:
+		results = replay(records, target, speed=args.speed, concurrency=args.concurrency)
+	finally:
+		if scratch:
+			shutil.rmtree(scratch)
+	summary, diffs = report(results, time.perf_counter() - started, args.show_diffs)
+	print(json.dumps(summary, indent=2))
+	for diff in diffs:
+		print(json.dumps(diff))
+	if args.output:
+		with open(args.output, 'w') as f:
+			json.dump({'summary': summary, 'diffs': diffs}, f, indent=2)
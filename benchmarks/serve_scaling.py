@@ -0,0 +1,103 @@
+"""Requests/sec of the pre-fork server from 1 to N workers.
+
+    python -m Flask_Rest_API.benchmarks.serve_scaling --workers 1 2 4 --threads 8
+
+Each run starts ``Flask_Rest_API.serve`` against a throwaway SQLite database
+and drives ``GET /video/<id>`` from client processes over keep-alive
+connections. By default each run uses one client per request thread
+(workers x threads), so every configuration is measured at full occupancy
+rather than with requests queueing behind a fixed client count.
+"""
+import argparse
+import http.client
+import multiprocessing
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+
+from Flask_Rest_API import db, models  # noqa: F401 registers the tables
+
+
+def wait_until_up(port, timeout=15):
+	deadline = time.time() + timeout
+	while time.time() < deadline:
+		try:
+			conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+			conn.request('GET', '/video/1')
+			conn.getresponse().read()
+			return
+		except OSError:
+			time.sleep(0.1)
+	raise RuntimeError("Server did not start on port %d" % port)
+
+
+def client(port, duration, results):
+	conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+	done = 0
+	deadline = time.time() + duration
+	while time.time() < deadline:
+		try:
+			conn.request('GET', '/video/%d' % (done % 100))
+			conn.getresponse().read()
+			done += 1
+		except (OSError, http.client.HTTPException):
+			conn.close()
+			conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+	results.put(done)
+
+
+def run(workers, threads, clients, duration, port, root):
+	settings = os.path.join(root, 'settings.py')
+	with open(settings, 'w') as f:
+		f.write("SQLALCHEMY_DATABASE_URI = %r\n" % ('sqlite:///' + os.path.join(root, 'bench.db')))
+	db.metadata.create_all(create_engine('sqlite:///' + os.path.join(root, 'bench.db')))
+	env = dict(os.environ, FLASK_REST_API_SETTINGS=settings)
+	server = subprocess.Popen([sys.executable, '-m', 'Flask_Rest_API.serve', '--bind', '127.0.0.1:%d' % port,
+		'--workers', str(workers), '--threads', str(threads)], env=env, stderr=subprocess.DEVNULL)
+	try:
+		wait_until_up(port)
+		for video_id in range(100):
+			conn = http.client.HTTPConnection('127.0.0.1', port)
+			conn.request('PUT', '/video/%d' % video_id, 'name=bench&views=1&likes=1',
+				{'Content-Type': 'application/x-www-form-urlencoded'})
+			conn.getresponse().read()
+		results = multiprocessing.Queue()
+		processes = [multiprocessing.Process(target=client, args=(port, duration, results)) for _ in range(clients)]
+		for process in processes:
+			process.start()
+		total = sum(results.get() for _ in processes)
+		for process in processes:
+			process.join()
+		return total / duration
+	finally:
+		server.send_signal(signal.SIGTERM)
+		server.wait()
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+	parser.add_argument("--threads", type=int, default=8)
+	parser.add_argument("--clients", type=int, help="Client processes per run (default: workers x threads)")
+	parser.add_argument("--duration", type=float, default=10)
+	parser.add_argument("--port", type=int, default=8765)
+	args = parser.parse_args()
+	root = tempfile.mkdtemp(prefix='serve-bench-')
+	try:
+		baseline = None
+		print("%7s %7s %10s %8s" % ("workers", "clients", "req/s", "scaling"))
+		for workers in sorted(set(args.workers)):
+			if os.path.exists(os.path.join(root, 'bench.db')):
+				os.remove(os.path.join(root, 'bench.db'))
+			clients = args.clients or workers * args.threads
+			rate = run(workers, args.threads, clients, args.duration, args.port, root)
+			baseline = baseline or rate
+			print("%7d %7d %10.0f %7.2fx" % (workers, clients, rate, rate / baseline))
+	finally:
+		shutil.rmtree(root)
@@ -0,0 +1,52 @@
+"""Write throughput of the sharded storage engine by shard count.
+
+    python -m Flask_Rest_API.benchmarks.shard_writes --shards 1 2 4 8 --writers 8
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+from Flask_Rest_API.sharding import ShardedRepository, shard_urls
+
+
+def writer(urls, start, count):
+	repository = ShardedRepository(urls)
+	for video_id in range(start, start + count):
+		repository.create(video_id, 'video %d' % video_id, video_id, 0)
+
+
+def run(shards, writers, rows_per_writer):
+	root = tempfile.mkdtemp(prefix='shard-bench-')
+	try:
+		urls = shard_urls(root, 'shard-{}.db', shards)
+		ShardedRepository(urls)
+		processes = [multiprocessing.Process(target=writer, args=(urls, n * rows_per_writer, rows_per_writer))
+			for n in range(writers)]
+		started = time.perf_counter()
+		for process in processes:
+			process.start()
+		for process in processes:
+			process.join()
+		elapsed = time.perf_counter() - started
+		if any(process.exitcode for process in processes):
+			raise RuntimeError("A writer process failed")
+		return writers * rows_per_writer / elapsed
+	finally:
+		shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8])
+	parser.add_argument("--writers", type=int, default=os.cpu_count() or 4)
+	parser.add_argument("--rows", type=int, default=500, help="Rows inserted by each writer")
+	args = parser.parse_args()
+	baseline = None
+	print("%6s %12s %8s" % ("shards", "writes/s", "scaling"))
+	for shards in args.shards:
+		rate = run(shards, args.writers, args.rows)
+		baseline = baseline or rate
+		print("%6d %12.0f %7.2fx" % (shards, rate, rate / baseline))
@@ -0,0 +1,94 @@
+"""Cold start: time from process spawn to the first response.
+
+    python -m Flask_Rest_API.benchmarks.startup --runs 5 --budget-ms 1500
+
+Each run starts a fresh interpreter under ``python -X importtime`` that
+imports the package, calls ``create_app`` against a throwaway SQLite
+database and serves ``GET /video/1`` through the test client. The median
+time to first response is checked against ``--budget-ms`` (exit status 1
+when over), and the slowest imports of the last run are listed so a
+regression can be traced to the module that caused it.
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+
+from Flask_Rest_API import db, models  # noqa: F401 registers the tables
+
+
+CHILD = """
+import json, sys, time
+t0 = time.time()
+from Flask_Rest_API import create_app
+t1 = time.time()
+app = create_app()
+t2 = time.time()
+status = app.test_client().get('/video/1').status_code
+t3 = time.time()
+json.dump({'import': t1 - t0, 'create_app': t2 - t1, 'first_request': t3 - t2, 'status': status, 'ready': t3}, sys.stdout)
+"""
+
+
+def parse_importtime(stderr):
+	imports = []
+	for line in stderr.splitlines():
+		if not line.startswith('import time:') or 'self [us]' in line:
+			continue
+		self_us, cumulative_us, name = line[len('import time:'):].split('|')
+		imports.append((name.rstrip(), int(self_us), int(cumulative_us)))
+	return imports
+
+
+def run_once(env):
+	started = time.time()
+	proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', CHILD], env=env,
+		stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+	phases = json.loads(proc.stdout)
+	phases['total'] = phases.pop('ready') - started
+	return phases, parse_importtime(proc.stderr)
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--runs", type=int, default=5)
+	parser.add_argument("--budget-ms", type=float, default=1500, help="Maximum median time to first response")
+	parser.add_argument("--top", type=int, default=15, help="Number of slowest imports to list")
+	args = parser.parse_args()
+
+	workdir = tempfile.mkdtemp()
+	try:
+		url = 'sqlite:///' + os.path.join(workdir, 'startup.db')
+		db.metadata.create_all(create_engine(url))
+		settings = os.path.join(workdir, 'settings.py')
+		with open(settings, 'w') as f:
+			f.write('SQLALCHEMY_DATABASE_URI = %r\nSLOW_QUERY_LOG = %r\n' % (url, os.path.join(workdir, 'slow.log')))
+		env = dict(os.environ, FLASK_REST_API_SETTINGS=settings)
+		runs = []
+		for _ in range(args.runs):
+			phases, imports = run_once(env)
+			runs.append(phases)
+	finally:
+		shutil.rmtree(workdir, ignore_errors=True)
+
+	print("%-14s %10s %10s" % ("phase", "median ms", "max ms"))
+	for phase in ('import', 'create_app', 'first_request', 'total'):
+		values = [run[phase] * 1000 for run in runs]
+		print("%-14s %10.1f %10.1f" % (phase, statistics.median(values), max(values)))
+
+	print("\n%-50s %10s %10s" % ("slowest imports", "self ms", "cumul ms"))
+	for name, self_us, cumulative_us in sorted(imports, key=lambda item: -item[2])[:args.top]:
+		print("%-50s %10.1f %10.1f" % (name[:50], self_us / 1000.0, cumulative_us / 1000.0))
+
+	median = statistics.median(run['total'] for run in runs) * 1000
+	if median > args.budget_ms:
+		print("\nFAIL: median time to first response %.1f ms exceeds the %.1f ms budget" % (median, args.budget_ms))
+		sys.exit(1)
+	print("\nOK: median time to first response %.1f ms within the %.1f ms budget" % (median, args.budget_ms))
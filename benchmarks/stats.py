@@ -0,0 +1,3 @@
+def percentile(values, fraction):
+	"""Nearest-rank ``fraction`` percentile of the sorted ``values``, or NaN when empty."""
+	return values[min(len(values) - 1, int(len(values) * fraction))] if values else float('nan')
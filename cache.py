@@ -0,0 +1,303 @@
+import json
+import logging
+import os
+import queue
+import socket
+import time
+from contextlib import contextmanager
+
+from Flask_Rest_API.storage import VideoRepository
+from Flask_Rest_API.spans import span
+
+
+logger = logging.getLogger(__name__)
+
+# Placeholder value marking a fill lease; JSON records never start with NUL.
+LEASE = b'\x00lease:'
+
+
+class CacheError(Exception):
+	pass
+
+
+class _Connection(object):
+	def __init__(self, address, timeout):
+		self.sock = socket.create_connection(address, timeout=timeout)
+		self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+		self.rfile = self.sock.makefile('rb')
+
+	def send(self, data):
+		self.sock.sendall(data)
+
+	def readline(self):
+		line = self.rfile.readline()
+		if not line.endswith(b'\r\n'):
+			raise CacheError("Connection closed by cache server")
+		return line[:-2]
+
+	def read(self, size):
+		data = self.rfile.read(size + 2)
+		if len(data) != size + 2:
+			raise CacheError("Connection closed by cache server")
+		return data[:-2]
+
+	def close(self):
+		try:
+			self.rfile.close()
+			self.sock.close()
+		except OSError:
+			pass
+
+
+class MemcacheClient(object):
+	"""Client for a single server speaking the memcached text protocol.
+
+	Connections are kept in a pool and reused across requests.
+	"""
+
+	def __init__(self, address, pool_size=8, timeout=0.5, retry_interval=5.0):
+		if isinstance(address, str):
+			host, _, port = address.rpartition(':')
+			address = (host, int(port))
+		self.address = address
+		self.timeout = timeout
+		self.retry_interval = retry_interval
+		self.down_until = 0
+		self.pool = queue.LifoQueue(pool_size)
+		self.hits = 0
+		self.misses = 0
+
+	@contextmanager
+	def connection(self):
+		try:
+			conn = self.pool.get_nowait()
+		except queue.Empty:
+			if time.time() < self.down_until:
+				raise CacheError("Cache server %s:%d marked down" % self.address)
+			try:
+				conn = _Connection(self.address, self.timeout)
+			except OSError:
+				self.down_until = time.time() + self.retry_interval
+				raise
+		try:
+			yield conn
+		except Exception:
+			conn.close()
+			raise
+		try:
+			self.pool.put_nowait(conn)
+		except queue.Full:
+			conn.close()
+
+	def get(self, key):
+		return self.get_multi([key]).get(key)
+
+	def get_multi(self, keys):
+		if not keys:
+			return {}
+		values = {}
+		with self.connection() as conn:
+			conn.send(b'get ' + b' '.join(key.encode() for key in keys) + b'\r\n')
+			while True:
+				line = conn.readline()
+				if line == b'END':
+					break
+				if not line.startswith(b'VALUE '):
+					raise CacheError(line.decode(errors='replace'))
+				_, key, _flags, size = line.split(b' ')[:4]
+				value = conn.read(int(size))
+				if not value.startswith(LEASE):
+					values[key.decode()] = value
+		self.hits += len(values)
+		self.misses += len(keys) - len(values)
+		return values
+
+	def set(self, key, value, ttl=0):
+		self.set_multi({key: value}, ttl)
+
+	def set_multi(self, mapping, ttl=0):
+		if not mapping:
+			return
+		commands = []
+		for key, value in mapping.items():
+			commands.append(b'set %s 0 %d %d noreply\r\n%s\r\n' % (key.encode(), ttl, len(value), value))
+		with self.connection() as conn:
+			conn.send(b''.join(commands))
+
+	def lease_multi(self, keys, ttl):
+		"""Claim a fill lease on each of ``keys`` that holds no value.
+
+		A lease is an ``add`` of a unique placeholder; the ``gets`` pipelined
+		after it returns the cas id needed to replace it. Returns ``{key: cas}``
+		for the leases won.
+		"""
+		if not keys:
+			return {}
+		tokens = dict((key, LEASE + os.urandom(8).hex().encode()) for key in keys)
+		commands = [b'add %s 0 %d %d\r\n%s\r\n' % (key.encode(), ttl, len(token), token) for key, token in tokens.items()]
+		commands.append(b'gets ' + b' '.join(key.encode() for key in tokens) + b'\r\n')
+		leases = {}
+		with self.connection() as conn:
+			conn.send(b''.join(commands))
+			for _ in tokens:
+				line = conn.readline()
+				if line not in (b'STORED', b'NOT_STORED'):
+					raise CacheError(line.decode(errors='replace'))
+			while True:
+				line = conn.readline()
+				if line == b'END':
+					break
+				if not line.startswith(b'VALUE '):
+					raise CacheError(line.decode(errors='replace'))
+				_, key, _flags, size, cas = line.split(b' ')[:5]
+				key = key.decode()
+				if conn.read(int(size)) == tokens.get(key):
+					leases[key] = int(cas)
+		return leases
+
+	def cas_multi(self, mapping, ttl=0):
+		"""Store ``{key: (value, cas)}`` where the key is unchanged since ``gets``."""
+		if not mapping:
+			return
+		commands = []
+		for key, (value, cas) in mapping.items():
+			commands.append(b'cas %s 0 %d %d %d noreply\r\n%s\r\n' % (key.encode(), ttl, len(value), cas, value))
+		with self.connection() as conn:
+			conn.send(b''.join(commands))
+
+	def delete(self, key):
+		self.delete_multi([key])
+
+	def delete_multi(self, keys):
+		if not keys:
+			return
+		with self.connection() as conn:
+			conn.send(b''.join(b'delete %s noreply\r\n' % key.encode() for key in keys))
+
+	def flush_all(self):
+		with self.connection() as conn:
+			conn.send(b'flush_all\r\n')
+			line = conn.readline()
+		if line != b'OK':
+			raise CacheError(line.decode(errors='replace'))
+
+	def close(self):
+		while True:
+			try:
+				self.pool.get_nowait().close()
+			except queue.Empty:
+				break
+
+	def post_fork(self):
+		# Sockets inherited from the parent are shared with it; never reuse them.
+		self.pool = queue.LifoQueue(self.pool.maxsize)
+
+
+class CachedRepository(VideoRepository):
+	"""Read-through cache in front of another repository.
+
+	A miss takes a lease on the key before reading the backing store and only
+	fills it with ``cas`` against that lease. Writes delete the key after
+	they commit, which also voids any lease taken before the write, so a
+	reader that loaded the old row cannot store it over the update. Cache
+	failures are logged and treated as misses so the backing store keeps
+	serving when the cache tier is down.
+	"""
+
+	def __init__(self, repository, client, ttl=300, prefix='video:', lease_ttl=10):
+		self.repository = repository
+		self.client = client
+		self.ttl = ttl
+		self.prefix = prefix
+		self.lease_ttl = lease_ttl
+
+	def query_cost(self, *operations):
+		low = high = 0
+		for operation in operations:
+			cost = self.repository.query_cost(operation)
+			if cost is None:
+				return None
+			# Reads may be served entirely from the cache.
+			low += 0 if operation in ('get', 'get_many') else cost[0]
+			high += cost[1]
+		return low, high
+
+	def post_fork(self):
+		self.client.post_fork()
+
+	def key(self, video_id):
+		return '%s%d' % (self.prefix, video_id)
+
+	def _fetch(self, video_ids):
+		with span('cache.get', keys=len(video_ids)) as cache_span:
+			try:
+				values = self.client.get_multi([self.key(video_id) for video_id in video_ids])
+			except (OSError, CacheError) as e:
+				logger.warning("Video cache lookup failed: %s", e)
+				return {}
+			if cache_span is not None:
+				cache_span.attributes['hits'] = len(values)
+		return dict((record['id'], record) for record in (json.loads(value) for value in values.values()))
+
+	def _lease(self, video_ids):
+		with span('cache.lease', keys=len(video_ids)):
+			try:
+				return self.client.lease_multi([self.key(video_id) for video_id in video_ids], self.lease_ttl)
+			except (OSError, CacheError) as e:
+				logger.warning("Video cache lease failed: %s", e)
+				return {}
+
+	def _store(self, video_ids, loaded, leases):
+		if not leases:
+			return
+		with span('cache.set'):
+			try:
+				fills = {}
+				for video_id in video_ids:
+					cas = leases.get(self.key(video_id))
+					if cas is not None and video_id in loaded:
+						fills[self.key(video_id)] = (json.dumps(loaded[video_id]).encode(), cas)
+				self.client.cas_multi(fills, self.ttl)
+				# Videos that don't exist aren't cached; give their leases back.
+				self.client.delete_multi([key for key in leases if key not in fills])
+			except (OSError, CacheError) as e:
+				logger.warning("Video cache fill failed: %s", e)
+
+	def _invalidate(self, video_id):
+		with span('cache.delete'):
+			try:
+				self.client.delete(self.key(video_id))
+			except (OSError, CacheError) as e:
+				logger.warning("Video cache invalidation failed: %s", e)
+
+	def get(self, video_id):
+		return self.get_many([video_id]).get(video_id)
+
+	def get_many(self, video_ids):
+		video_ids = list(video_ids)
+		found = self._fetch(video_ids)
+		missing = [video_id for video_id in video_ids if video_id not in found]
+		if missing:
+			leases = self._lease(missing)
+			loaded = self.repository.get_many(missing)
+			self._store(missing, loaded, leases)
+			found.update(loaded)
+		return found
+
+	def create(self, video_id, name, views, likes):
+		record = self.repository.create(video_id, name, views, likes)
+		self._invalidate(video_id)
+		return record
+
+	def update(self, video_id, **values):
+		record = self.repository.update(video_id, **values)
+		self._invalidate(video_id)
+		return record
+
+	def increment(self, video_id, views=0, likes=0):
+		record = self.repository.increment(video_id, views=views, likes=likes)
+		self._invalidate(video_id)
+		return record
+
+	def scan(self, after=None, limit=100):
+		return self.repository.scan(after=after, limit=limit)
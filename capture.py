@@ -0,0 +1,103 @@
+import base64
+import io
+import random
+import time
+
+from werkzeug.wsgi import get_content_length
+
+from Flask_Rest_API import instance_file
+from Flask_Rest_API.accesslog import JSONLWriter
+
+
+def _body(data, record, key):
+	try:
+		record[key] = data.decode('utf-8')
+	except UnicodeDecodeError:
+		record[key] = base64.b64encode(data).decode('ascii')
+		record[key + '_base64'] = True
+
+
+class TrafficCapture(object):
+	"""WSGI middleware recording a sample of requests for replay.
+
+	Each sampled request is written as one JSON line with its start time,
+	method, path and query string, content type and body, plus the response
+	status, body and duration so a replay can diff against it. Responses are
+	buffered, which is fine for the small JSON bodies of this API. A chunked
+	request body is read whole and handed on with a ``CONTENT_LENGTH``. Paths
+	under ``exclude`` (admin endpoints carry tokens) are never captured.
+	"""
+
+	def __init__(self, app, writer, sample_rate=1.0, max_body=64 * 1024, exclude=('/admin/', '/metrics')):
+		self.app = app
+		self.writer = writer
+		self.sample_rate = sample_rate
+		self.max_body = max_body
+		self.exclude = tuple(exclude)
+
+	def __call__(self, environ, start_response):
+		path = environ.get('PATH_INFO', '')
+		if random.random() >= self.sample_rate or path.startswith(self.exclude):
+			return self.app(environ, start_response)
+		# Parsed as the app will parse it: a malformed length reads as no body.
+		length = get_content_length(environ)
+		if length:
+			if length > self.max_body:
+				return self.app(environ, start_response)
+			body = environ['wsgi.input'].read(length)
+			environ['wsgi.input'] = io.BytesIO(body)
+		elif environ.get('wsgi.input_terminated'):
+			# A chunked body: the server ends the stream after the last chunk.
+			body = environ['wsgi.input'].read()
+			environ['wsgi.input'] = io.BytesIO(body)
+			environ['CONTENT_LENGTH'] = str(len(body))
+			if len(body) > self.max_body:
+				return self.app(environ, start_response)
+		else:
+			body = b''
+
+		response = {}
+
+		def capture_start_response(status, headers, exc_info=None):
+			response['status'] = int(status.split(' ', 1)[0])
+			return start_response(status, headers, exc_info)
+
+		started = time.time()
+		timer = time.perf_counter()
+		result = self.app(environ, capture_start_response)
+		try:
+			chunks = list(result)
+		finally:
+			if hasattr(result, 'close'):
+				result.close()
+		query = environ.get('QUERY_STRING')
+		record = {
+			'time': started,
+			'method': environ['REQUEST_METHOD'],
+			'path': path + ('?' + query if query else ''),
+			'content_type': environ.get('CONTENT_TYPE') or None,
+			'duration_ms': round((time.perf_counter() - timer) * 1000, 3),
+			'status': response.get('status'),
+		}
+		_body(body, record, 'body')
+		_body(b''.join(chunks)[:self.max_body], record, 'response')
+		self.writer.put(record)
+		return chunks
+
+	def post_fork(self):
+		self.writer.post_fork()
+
+	def stop(self):
+		self.writer.stop()
+
+
+def init_app(app):
+	if not app.config.get('CAPTURE_TRAFFIC'):
+		return
+	writer = JSONLWriter(instance_file(app, app.config.get('CAPTURE_PATH', 'traffic.jsonl')),
+		max_bytes=app.config.get('CAPTURE_MAX_BYTES', 100 * 1024 * 1024),
+		backups=app.config.get('CAPTURE_BACKUPS', 1))
+	capture = TrafficCapture(app.wsgi_app, writer, sample_rate=app.config.get('CAPTURE_SAMPLE_RATE', 0.01),
+		max_body=app.config.get('CAPTURE_MAX_BODY', 64 * 1024))
+	app.wsgi_app = capture
+	app.extensions['traffic_capture'] = capture
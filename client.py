@@ -0,0 +1,641 @@
+"""Python client for the video API.
+
+    client = VideoClient('http://127.0.0.1:8000')
+    client.create(1, 'Intro', views=0, likes=0)
+    client.increment(1, views=1)
+    client.get(1)
+    client.bulk_create([{'id': 2, 'name': 'Outro', 'views': 0, 'likes': 0}, ...])
+
+    async with AsyncVideoClient('http://127.0.0.1:8000') as client:
+        videos = await asyncio.gather(*(client.get(video_id) for video_id in ids))
+
+Connections are kept alive in a pool and reused. Concurrent ``get`` calls
+are coalesced into ``GET /videos?ids=`` requests: while one batch is in
+flight the next one collects every id asked for in the meantime, so a lone
+caller pays no extra latency and a busy one sends few large requests. GET
+responses are kept in a local LRU keyed by path and revalidated with
+``If-None-Match``, so unchanged videos come back as an empty 304. Bulk
+writes are pipelined, ``pipeline_depth`` requests written back to back on
+each connection before reading the responses. Requests answered with 429 or
+503 are retried after ``Retry-After`` or an exponential backoff with jitter;
+connection errors are retried for idempotent methods only, so an increment
+is never applied twice and a create whose response was lost doesn't come
+back as a 409.
+"""
+import asyncio
+import http.client
+import json
+import queue
+import random
+import socket
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+
+# core.MAX_LIST_LIMIT; the client does not import the server.
+MAX_IDS = 1000
+
+RETRY_STATUSES = (429, 503)
+
+# Safe to resend after a lost response. PUT only creates and answers 409 for
+# an existing video, so a resend would fail even though the first one worked.
+IDEMPOTENT = ('GET', 'HEAD', 'PATCH', 'DELETE')
+
+
+class APIError(Exception):
+	def __init__(self, status, message):
+		Exception.__init__(self, "%s: %s" % (status, message))
+		self.status = status
+		self.message = message
+
+
+class Response(object):
+	def __init__(self, status, headers, body):
+		self.status = status
+		self.headers = dict((name.lower(), value) for name, value in headers)
+		self.body = body
+
+	def json(self):
+		return json.loads(self.body) if self.body else None
+
+	def raise_for_status(self):
+		if self.status >= 400:
+			try:
+				message = self.json().get('message')
+			except (ValueError, AttributeError):
+				message = self.body.decode('utf-8', 'replace')
+			raise APIError(self.status, message)
+
+
+class ETagCache(object):
+	"""LRU of ``path -> (etag, response)`` for conditional GETs."""
+
+	def __init__(self, size=10000):
+		self.size = size
+		self.entries = OrderedDict()
+		self.lock = threading.Lock()
+
+	def get(self, path):
+		with self.lock:
+			entry = self.entries.get(path)
+			if entry is not None:
+				self.entries.move_to_end(path)
+			return entry
+
+	def put(self, path, etag, response):
+		if not self.size:
+			return
+		with self.lock:
+			self.entries[path] = (etag, response)
+			self.entries.move_to_end(path)
+			if len(self.entries) > self.size:
+				self.entries.popitem(last=False)
+
+	def discard(self, path):
+		with self.lock:
+			self.entries.pop(path, None)
+
+
+def retry_delay(attempt, backoff, retry_after=None):
+	if retry_after:
+		try:
+			return max(0.0, float(retry_after))
+		except ValueError:
+			pass
+	return backoff * 2 ** attempt * random.uniform(0.5, 1.0)
+
+
+def video_path(video_id):
+	return '/video/%d' % video_id
+
+
+def ids_path(video_ids):
+	return '/videos?ids=' + ','.join(str(video_id) for video_id in video_ids)
+
+
+def chunks(items, size):
+	for i in range(0, len(items), size):
+		yield items[i:i + size]
+
+
+def _encode(body):
+	if body is None:
+		return None, {}
+	return json.dumps(body).encode('utf-8'), {'Content-Type': 'application/json'}
+
+
+def _raw_request(host, method, path, body):
+	data, headers = _encode(body)
+	lines = ['%s %s HTTP/1.1' % (method, path), 'Host: ' + host, 'Content-Length: %d' % len(data or b'')]
+	lines.extend('%s: %s' % header for header in headers.items())
+	return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + (data or b'')
+
+
+def _record(response):
+	if response.status == 404:
+		return None
+	response.raise_for_status()
+	return response.json()
+
+
+def _bulk_result(response):
+	try:
+		return _record(response)
+	except APIError as e:
+		return e
+
+
+def _create_body(record):
+	return {'name': record['name'], 'views': record['views'], 'likes': record['likes']}
+
+
+class _SharedReader(object):
+	"""Hands every ``HTTPResponse`` the same buffered reader and keeps it open.
+
+	Pipelined responses arrive back to back, so a reader per response would
+	buffer and lose the start of the next one.
+	"""
+
+	def __init__(self, reader):
+		self.reader = reader
+
+	def makefile(self, *args, **kwargs):
+		return self
+
+	def __getattr__(self, name):
+		return getattr(self.reader, name)
+
+	def close(self):
+		pass
+
+
+class VideoClient(object):
+	"""Thread-safe client holding up to ``pool_size`` keep-alive connections."""
+
+	def __init__(self, base_url='http://127.0.0.1:8000', pool_size=8, timeout=10, retries=3, backoff=0.05,
+			coalesce=True, max_batch=MAX_IDS, cache_size=10000, pipeline_depth=16):
+		parts = urlsplit(base_url)
+		self.host, self.port = parts.hostname, parts.port or 80
+		self.timeout = timeout
+		self.retries = retries
+		self.backoff = backoff
+		self.coalesce = coalesce
+		self.max_batch = min(max_batch, MAX_IDS)
+		self.pipeline_depth = pipeline_depth
+		self.pool_size = pool_size
+		self.pool = queue.LifoQueue(pool_size)
+		self.slots = threading.BoundedSemaphore(pool_size)
+		self.cache = ETagCache(cache_size)
+		self.pending = OrderedDict()
+		self.pending_ready = threading.Condition()
+		self.batcher = None
+		self.executor = None
+
+	@contextmanager
+	def connection(self):
+		with self.slots:
+			try:
+				conn = self.pool.get_nowait()
+			except queue.Empty:
+				conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+			try:
+				yield conn
+			except BaseException:
+				conn.close()
+				raise
+			self.pool.put_nowait(conn)
+
+	def _send(self, conn, method, path, body, headers):
+		data, content_headers = _encode(body)
+		headers = dict(headers or {}, **content_headers)
+		conn.request(method, path, data, headers)
+		response = conn.getresponse()
+		result = Response(response.status, response.getheaders(), response.read())
+		if response.will_close:
+			conn.close()
+		return result
+
+	def request(self, method, path, body=None, headers=None):
+		attempt = 0
+		while True:
+			response = None
+			try:
+				with self.connection() as conn:
+					response = self._send(conn, method, path, body, headers)
+			except (OSError, http.client.HTTPException):
+				if method not in IDEMPOTENT or attempt >= self.retries:
+					raise
+			else:
+				if response.status not in RETRY_STATUSES or attempt >= self.retries:
+					return response
+			time.sleep(retry_delay(attempt, self.backoff, response and response.headers.get('retry-after')))
+			attempt += 1
+
+	def get_json(self, path):
+		"""GET ``path``, revalidating a cached copy; returns the ``Response``."""
+		cached = self.cache.get(path)
+		response = self.request('GET', path, headers={'If-None-Match': cached[0]} if cached else None)
+		if response.status == 304 and cached:
+			return cached[1]
+		etag = response.headers.get('etag')
+		if response.status == 200 and etag:
+			self.cache.put(path, etag, response)
+		elif response.status == 404:
+			self.cache.discard(path)
+		return response
+
+	def get(self, video_id):
+		"""The video as a dict, or ``None`` when it does not exist."""
+		if not self.coalesce:
+			return _record(self.get_json(video_path(video_id)))
+		future = Future()
+		with self.pending_ready:
+			self.pending.setdefault(video_id, []).append(future)
+			if self.batcher is None or not self.batcher.is_alive():
+				self.batcher = threading.Thread(target=self._run_batcher, name='video-client-batcher', daemon=True)
+				self.batcher.start()
+			self.pending_ready.notify()
+		return future.result()
+
+	def _run_batcher(self):
+		while True:
+			with self.pending_ready:
+				while not self.pending:
+					self.pending_ready.wait()
+				batch = []
+				while self.pending and len(batch) < self.max_batch:
+					batch.append(self.pending.popitem(last=False))
+			try:
+				found = self._fetch([video_id for video_id, _ in batch])
+			except BaseException as e:
+				for _, futures in batch:
+					for future in futures:
+						future.set_exception(e)
+				continue
+			for video_id, futures in batch:
+				for future in futures:
+					future.set_result(found.get(video_id))
+
+	def _fetch(self, video_ids):
+		if len(video_ids) == 1:
+			record = _record(self.get_json(video_path(video_ids[0])))
+			return {record['id']: record} if record else {}
+		response = self.get_json(ids_path(video_ids))
+		response.raise_for_status()
+		return dict((record['id'], record) for record in response.json())
+
+	def get_many(self, video_ids):
+		"""``{id: video}`` for the ids that exist, in requests of up to 1000 ids."""
+		found = {}
+		for chunk in chunks(list(video_ids), self.max_batch):
+			found.update(self._fetch(chunk))
+		return found
+
+	def list(self, after=None, limit=100):
+		path = '/videos?limit=%d' % limit + ('&after=%d' % after if after is not None else '')
+		response = self.get_json(path)
+		response.raise_for_status()
+		return response.json()
+
+	def create(self, video_id, name, views=0, likes=0):
+		return self._write('PUT', video_id, video_path(video_id), {'name': name, 'views': views, 'likes': likes})
+
+	def update(self, video_id, **values):
+		return self._write('PATCH', video_id, video_path(video_id), values)
+
+	def increment(self, video_id, views=0, likes=0):
+		return self._write('POST', video_id, video_path(video_id) + '/increment', {'views': views, 'likes': likes})
+
+	def _write(self, method, video_id, path, body):
+		self.cache.discard(video_path(video_id))
+		response = self.request(method, path, body)
+		response.raise_for_status()
+		return response.json()
+
+	def bulk_create(self, records):
+		"""Create many videos; see ``pipeline`` for the result list."""
+		return self.pipeline([('PUT', video_path(record['id']), _create_body(record)) for record in records])
+
+	def bulk_update(self, updates):
+		"""Apply ``{id: {field: value}}`` updates."""
+		return self.pipeline([('PATCH', video_path(video_id), values) for video_id, values in updates.items()])
+
+	def bulk_increment(self, increments):
+		"""Apply ``{id: {'views': n, 'likes': n}}`` increments."""
+		return self.pipeline([('POST', video_path(video_id) + '/increment', values)
+			for video_id, values in increments.items()])
+
+	def pipeline(self, requests):
+		"""Send ``(method, path, body)`` writes pipelined over the pool.
+
+		Returns one entry per request in order: the video dict, ``None`` for
+		404, or the ``APIError`` for a failed request. Raises only when a
+		connection fails with non-idempotent requests left unanswered.
+		"""
+		for _, path, _ in requests:
+			if path.startswith('/video/'):
+				self.cache.discard('/video/' + path.split('/')[2])
+		if self.executor is None:
+			self.executor = ThreadPoolExecutor(self.pool_size, thread_name_prefix='video-client')
+		results = []
+		for chunk_results in self.executor.map(self._pipeline_chunk, chunks(requests, self.pipeline_depth)):
+			results.extend(chunk_results)
+		return results
+
+	def _pipeline_chunk(self, requests):
+		responses = []
+		try:
+			with self.connection() as conn:
+				if conn.sock is None:
+					conn.connect()
+				conn.sock.sendall(b''.join(_raw_request(self.host, method, path, body) for method, path, body in requests))
+				reader = _SharedReader(conn.sock.makefile('rb'))
+				try:
+					for method, _, _ in requests:
+						response = http.client.HTTPResponse(reader, method=method)
+						response.begin()
+						responses.append(Response(response.status, response.getheaders(), response.read()))
+						if response.will_close:
+							break
+				finally:
+					reader.reader.close()
+				if len(responses) < len(requests) or responses and responses[-1].headers.get('connection') == 'close':
+					conn.close()
+		except (OSError, http.client.HTTPException):
+			# The server went away mid-pipeline; only resend what is safe to repeat.
+			if any(method not in IDEMPOTENT for method, _, _ in requests[len(responses):]):
+				raise
+		for method, path, body in requests[len(responses):]:
+			responses.append(self.request(method, path, body))
+		results = []
+		for (method, path, body), response in zip(requests, responses):
+			if response.status in RETRY_STATUSES:
+				response = self.request(method, path, body)
+			results.append(_bulk_result(response))
+		return results
+
+	def close(self):
+		if self.executor is not None:
+			self.executor.shutdown()
+			self.executor = None
+		while True:
+			try:
+				self.pool.get_nowait().close()
+			except queue.Empty:
+				break
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc_info):
+		self.close()
+
+
+class _AsyncConnection(object):
+	def __init__(self, reader, writer):
+		self.reader = reader
+		self.writer = writer
+
+	async def send(self, data):
+		self.writer.write(data)
+		await self.writer.drain()
+
+	async def read_response(self):
+		status_line = await self.reader.readline()
+		if not status_line:
+			raise ConnectionError("Connection closed by server")
+		status = int(status_line.split()[1])
+		headers = []
+		while True:
+			line = await self.reader.readline()
+			if line in (b'\r\n', b'\n', b''):
+				break
+			name, _, value = line.decode('latin-1').partition(':')
+			headers.append((name.strip(), value.strip()))
+		response = Response(status, headers, b'')
+		if response.headers.get('transfer-encoding', 'identity') != 'identity':
+			raise http.client.HTTPException("Unsupported transfer encoding")
+		response.body = await self.reader.readexactly(int(response.headers.get('content-length', 0)))
+		return response
+
+	def close(self):
+		self.writer.close()
+
+
+class AsyncVideoClient(object):
+	"""asyncio version of ``VideoClient`` for use from a single event loop.
+
+	``get`` calls made in the same loop iteration are sent as one
+	multi-get, and later ones wait for the next batch while it is in flight.
+	Bulk writes are spread over the pool and pipelined like the sync client.
+	"""
+
+	def __init__(self, base_url='http://127.0.0.1:8000', pool_size=8, timeout=10, retries=3, backoff=0.05,
+			coalesce=True, max_batch=MAX_IDS, cache_size=10000, pipeline_depth=16):
+		parts = urlsplit(base_url)
+		self.host, self.port = parts.hostname, parts.port or 80
+		self.timeout = timeout
+		self.retries = retries
+		self.backoff = backoff
+		self.coalesce = coalesce
+		self.max_batch = min(max_batch, MAX_IDS)
+		self.pipeline_depth = pipeline_depth
+		self.pool_size = pool_size
+		self.idle = []
+		self.slots = None
+		self.cache = ETagCache(cache_size)
+		self.pending = OrderedDict()
+		self.batcher = None
+
+	async def _checkout(self):
+		if self.slots is None:
+			self.slots = asyncio.Semaphore(self.pool_size)
+		await self.slots.acquire()
+		if self.idle:
+			return self.idle.pop()
+		try:
+			reader, writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), self.timeout)
+		except BaseException:
+			self.slots.release()
+			raise
+		writer.get_extra_info('socket').setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+		return _AsyncConnection(reader, writer)
+
+	def _checkin(self, conn, reuse):
+		if reuse:
+			self.idle.append(conn)
+		else:
+			conn.close()
+		self.slots.release()
+
+	async def _exchange(self, requests):
+		"""Pipeline ``requests`` on one connection; returns the responses read."""
+		conn = await self._checkout()
+		responses = []
+		reuse = False
+		try:
+			await conn.send(b''.join(_raw_request(self.host, method, path, body) for method, path, body in requests))
+			while len(responses) < len(requests):
+				response = await asyncio.wait_for(conn.read_response(), self.timeout)
+				responses.append(response)
+				if response.headers.get('connection') == 'close':
+					break
+			reuse = len(responses) == len(requests) and responses[-1].headers.get('connection') != 'close'
+		except (OSError, http.client.HTTPException, asyncio.IncompleteReadError, asyncio.TimeoutError):
+			if any(method not in IDEMPOTENT for method, _, _ in requests[len(responses):]):
+				raise
+		finally:
+			self._checkin(conn, reuse)
+		return responses
+
+	async def request(self, method, path, body=None, headers=None):
+		data = _raw_request(self.host, method, path, body)
+		if headers:
+			head, _, rest = data.partition(b'\r\n')
+			data = head + b'\r\n' + b''.join(('%s: %s\r\n' % header).encode('latin-1') for header in headers.items()) + rest
+		attempt = 0
+		while True:
+			response = None
+			conn = await self._checkout()
+			reuse = False
+			try:
+				await conn.send(data)
+				response = await asyncio.wait_for(conn.read_response(), self.timeout)
+				reuse = response.headers.get('connection') != 'close'
+			except (OSError, http.client.HTTPException, asyncio.IncompleteReadError, asyncio.TimeoutError):
+				if method not in IDEMPOTENT or attempt >= self.retries:
+					raise
+			finally:
+				self._checkin(conn, reuse)
+			if response is not None and (response.status not in RETRY_STATUSES or attempt >= self.retries):
+				return response
+			await asyncio.sleep(retry_delay(attempt, self.backoff, response and response.headers.get('retry-after')))
+			attempt += 1
+
+	async def get_json(self, path):
+		cached = self.cache.get(path)
+		response = await self.request('GET', path, headers={'If-None-Match': cached[0]} if cached else None)
+		if response.status == 304 and cached:
+			return cached[1]
+		etag = response.headers.get('etag')
+		if response.status == 200 and etag:
+			self.cache.put(path, etag, response)
+		elif response.status == 404:
+			self.cache.discard(path)
+		return response
+
+	async def get(self, video_id):
+		if not self.coalesce:
+			return _record(await self.get_json(video_path(video_id)))
+		loop = asyncio.get_running_loop()
+		future = loop.create_future()
+		self.pending.setdefault(video_id, []).append(future)
+		if self.batcher is None or self.batcher.done():
+			self.batcher = loop.create_task(self._run_batcher())
+		return await future
+
+	async def _run_batcher(self):
+		# Yield once so every get() issued in this loop iteration joins the batch.
+		await asyncio.sleep(0)
+		while self.pending:
+			batch = []
+			while self.pending and len(batch) < self.max_batch:
+				batch.append(self.pending.popitem(last=False))
+			try:
+				found = await self._fetch([video_id for video_id, _ in batch])
+			except Exception as e:
+				for _, futures in batch:
+					for future in futures:
+						if not future.done():
+							future.set_exception(e)
+				continue
+			for video_id, futures in batch:
+				for future in futures:
+					if not future.done():
+						future.set_result(found.get(video_id))
+
+	async def _fetch(self, video_ids):
+		if len(video_ids) == 1:
+			record = _record(await self.get_json(video_path(video_ids[0])))
+			return {record['id']: record} if record else {}
+		response = await self.get_json(ids_path(video_ids))
+		response.raise_for_status()
+		return dict((record['id'], record) for record in response.json())
+
+	async def get_many(self, video_ids):
+		found = {}
+		for chunk_found in await asyncio.gather(*(self._fetch(chunk) for chunk in chunks(list(video_ids), self.max_batch))):
+			found.update(chunk_found)
+		return found
+
+	async def list(self, after=None, limit=100):
+		path = '/videos?limit=%d' % limit + ('&after=%d' % after if after is not None else '')
+		response = await self.get_json(path)
+		response.raise_for_status()
+		return response.json()
+
+	async def create(self, video_id, name, views=0, likes=0):
+		return await self._write('PUT', video_id, video_path(video_id), {'name': name, 'views': views, 'likes': likes})
+
+	async def update(self, video_id, **values):
+		return await self._write('PATCH', video_id, video_path(video_id), values)
+
+	async def increment(self, video_id, views=0, likes=0):
+		return await self._write('POST', video_id, video_path(video_id) + '/increment', {'views': views, 'likes': likes})
+
+	async def _write(self, method, video_id, path, body):
+		self.cache.discard(video_path(video_id))
+		response = await self.request(method, path, body)
+		response.raise_for_status()
+		return response.json()
+
+	async def bulk_create(self, records):
+		return await self.pipeline([('PUT', video_path(record['id']), _create_body(record)) for record in records])
+
+	async def bulk_update(self, updates):
+		return await self.pipeline([('PATCH', video_path(video_id), values) for video_id, values in updates.items()])
+
+	async def bulk_increment(self, increments):
+		return await self.pipeline([('POST', video_path(video_id) + '/increment', values)
+			for video_id, values in increments.items()])
+
+	async def pipeline(self, requests):
+		"""Same contract as ``VideoClient.pipeline``."""
+		for _, path, _ in requests:
+			if path.startswith('/video/'):
+				self.cache.discard('/video/' + path.split('/')[2])
+		results = []
+		for chunk_results in await asyncio.gather(*(self._pipeline_chunk(chunk)
+				for chunk in chunks(requests, self.pipeline_depth))):
+			results.extend(chunk_results)
+		return results
+
+	async def _pipeline_chunk(self, requests):
+		responses = await self._exchange(requests)
+		for method, path, body in requests[len(responses):]:
+			responses.append(await self.request(method, path, body))
+		results = []
+		for (method, path, body), response in zip(requests, responses):
+			if response.status in RETRY_STATUSES:
+				response = await self.request(method, path, body)
+			results.append(_bulk_result(response))
+		return results
+
+	async def close(self):
+		while self.idle:
+			conn = self.idle.pop()
+			conn.close()
+			try:
+				await conn.writer.wait_closed()
+			except OSError:
+				pass
+
+	async def __aenter__(self):
+		return self
+
+	async def __aexit__(self, *exc_info):
+		await self.close()
@@ -1,17 +1,44 @@
-from Flask_Rest_API import app, db, api
-from flask_restful import Resource, reqparse, abort, fields, marshal_with
-from Flask_Rest_API.models import VideoModel
+from flask import g, request
 
+from Flask_Rest_API import create_app, fields, storage
+from Flask_Rest_API.admin import AdmissionStats, DatabaseStats, SlowQueries
+from Flask_Rest_API.history import RESOLUTIONS, ViewHistory, get_view_history
+from Flask_Rest_API.maintenance import MaintenanceScheduler
+from Flask_Rest_API.querycount import QueryCounter, query_budget
+from Flask_Rest_API.querylog import SlowQueryLog
+from flask_restful import Api, Resource, reqparse, abort
+from Flask_Rest_API.storage import VideoExists, get_repository
+from Flask_Rest_API.timing import ServerTiming, marshal_with, parse_args
+from Flask_Rest_API.validation import Field, Schema
 
-video_put_args = reqparse.RequestParser()
-video_put_args.add_argument("name", type=str, help="Name of the video is required", required=True)
-video_put_args.add_argument("views", type=int, help="Views of the video", required=True)
-video_put_args.add_argument("likes", type=int, help="Likes on the video", required=True)
 
-video_update_args = reqparse.RequestParser()
-video_update_args.add_argument("name", type=str, help="Name of the video is required")
-video_update_args.add_argument("views", type=int, help="Views of the video")
-video_update_args.add_argument("likes", type=int, help="Likes on the video")
+video_put_args = Schema(
+	Field("name", type=str, help="Name of the video is required", required=True),
+	Field("views", type=int, help="Views of the video", required=True),
+	Field("likes", type=int, help="Likes on the video", required=True),
+)
+
+video_update_args = Schema(
+	Field("name", type=str, help="Name of the video is required"),
+	Field("views", type=int, help="Views of the video"),
+	Field("likes", type=int, help="Likes on the video"),
+)
+
+video_increment_args = Schema(
+	Field("views", type=int, help="Views to add to the video", default=0),
+	Field("likes", type=int, help="Likes to add to the video", default=0),
+)
+
+video_history_args = reqparse.RequestParser()
+video_history_args.add_argument("resolution", type=str, location="args", default="hour", choices=tuple(RESOLUTIONS),
+	help="Resolution must be one of: minute, hour, day")
+video_history_args.add_argument("from", type=int, location="args", help="Start of the range as a unix timestamp")
+video_history_args.add_argument("to", type=int, location="args", help="End of the range as a unix timestamp")
+
+video_list_args = reqparse.RequestParser()
+video_list_args.add_argument("ids", type=str, location="args", help="Comma separated list of video ids")
+video_list_args.add_argument("after", type=int, location="args", help="Only list videos with a greater id")
+video_list_args.add_argument("limit", type=int, location="args", default=100, help="Maximum number of videos to list")
 
 resource_fields = {
 	'id': fields.Integer,
@@ -20,46 +47,159 @@ resource_fields = {
 	'likes': fields.Integer
 }
 
+MAX_LIST_LIMIT = 1000
+
 class Video(Resource):
+	@query_budget('get')
 	@marshal_with(resource_fields)
 	def get(self, video_id):
-		result = VideoModel.query.filter_by(id=video_id).first()
+		result = get_repository().get(video_id)
 		if not result:
 			abort(404, message="Could not find video with that id")
 		return result
 
+	@query_budget('create')
 	@marshal_with(resource_fields)
 	def put(self, video_id):
-		args = video_put_args.parse_args()
-		result = VideoModel.query.filter_by(id=video_id).first()
-		if result:
+		args = parse_args(video_put_args)
+		try:
+			video = get_repository().create(video_id, args['name'], args['views'], args['likes'])
+		except VideoExists:
 			abort(409, message="Video id taken...")
-
-		video = VideoModel(id=video_id, name=args['name'], views=args['views'], likes=args['likes'])
-		db.session.add(video)
-		db.session.commit()
 		return video, 201
 
+	@query_budget(lambda: update_operations(g.video_update))
 	@marshal_with(resource_fields)
 	def patch(self, video_id):
-		args = video_update_args.parse_args()
-		result = VideoModel.query.filter_by(id=video_id).first()
+		# Kept for the query budget, which is derived from what was updated.
+		g.video_update = update_values(parse_args(video_update_args))
+		result = update_video(video_id, g.video_update)
 		if not result:
 			abort(404, message="Video doesn't exist, cannot update")
+		return result
+
 
-		if args['name']:
-			result.name = args['name']
-		if args['views']:
-			result.views = args['views']
-		if args['likes']:
-			result.likes = args['likes']
+def update_values(args):
+	return dict((key, value) for key, value in args.items() if value)
 
-		db.session.commit()
 
+def reads_previous(values):
+	# View history records the change, so the previous counters are read first.
+	return get_view_history().enabled and ('views' in values or 'likes' in values)
+
+
+def update_operations(values):
+	"""Repository operations ``update_video`` runs for ``values``, for its query budget."""
+	if not values:
+		return 'get'
+	return ('get', 'update') if reads_previous(values) else 'update'
+
+
+def update_video(video_id, values):
+	"""Apply a PATCH of ``values``; returns the new record, or ``None`` if missing.
+
+	Shared with the ASGI app, so both record view history the same way.
+	"""
+	repository = get_repository()
+	before = repository.get(video_id) if reads_previous(values) else None
+	result = repository.update(video_id, **values) if values else repository.get(video_id)
+	get_view_history().record_change(before, result)
+	return result
+
+
+class VideoIncrement(Resource):
+	@query_budget('increment')
+	@marshal_with(resource_fields)
+	def post(self, video_id):
+		args = parse_args(video_increment_args)
+		result = get_repository().increment(video_id, views=args['views'] or 0, likes=args['likes'] or 0)
+		if not result:
+			abort(404, message="Video doesn't exist, cannot update")
+		get_view_history().record(video_id, views=args['views'] or 0, likes=args['likes'] or 0)
 		return result
-		
 
-api.add_resource(Video, "/video/<int:video_id>")
+
+class VideoHistory(Resource):
+	def get(self, video_id):
+		view_history = get_view_history()
+		if not view_history.enabled:
+			abort(404, message="View history is disabled")
+		args = parse_args(video_history_args)
+		return view_history.query(video_id, args['resolution'], args['from'], args['to'])
+
+
+def list_operation():
+	return 'get_many' if request.args.get('ids') else 'scan'
+
+
+class VideoList(Resource):
+	@query_budget(list_operation)
+	@marshal_with(resource_fields)
+	def get(self):
+		args = parse_args(video_list_args)
+		repository = get_repository()
+		if args['ids']:
+			try:
+				video_ids = [int(video_id) for video_id in args['ids'].split(',')]
+			except ValueError:
+				abort(400, message={'ids': "Comma separated list of video ids"})
+			if len(video_ids) > MAX_LIST_LIMIT:
+				abort(400, message={'ids': "At most %d ids per request" % MAX_LIST_LIMIT})
+			found = repository.get_many(video_ids)
+			return [found[video_id] for video_id in video_ids if video_id in found]
+		return repository.scan(after=args['after'], limit=max(0, min(args['limit'], MAX_LIST_LIMIT)))
+
+
+def conditional_get(response):
+	# Lets clients revalidate cached videos with If-None-Match and get a 304.
+	if request.method == 'GET' and response.status_code == 200 and request.endpoint in ('video', 'videolist'):
+		response.add_etag()
+		response.make_conditional(request)
+	return response
+
+
+def init_app(app):
+	storage.init_app(app)
+	SlowQueryLog(app)
+	QueryCounter(app)
+	server_timing = ServerTiming(app)
+	if app.config.get('ACCESS_LOG'):
+		from Flask_Rest_API.accesslog import AccessLog
+		AccessLog(app)
+	if app.config.get('PROFILING'):
+		from Flask_Rest_API.profiling import Profiler
+		Profiler(app)
+	if app.config.get('METRICS'):
+		from Flask_Rest_API.metrics import Metrics
+		Metrics(app)
+	if app.config.get('TRACING'):
+		from Flask_Rest_API.tracing import Tracer
+		Tracer(app)
+	MaintenanceScheduler(app)
+	ViewHistory(app)
+	# Optional middleware is only imported when it is switched on.
+	if app.config.get('ADMISSION_CONTROL'):
+		from Flask_Rest_API import admission
+		admission.init_app(app)
+	if app.config.get('RATE_LIMIT'):
+		from Flask_Rest_API.ratelimit import RateLimiter
+		RateLimiter(app)
+	if app.config.get('CAPTURE_TRAFFIC'):
+		from Flask_Rest_API import capture
+		capture.init_app(app)
+
+	app.after_request(conditional_get)
+	api = Api(app)
+	server_timing.init_api(api)
+	api.add_resource(Video, "/video/<int:video_id>")
+	api.add_resource(VideoIncrement, "/video/<int:video_id>/increment")
+	api.add_resource(VideoHistory, "/video/<int:video_id>/history")
+	api.add_resource(VideoList, "/videos")
+	api.add_resource(SlowQueries, "/admin/slow-queries")
+	api.add_resource(DatabaseStats, "/admin/db")
+	api.add_resource(AdmissionStats, "/admin/admission")
+	return api
+
 
 if __name__ == "__main__":
-	app.run(debug=True)
\ No newline at end of file
+	create_app({'DEBUG': True}).run()
\ No newline at end of file
@@ -0,0 +1,35 @@
+"""Output fields for ``flask_restful.marshal_with``.
+
+Drop-in for the ``Integer`` and ``String`` fields of ``flask_restful.fields``,
+which imports ``flask_restful.inputs`` and with it pytz and aniso8601 for the
+date fields this API never uses.
+"""
+
+
+class Raw(object):
+	def __init__(self, default=None, attribute=None):
+		self.default = default
+		self.attribute = attribute
+
+	def format(self, value):
+		return value
+
+	def output(self, key, obj):
+		key = key if self.attribute is None else self.attribute
+		value = obj.get(key) if isinstance(obj, dict) else getattr(obj, key, None)
+		if value is None:
+			return self.default
+		return self.format(value)
+
+
+class Integer(Raw):
+	def __init__(self, default=0, **kwargs):
+		Raw.__init__(self, default=default, **kwargs)
+
+	def format(self, value):
+		return int(value)
+
+
+class String(Raw):
+	def format(self, value):
+		return str(value)
@@ -0,0 +1,174 @@
+import logging
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import text
+
+from Flask_Rest_API import db
+from Flask_Rest_API.models import VideoHistoryDay, VideoHistoryHour, VideoHistoryMinute
+
+
+logger = logging.getLogger(__name__)
+
+MINUTE = 60
+HOUR = 60 * 60
+DAY = 24 * HOUR
+
+RESOLUTIONS = {
+	'minute': (VideoHistoryMinute.__table__, MINUTE),
+	'hour': (VideoHistoryHour.__table__, HOUR),
+	'day': (VideoHistoryDay.__table__, DAY),
+}
+
+UPSERT = """INSERT INTO video_history_minute (video_id, bucket, views, likes)
+VALUES (:video_id, :bucket, :views, :likes)
+ON CONFLICT (video_id, bucket) DO UPDATE SET views = views + excluded.views, likes = likes + excluded.likes"""
+
+ROLLUP = """INSERT OR REPLACE INTO {target} (video_id, bucket, views, likes)
+SELECT video_id, bucket - bucket % :step, SUM(views), SUM(likes)
+FROM {source} WHERE bucket >= :since GROUP BY video_id, bucket - bucket % :step"""
+
+
+def floor(timestamp, step):
+	return int(timestamp) - int(timestamp) % step
+
+
+def ceil(timestamp, step):
+	return floor(timestamp + step - 1, step)
+
+
+class ViewHistory(object):
+	"""Per-video counter deltas in minute buckets, rolled up to hours and days.
+
+	Deltas are summed in memory and flushed to ``video_history_minute`` in one
+	batch. The rollup job rebuilds recent hours from minutes and recent days
+	from hours, then expires minutes and hours past their retention. Hours and
+	days are only rebuilt from a point where their source rows are complete,
+	so restarts and expiry never truncate a bucket.
+	"""
+
+	def __init__(self, app=None):
+		self.enabled = False
+		self.pending = {}
+		self.lock = threading.Lock()
+		self.thread = None
+		self.stopping = threading.Event()
+		self.last_rollup = None
+		if app is not None:
+			self.init_app(app)
+
+	def init_app(self, app):
+		app.extensions['view_history'] = self
+		self.enabled = app.config.get('VIDEO_HISTORY', False)
+		if not self.enabled:
+			return
+		self.engine = db.get_engine(app)
+		self.flush_interval = app.config.get('HISTORY_FLUSH_INTERVAL', 5)
+		self.rollup_interval = app.config.get('HISTORY_ROLLUP_INTERVAL', 60)
+		self.minute_retention = max(app.config.get('HISTORY_MINUTE_RETENTION', 2 * DAY), 2 * HOUR)
+		self.hour_retention = max(app.config.get('HISTORY_HOUR_RETENTION', 90 * DAY), 2 * DAY)
+		self.max_points = app.config.get('HISTORY_MAX_POINTS', 1000)
+		for table, _ in RESOLUTIONS.values():
+			table.create(self.engine, checkfirst=True)
+		app.before_first_request(self.start)
+
+	def record(self, video_id, views=0, likes=0, now=None):
+		if not self.enabled or not (views or likes):
+			return
+		key = (video_id, floor(now or time.time(), MINUTE))
+		with self.lock:
+			counts = self.pending.setdefault(key, [0, 0])
+			counts[0] += views
+			counts[1] += likes
+
+	def record_change(self, before, after):
+		if before and after:
+			self.record(after['id'], after['views'] - before['views'], after['likes'] - before['likes'])
+
+	def flush(self):
+		with self.lock:
+			pending, self.pending = self.pending, {}
+		if not pending:
+			return 0
+		rows = [{'video_id': video_id, 'bucket': bucket, 'views': views, 'likes': likes}
+			for (video_id, bucket), (views, likes) in pending.items()]
+		with self.engine.begin() as conn:
+			conn.execute(text(UPSERT), rows)
+		return len(rows)
+
+	def rollup(self, now=None):
+		now = now or time.time()
+		last = self.last_rollup or 0
+		hours_since = max(floor(last, HOUR), ceil(now - self.minute_retention, HOUR))
+		days_since = max(floor(last, DAY), ceil(now - self.hour_retention, DAY))
+		with self.engine.begin() as conn:
+			conn.execute(text(ROLLUP.format(target='video_history_hour', source='video_history_minute')),
+				step=HOUR, since=hours_since)
+			conn.execute(text(ROLLUP.format(target='video_history_day', source='video_history_hour')),
+				step=DAY, since=days_since)
+			conn.execute(text("DELETE FROM video_history_minute WHERE bucket < :before"), before=now - self.minute_retention)
+			conn.execute(text("DELETE FROM video_history_hour WHERE bucket < :before"), before=now - self.hour_retention)
+		self.last_rollup = now
+
+	def start(self):
+		if self.thread is None:
+			self.thread = threading.Thread(target=self.run_forever, name='view-history', daemon=True)
+			self.thread.start()
+
+	def stop(self):
+		self.stopping.set()
+		if self.thread is not None and self.thread is not threading.current_thread():
+			# Its last flush commits whatever is still pending.
+			self.thread.join()
+		elif self.thread is None and self.enabled:
+			self.flush()
+
+	def pre_fork(self):
+		if self.enabled:
+			self.flush()
+
+	def post_fork(self):
+		# Deltas recorded before the fork belong to the parent.
+		with self.lock:
+			self.pending = {}
+		self.lock = threading.Lock()
+		self.stopping = threading.Event()
+		self.thread = None
+		if self.enabled:
+			self.start()
+
+	def run_forever(self):
+		next_rollup = time.time() + self.rollup_interval
+		while not self.stopping.wait(self.flush_interval):
+			try:
+				self.flush()
+				if time.time() >= next_rollup:
+					self.rollup()
+					next_rollup = time.time() + self.rollup_interval
+			except Exception:
+				logger.exception("View history job failed")
+		self.flush()
+
+	def query(self, video_id, resolution, start=None, end=None):
+		table, step = RESOLUTIONS[resolution]
+		end = end if end is not None else int(time.time()) + step
+		start = start if start is not None else end - 60 * step
+		start = max(start, end - self.max_points * step)
+		query = table.select().where(table.c.video_id == video_id) \
+			.where(table.c.bucket >= floor(start, step)).where(table.c.bucket < end) \
+			.order_by(table.c.bucket).limit(self.max_points)
+		with self.engine.connect() as conn:
+			rows = conn.execute(query).fetchall()
+		return {
+			'video_id': video_id,
+			'resolution': resolution,
+			'from': start,
+			'to': end,
+			'points': [{'time': row.bucket, 'views': row.views, 'likes': row.likes} for row in rows],
+		}
+
+
+
+def get_view_history():
+	return current_app.extensions['view_history']
@@ -0,0 +1,165 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from sqlalchemy import event
+
+from Flask_Rest_API import db
+
+
+logger = logging.getLogger(__name__)
+
+
+class MaintenanceScheduler(object):
+	"""Background SQLite upkeep run while the app is quiet.
+
+	Every ``DB_MAINTENANCE_INTERVAL`` seconds the scheduler runs ``PRAGMA
+	optimize``, an ``incremental_vacuum`` and a ``wal_checkpoint(TRUNCATE)``,
+	waiting for a check window with at most ``DB_MAINTENANCE_IDLE_REQUESTS``
+	requests. A run is aborted through SQLite's progress handler once it
+	exceeds ``DB_MAINTENANCE_BUDGET_MS`` so writers are never blocked for long.
+	"""
+
+	def __init__(self, app=None):
+		self.engine = None
+		self.interval = None
+		self.thread = None
+		self.stopping = threading.Event()
+		self.requests = 0
+		self.last_run = None
+		self.last_duration = None
+		self.last_steps = {}
+		if app is not None:
+			self.init_app(app)
+
+	def init_app(self, app):
+		self.engine = db.get_engine(app)
+		if self.engine.dialect.name != 'sqlite':
+			return
+		if app.config.get('SQLITE_WAL'):
+			event.listen(self.engine, 'connect', enable_wal)
+		self.interval = app.config.get('DB_MAINTENANCE_INTERVAL')
+		self.check_interval = app.config.get('DB_MAINTENANCE_CHECK_INTERVAL', 60)
+		self.idle_requests = app.config.get('DB_MAINTENANCE_IDLE_REQUESTS', 10)
+		self.max_deferrals = app.config.get('DB_MAINTENANCE_MAX_DEFERRALS', 10)
+		self.budget = app.config.get('DB_MAINTENANCE_BUDGET_MS', 200) / 1000.0
+		self.vacuum_pages = app.config.get('DB_MAINTENANCE_VACUUM_PAGES', 1000)
+		if self.interval:
+			app.before_request(self.count_request)
+			app.before_first_request(self.start)
+		app.extensions['db_maintenance'] = self
+
+	def count_request(self):
+		self.requests += 1
+
+	def start(self):
+		if self.thread is None:
+			self.thread = threading.Thread(target=self.run_forever, name='db-maintenance', daemon=True)
+			self.thread.start()
+
+	def stop(self):
+		self.stopping.set()
+
+	def post_fork(self):
+		self.stopping = threading.Event()
+		self.thread = None
+		if self.interval:
+			self.start()
+
+	def run_forever(self):
+		due = time.time() + self.interval
+		deferrals = 0
+		while not self.stopping.wait(min(self.check_interval, self.interval)):
+			seen, self.requests = self.requests, 0
+			if time.time() < due:
+				continue
+			if seen > self.idle_requests and deferrals < self.max_deferrals:
+				deferrals += 1
+				continue
+			try:
+				self.run_once()
+			except Exception:
+				logger.exception("Database maintenance failed")
+			due = time.time() + self.interval
+			deferrals = 0
+
+	def run_once(self):
+		steps = [
+			('optimize', 'PRAGMA optimize'),
+			('incremental_vacuum', 'PRAGMA incremental_vacuum(%d)' % self.vacuum_pages),
+			('wal_checkpoint', 'PRAGMA wal_checkpoint(TRUNCATE)'),
+		]
+		started = time.perf_counter()
+		deadline = started + self.budget
+		results = {}
+		raw = self.engine.raw_connection()
+		connection = raw.connection
+		try:
+			connection.set_progress_handler(lambda: time.perf_counter() > deadline, 1000)
+			for name, statement in steps:
+				if time.perf_counter() > deadline:
+					results[name] = 'skipped'
+					continue
+				try:
+					connection.execute(statement).fetchall()
+					results[name] = 'ok'
+				except sqlite3.OperationalError as e:
+					results[name] = 'interrupted' if 'interrupt' in str(e) else str(e)
+		finally:
+			# The connection goes back to the pool; don't leave the deadline armed on it.
+			connection.set_progress_handler(None, 0)
+			raw.close()
+		self.last_run = time.time()
+		self.last_duration = time.perf_counter() - started
+		self.last_steps = results
+		return results
+
+	def stats(self):
+		stats = {
+			'last_run': self.last_run,
+			'last_duration_ms': self.last_duration * 1000 if self.last_duration is not None else None,
+			'last_steps': self.last_steps,
+		}
+		path = self.engine.url.database
+		if path and path != ':memory:':
+			stats['database_bytes'] = os.path.getsize(path) if os.path.exists(path) else 0
+			stats['wal_bytes'] = os.path.getsize(path + '-wal') if os.path.exists(path + '-wal') else 0
+		raw = self.engine.raw_connection()
+		try:
+			for pragma in ('page_size', 'page_count', 'freelist_count', 'auto_vacuum', 'journal_mode'):
+				stats[pragma] = raw.connection.execute('PRAGMA %s' % pragma).fetchone()[0]
+		finally:
+			raw.close()
+		return stats
+
+
+def enable_wal(dbapi_connection, connection_record):
+	dbapi_connection.execute('PRAGMA journal_mode=WAL')
+
+
+def enable_incremental_vacuum(engine):
+	# auto_vacuum only takes effect on an existing database after a full VACUUM.
+	raw = engine.raw_connection()
+	try:
+		raw.connection.execute('PRAGMA auto_vacuum=INCREMENTAL')
+		raw.connection.execute('VACUUM')
+	finally:
+		raw.close()
+
+
+if __name__ == "__main__":
+	import argparse
+	from Flask_Rest_API import create_app
+
+	parser = argparse.ArgumentParser(description="Run SQLite maintenance on the app database")
+	parser.add_argument("--enable-incremental-vacuum", action="store_true",
+		help="Switch the database to auto_vacuum=INCREMENTAL (runs a full VACUUM)")
+	args = parser.parse_args()
+	maintenance = create_app().extensions['db_maintenance']
+	if args.enable_incremental_vacuum:
+		enable_incremental_vacuum(maintenance.engine)
+	maintenance.budget = float('inf')
+	print(maintenance.run_once())
+	print(maintenance.stats())
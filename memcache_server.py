@@ -0,0 +1,147 @@
+"""Small memcached-compatible server for tests and local runs.
+
+Supports the text protocol commands used by ``cache.MemcacheClient``:
+get/gets, set/add/replace/cas, delete, flush_all, version, stats and quit.
+
+    python -m Flask_Rest_API.memcache_server --port 11211
+"""
+import argparse
+import socketserver
+import threading
+import time
+
+
+RELATIVE_EXPIRY_LIMIT = 60 * 60 * 24 * 30
+
+
+class Store(object):
+	def __init__(self):
+		self.items = {}
+		self.lock = threading.Lock()
+		self.next_cas = 1
+		self.stats = {'get_hits': 0, 'get_misses': 0, 'cmd_set': 0, 'cmd_get': 0}
+
+	def _expiry(self, exptime):
+		if exptime <= 0:
+			return None
+		if exptime <= RELATIVE_EXPIRY_LIMIT:
+			return time.time() + exptime
+		return exptime
+
+	def get(self, key):
+		with self.lock:
+			self.stats['cmd_get'] += 1
+			item = self.items.get(key)
+			if item and item[1] is not None and item[1] <= time.time():
+				del self.items[key]
+				item = None
+			self.stats['get_hits' if item else 'get_misses'] += 1
+			return item
+
+	def store(self, command, key, flags, exptime, data, cas=None):
+		"""Returns memcached's reply: STORED, NOT_STORED, EXISTS or NOT_FOUND."""
+		with self.lock:
+			self.stats['cmd_set'] += 1
+			item = self.items.get(key)
+			if item and item[1] is not None and item[1] <= time.time():
+				del self.items[key]
+				item = None
+			if command == 'cas':
+				if item is None:
+					return b'NOT_FOUND'
+				if item[3] != cas:
+					return b'EXISTS'
+			elif command == 'add' and item or command == 'replace' and not item:
+				return b'NOT_STORED'
+			self.items[key] = (flags, self._expiry(exptime), data, self.next_cas)
+			self.next_cas += 1
+			return b'STORED'
+
+	def delete(self, key):
+		with self.lock:
+			return self.items.pop(key, None) is not None
+
+	def flush(self):
+		with self.lock:
+			self.items.clear()
+
+
+class MemcacheHandler(socketserver.StreamRequestHandler):
+	def reply(self, line, noreply=False):
+		if not noreply:
+			self.wfile.write(line + b'\r\n')
+
+	def handle(self):
+		store = self.server.store
+		while True:
+			line = self.rfile.readline()
+			if not line:
+				return
+			parts = line.split()
+			if not parts:
+				continue
+			command = parts[0].decode(errors='replace')
+			if command in ('get', 'gets'):
+				out = []
+				for key in parts[1:]:
+					item = store.get(key)
+					if item and command == 'gets':
+						out.append(b'VALUE %s %d %d %d\r\n%s\r\n' % (key, item[0], len(item[2]), item[3], item[2]))
+					elif item:
+						out.append(b'VALUE %s %d %d\r\n%s\r\n' % (key, item[0], len(item[2]), item[2]))
+				out.append(b'END\r\n')
+				self.wfile.write(b''.join(out))
+			elif command in ('set', 'add', 'replace', 'cas'):
+				try:
+					key, flags, exptime, size = parts[1], int(parts[2]), int(parts[3]), int(parts[4])
+					cas = int(parts[5]) if command == 'cas' else None
+				except (IndexError, ValueError):
+					self.reply(b'CLIENT_ERROR bad command line format')
+					continue
+				noreply = parts[-1] == b'noreply'
+				data = self.rfile.read(size + 2)[:-2]
+				self.reply(store.store(command, key, flags, exptime, data, cas), noreply)
+			elif command == 'delete' and len(parts) > 1:
+				deleted = store.delete(parts[1])
+				self.reply(b'DELETED' if deleted else b'NOT_FOUND', parts[-1] == b'noreply')
+			elif command == 'flush_all':
+				store.flush()
+				self.reply(b'OK', parts[-1] == b'noreply')
+			elif command == 'version':
+				self.reply(b'VERSION 1.6.0-flask-rest-api')
+			elif command == 'stats':
+				with store.lock:
+					stats = dict(store.stats, curr_items=len(store.items))
+				self.wfile.write(b''.join(b'STAT %s %d\r\n' % (name.encode(), value) for name, value in stats.items()) + b'END\r\n')
+			elif command == 'quit':
+				return
+			else:
+				self.reply(b'ERROR')
+
+
+class MemcacheServer(socketserver.ThreadingTCPServer):
+	daemon_threads = True
+	allow_reuse_address = True
+
+	def __init__(self, address):
+		socketserver.ThreadingTCPServer.__init__(self, address, MemcacheHandler)
+		self.store = Store()
+
+
+def start_server(host='127.0.0.1', port=0):
+	server = MemcacheServer((host, port))
+	thread = threading.Thread(target=server.serve_forever, name='memcache-server', daemon=True)
+	thread.start()
+	return server
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Run a local memcached-compatible server")
+	parser.add_argument("--host", default="127.0.0.1")
+	parser.add_argument("--port", type=int, default=11211)
+	args = parser.parse_args()
+	server = MemcacheServer((args.host, args.port))
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		server.server_close()
@@ -0,0 +1,329 @@
+import bisect
+import glob
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import weakref
+
+from flask import Response, current_app, g, request
+
+from Flask_Rest_API import instance_file
+from Flask_Rest_API.storage import get_engines
+
+
+logger = logging.getLogger(__name__)
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HELP = {
+	'video_api_requests_total': ('counter', "Requests by resource method and status"),
+	'video_api_request_duration_seconds': ('histogram', "Request latency by resource method"),
+	'video_api_db_duration_seconds': ('histogram', "Time spent in SQL per request by resource method"),
+	'video_api_db_queries_total': ('counter', "SQL statements issued by resource method"),
+	'video_api_cache_hits_total': ('counter', "Memcached lookups that found the video"),
+	'video_api_cache_misses_total': ('counter', "Memcached lookups that fell through to the database"),
+	'video_api_cache_hit_ratio': ('gauge', "Cache hits over cache lookups"),
+	'video_api_cache_pool_idle': ('gauge', "Idle memcached connections in the pool"),
+	'video_api_cache_pool_size': ('gauge', "Maximum memcached connections in the pool"),
+	'video_api_db_pool_checked_out': ('gauge', "Database connections in use"),
+	'video_api_db_pool_size': ('gauge', "Database connection pool size"),
+}
+
+
+def _labels(**labels):
+	return ','.join('%s="%s"' % (name, str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+		for name, value in sorted(labels.items()))
+
+
+class _Accumulator(object):
+	"""Series recorded by one thread; only contended while being scraped."""
+
+	def __init__(self):
+		self.lock = threading.Lock()
+		self.counters = {}
+		self.histograms = {}
+
+	def inc(self, key, value=1):
+		with self.lock:
+			self.counters[key] = self.counters.get(key, 0) + value
+
+	def observe(self, key, value):
+		with self.lock:
+			histogram = self.histograms.get(key)
+			if histogram is None:
+				# One count per bucket, then +Inf, then the sum.
+				histogram = self.histograms[key] = [0] * (len(BUCKETS) + 1) + [0.0]
+			histogram[bisect.bisect_left(BUCKETS, value)] += 1
+			histogram[-1] += value
+
+	def absorb(self, other):
+		with self.lock, other.lock:
+			_merge({'counters': self.counters, 'histograms': self.histograms},
+				{'counters': other.counters, 'histograms': other.histograms})
+
+
+class _Owner(object):
+	"""Kept in a ``threading.local``, so it is released when its thread exits."""
+
+
+def _merge(target, source):
+	for key, value in source.get('counters', {}).items():
+		target['counters'][key] = target['counters'].get(key, 0) + value
+	for key, values in source.get('histograms', {}).items():
+		histogram = target['histograms'].get(key)
+		if histogram is None:
+			target['histograms'][key] = list(values)
+		else:
+			for i, value in enumerate(values):
+				histogram[i] += value
+	for key, value in source.get('gauges', {}).items():
+		target['gauges'][key] = target['gauges'].get(key, 0) + value
+
+
+def resource_name():
+	"""``Video.get`` style name of the handler serving the current request."""
+	view_class = getattr(current_app.view_functions.get(request.endpoint), 'view_class', None)
+	if view_class is not None:
+		return '%s.%s' % (view_class.__name__, request.method.lower())
+	return request.endpoint or 'unmatched'
+
+
+def _empty():
+	return {'counters': {}, 'histograms': {}, 'gauges': {}}
+
+
+def _pid(path):
+	return int(os.path.basename(path).split('-')[1].split('.')[0])
+
+
+def _remove(path):
+	try:
+		os.remove(path)
+	except FileNotFoundError:
+		pass
+
+
+def _alive(pid):
+	try:
+		os.kill(pid, 0)
+	except ProcessLookupError:
+		return False
+	except PermissionError:
+		pass
+	return True
+
+
+class Metrics(object):
+	"""Request, database and cache metrics served at ``/metrics``.
+
+	Each request thread records into its own accumulator, and accumulators are
+	only merged when the endpoint is scraped; when a thread exits its series
+	are folded into a process-wide accumulator. With ``METRICS_DIR`` set, a
+	directory relative to the instance folder, every worker process also
+	writes its totals to ``metrics-<pid>-<start>.json`` there every
+	``METRICS_FLUSH_INTERVAL`` seconds, and a scrape of any worker sums the
+	files of all of them. A worker removes its file when
+	it exits, and files left by workers that died are removed when the next
+	one starts; Prometheus treats the drop in totals as a counter reset.
+	"""
+
+	def __init__(self, app=None):
+		self.app = None
+		self.directory = None
+		self.thread = None
+		self.stopping = threading.Event()
+		self._reset()
+		if app is not None:
+			self.init_app(app)
+
+	def _reset(self):
+		self.local = threading.local()
+		self.lock = threading.Lock()
+		self.base = _Accumulator()
+		self.accumulators = []
+		self.started = int(time.time() * 1000)
+
+	def init_app(self, app):
+		if not app.config.get('METRICS'):
+			return
+		self.app = app
+		directory = app.config.get('METRICS_DIR')
+		if directory:
+			self.directory = instance_file(app, directory)
+			os.makedirs(self.directory, exist_ok=True)
+		self.flush_interval = app.config.get('METRICS_FLUSH_INTERVAL', 5)
+		app.before_request(self.start_request)
+		app.after_request(self.record_request)
+		app.add_url_rule('/metrics', 'metrics', self.render_view)
+		if self.directory:
+			app.before_first_request(self.start)
+		app.extensions['metrics'] = self
+
+	def accumulator(self):
+		accumulator = getattr(self.local, 'accumulator', None)
+		if accumulator is None:
+			accumulator = self.local.accumulator = _Accumulator()
+			self.local.owner = _Owner()
+			weakref.finalize(self.local.owner, self.retire, accumulator)
+			with self.lock:
+				self.accumulators.append(accumulator)
+		return accumulator
+
+	def retire(self, accumulator):
+		"""Fold the series of a thread that exited into the process totals."""
+		with self.lock:
+			# Accumulators from before a fork were dropped with the rest of the parent's state.
+			if accumulator in self.accumulators:
+				self.accumulators.remove(accumulator)
+				self.base.absorb(accumulator)
+
+	def start_request(self):
+		g.metrics_start = time.perf_counter()
+
+	def record_request(self, response):
+		start = g.get('metrics_start')
+		if start is None:
+			return response
+		elapsed = time.perf_counter() - start
+		labels = _labels(resource=resource_name(), method=request.method)
+		accumulator = self.accumulator()
+		accumulator.inc(('video_api_requests_total', labels + ',' + _labels(status=response.status_code)))
+		accumulator.observe(('video_api_request_duration_seconds', labels), elapsed)
+		accumulator.observe(('video_api_db_duration_seconds', labels), g.get('db_time', 0.0))
+		accumulator.inc(('video_api_db_queries_total', labels), g.get('query_count', 0))
+		return response
+
+	def collect(self):
+		"""Totals of this process, merged from every thread's accumulator."""
+		snapshot = _empty()
+		# Held throughout so a thread retiring mid-scrape isn't counted twice.
+		with self.lock:
+			for accumulator in [self.base] + self.accumulators:
+				with accumulator.lock:
+					_merge(snapshot, {'counters': accumulator.counters, 'histograms': accumulator.histograms})
+		repository = self.app.extensions.get('video_repository')
+		client = getattr(repository, 'client', None)
+		if client is not None:
+			snapshot['counters'][('video_api_cache_hits_total', '')] = client.hits
+			snapshot['counters'][('video_api_cache_misses_total', '')] = client.misses
+			snapshot['gauges'][('video_api_cache_pool_idle', '')] = client.pool.qsize()
+			snapshot['gauges'][('video_api_cache_pool_size', '')] = client.pool.maxsize
+		with self.app.app_context():
+			engines = get_engines(self.app)
+		for engine in engines:
+			pool = engine.pool
+			if hasattr(pool, 'checkedout'):
+				labels = _labels(engine=repr(engine.url))
+				snapshot['gauges'][('video_api_db_pool_checked_out', labels)] = pool.checkedout()
+				snapshot['gauges'][('video_api_db_pool_size', labels)] = pool.size()
+		return snapshot
+
+	def write_snapshot(self):
+		snapshot = self.collect()
+		# Scrapes and the flush thread both write; each gets its own temporary file.
+		fd, tmp = tempfile.mkstemp(prefix='.metrics-', suffix='.tmp', dir=self.directory)
+		try:
+			with os.fdopen(fd, 'w') as f:
+				json.dump(dict((kind, [list(key) + [value] for key, value in series.items()])
+					for kind, series in snapshot.items()), f)
+			os.replace(tmp, self.snapshot_path())
+		except BaseException:
+			_remove(tmp)
+			raise
+
+	def snapshot_path(self):
+		return os.path.join(self.directory, 'metrics-%d-%d.json' % (os.getpid(), self.started))
+
+	def read_snapshots(self):
+		total = _empty()
+		for path in glob.glob(os.path.join(self.directory, 'metrics-*.json')):
+			try:
+				with open(path) as f:
+					data = json.load(f)
+			except (OSError, ValueError):
+				continue
+			snapshot = dict((kind, dict(((name, labels), value) for name, labels, value in data.get(kind, [])))
+				for kind in ('counters', 'histograms', 'gauges'))
+			# Gauges describe live state, so drop those of workers that have exited.
+			if not _alive(_pid(path)):
+				snapshot['gauges'] = {}
+			_merge(total, snapshot)
+		return total
+
+	def start(self):
+		if self.thread is None:
+			self.remove_dead_snapshots()
+			self.thread = threading.Thread(target=self.run_forever, name='metrics-flush', daemon=True)
+			self.thread.start()
+
+	def run_forever(self):
+		while not self.stopping.wait(self.flush_interval):
+			try:
+				self.write_snapshot()
+			except Exception:
+				logger.exception("Writing metrics snapshot failed")
+
+	def stop(self):
+		self.stopping.set()
+		if self.thread is not None and self.thread is not threading.current_thread():
+			self.thread.join()
+		if self.directory:
+			_remove(self.snapshot_path())
+
+	def remove_dead_snapshots(self):
+		for path in glob.glob(os.path.join(self.directory, 'metrics-*.json')):
+			if not _alive(_pid(path)):
+				_remove(path)
+
+	def pre_fork(self):
+		self.stopping.set()
+
+	def post_fork(self):
+		self._reset()
+		self.stopping = threading.Event()
+		self.thread = None
+		if self.directory:
+			self.start()
+
+	def render(self):
+		if self.directory:
+			self.write_snapshot()
+			snapshot = self.read_snapshots()
+		else:
+			snapshot = self.collect()
+		hits = snapshot['counters'].get(('video_api_cache_hits_total', ''))
+		misses = snapshot['counters'].get(('video_api_cache_misses_total', ''))
+		if hits is not None and hits + misses:
+			snapshot['gauges'][('video_api_cache_hit_ratio', '')] = hits / float(hits + misses)
+
+		series = {}
+		for kind in ('counters', 'histograms', 'gauges'):
+			for (name, labels), value in snapshot[kind].items():
+				series.setdefault(name, []).append((labels, value))
+		lines = []
+		for name in sorted(series):
+			kind, help_text = HELP.get(name, ('untyped', name))
+			lines.append('# HELP %s %s' % (name, help_text))
+			lines.append('# TYPE %s %s' % (name, kind))
+			for labels, value in sorted(series[name]):
+				if kind != 'histogram':
+					lines.append('%s%s %s' % (name, '{%s}' % labels if labels else '', _format(value)))
+					continue
+				prefix = labels + ',' if labels else ''
+				cumulative = 0
+				for bound, count in zip(BUCKETS + ('+Inf',), value):
+					cumulative += count
+					lines.append('%s_bucket{%sle="%s"} %d' % (name, prefix, bound, cumulative))
+				lines.append('%s_sum%s %s' % (name, '{%s}' % labels if labels else '', _format(value[-1])))
+				lines.append('%s_count%s %d' % (name, '{%s}' % labels if labels else '', cumulative))
+		return '\n'.join(lines) + '\n'
+
+	def render_view(self):
+		return Response(self.render(), mimetype='text/plain; version=0.0.4')
+
+
+def _format(value):
+	return repr(float(value)) if isinstance(value, float) else str(value)
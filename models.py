@@ -7,4 +7,35 @@ class VideoModel(db.Model):
 	likes = db.Column(db.Integer, nullable=False)
 
 	def __repr__(self):
-		return f"Video(name = {name}, views = {views}, likes = {likes})"
\ No newline at end of file
+		return f"Video(name = {name}, views = {views}, likes = {likes})"
+
+class VideoMetaModel(db.Model):
+	__tablename__ = 'video_meta'
+	id = db.Column(db.Integer, primary_key=True)
+	name = db.Column(db.String(100), nullable=False)
+
+
+class VideoCounterModel(db.Model):
+	__tablename__ = 'video_counters'
+	id = db.Column(db.Integer, primary_key=True)
+	views = db.Column(db.Integer, nullable=False)
+	likes = db.Column(db.Integer, nullable=False)
+
+
+class VideoHistoryMixin(object):
+	video_id = db.Column(db.Integer, primary_key=True)
+	bucket = db.Column(db.Integer, primary_key=True)
+	views = db.Column(db.Integer, nullable=False, default=0)
+	likes = db.Column(db.Integer, nullable=False, default=0)
+
+
+class VideoHistoryMinute(VideoHistoryMixin, db.Model):
+	__tablename__ = 'video_history_minute'
+
+
+class VideoHistoryHour(VideoHistoryMixin, db.Model):
+	__tablename__ = 'video_history_hour'
+
+
+class VideoHistoryDay(VideoHistoryMixin, db.Model):
+	__tablename__ = 'video_history_day'
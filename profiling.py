@@ -0,0 +1,182 @@
+import logging
+import os
+import random
+import sys
+import threading
+import time
+
+from flask import g, request
+
+from Flask_Rest_API import instance_file
+from Flask_Rest_API.admin import is_admin
+from Flask_Rest_API.metrics import resource_name
+
+
+logger = logging.getLogger(__name__)
+
+
+class Profiler(object):
+	"""Profiles selected requests and saves their collapsed stacks.
+
+	A request is profiled when it sends ``X-Profile: 1`` with a valid
+	``X-Admin-Token``, or at random for a ``PROFILE_SAMPLE_RATE`` share of
+	requests. With ``PROFILE_MODE = 'sample'`` a background thread samples
+	the stacks of profiled requests every ``PROFILE_INTERVAL_MS``; it only
+	runs when a request thread gives up the GIL, so time in code that holds
+	it is under-counted. ``'trace'`` installs ``sys.setprofile`` on the
+	request's thread and records exact self time per stack in microseconds,
+	at a much higher cost to the profiled request only.
+
+	Stacks are summed per resource method across requests and every
+	``PROFILE_FLUSH_INTERVAL`` seconds rewritten to
+	``PROFILE_DIR/<resource>.<pid>.folded``, under the instance folder, as
+	``frame;frame;... count`` lines, the input format of flamegraph.pl and
+	speedscope.
+	"""
+
+	def __init__(self, app=None):
+		self._reset()
+		if app is not None:
+			self.init_app(app)
+
+	def _reset(self):
+		self.active = {}
+		self.stacks = {}
+		self.labels = {}
+		self.dirty = False
+		self.lock = threading.Lock()
+		self.wakeup = threading.Event()
+		self.thread = None
+
+	def init_app(self, app):
+		self.sample_rate = app.config.get('PROFILE_SAMPLE_RATE', 0.0)
+		self.mode = app.config.get('PROFILE_MODE', 'sample')
+		if self.mode not in ('sample', 'trace'):
+			raise ValueError("Unknown PROFILE_MODE: %r" % self.mode)
+		self.directory = instance_file(app, app.config.get('PROFILE_DIR', 'profiles'))
+		self.interval = app.config.get('PROFILE_INTERVAL_MS', 5) / 1000.0
+		self.flush_interval = app.config.get('PROFILE_FLUSH_INTERVAL', 10)
+		app.before_request(self.start_request)
+		app.teardown_request(self.end_request)
+		app.extensions['profiler'] = self
+
+	def start_request(self):
+		if random.random() < self.sample_rate or (request.headers.get('X-Profile') == '1' and is_admin()):
+			g.profiled = resource_name()
+			self.start()
+			if self.mode == 'trace':
+				g.profile_tracer = _StackTracer(sys._getframe(), self.label)
+				sys.setprofile(g.profile_tracer)
+				return
+			with self.lock:
+				self.active[threading.get_ident()] = g.profiled
+			self.wakeup.set()
+
+	def end_request(self, exc=None):
+		resource = g.get('profiled')
+		if resource is None:
+			return
+		if self.mode == 'trace':
+			sys.setprofile(None)
+			self.add(resource, g.profile_tracer.counts)
+			return
+		with self.lock:
+			self.active.pop(threading.get_ident(), None)
+
+	def add(self, resource, counts):
+		with self.lock:
+			stacks = self.stacks.setdefault(resource, {})
+			for stack, count in counts.items():
+				stacks[stack] = stacks.get(stack, 0) + count
+			self.dirty = True
+
+	def start(self):
+		if self.thread is None:
+			with self.lock:
+				if self.thread is None:
+					self.thread = threading.Thread(target=self.run_forever, name='profiler', daemon=True)
+					self.thread.start()
+
+	def post_fork(self):
+		self._reset()
+
+	def run_forever(self):
+		last_flush = time.time()
+		while True:
+			self.wakeup.clear()
+			if self.active:
+				time.sleep(self.interval)
+				self.sample()
+			else:
+				self.wakeup.wait(self.flush_interval)
+			if time.time() - last_flush >= self.flush_interval:
+				try:
+					self.flush()
+				except Exception:
+					logger.exception("Writing profiles failed")
+				last_flush = time.time()
+
+	def label(self, code):
+		label = self.labels.get(code)
+		if label is None:
+			label = self.labels[code] = '%s (%s)' % (code.co_name, os.path.basename(code.co_filename))
+		return label
+
+	def sample(self):
+		with self.lock:
+			active = list(self.active.items())
+		frames = sys._current_frames()
+		for ident, resource in active:
+			stack = _collapse(frames.get(ident), self.label)
+			if stack:
+				self.add(resource, {stack: 1})
+
+	def flush(self):
+		with self.lock:
+			if not self.dirty:
+				return
+			self.dirty = False
+			stacks = dict((resource, dict(counts)) for resource, counts in self.stacks.items())
+		os.makedirs(self.directory, exist_ok=True)
+		for resource, counts in stacks.items():
+			path = os.path.join(self.directory, '%s.%d.folded' % (resource, os.getpid()))
+			with open(path + '.tmp', 'w') as f:
+				f.writelines('%s %d\n' % (stack, count) for stack, count in sorted(counts.items()))
+			os.replace(path + '.tmp', path)
+
+
+def _collapse(frame, label):
+	names = []
+	while frame is not None:
+		names.append(label(frame.f_code))
+		frame = frame.f_back
+	return ';'.join(reversed(names))
+
+
+class _StackTracer(object):
+	"""``sys.setprofile`` hook summing self time per collapsed stack."""
+
+	def __init__(self, frame, label):
+		self.label = label
+		# One entry per live frame so returns out of the hook's callers unwind.
+		frames = []
+		while frame is not None:
+			frames.append(frame)
+			frame = frame.f_back
+		self.stacks = []
+		for frame in reversed(frames):
+			self.stacks.append((self.stacks[-1] + ';' if self.stacks else '') + label(frame.f_code))
+		self.counts = {}
+		self.last = time.perf_counter()
+
+	def __call__(self, frame, event, arg):
+		now = time.perf_counter()
+		stack = self.stacks[-1]
+		self.counts[stack] = self.counts.get(stack, 0) + int((now - self.last) * 1e6)
+		if event == 'call':
+			self.stacks.append(stack + ';' + self.label(frame.f_code))
+		elif event == 'c_call':
+			self.stacks.append(stack + ';' + getattr(arg, '__qualname__', getattr(arg, '__name__', '?')))
+		elif len(self.stacks) > 1:
+			self.stacks.pop()
+		self.last = time.perf_counter()
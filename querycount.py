@@ -0,0 +1,101 @@
+import time
+from functools import wraps
+
+from flask import current_app, g, has_request_context
+from sqlalchemy import event
+
+from Flask_Rest_API.storage import get_engines, get_repository, statement_info
+
+
+class QueryBudgetExceeded(AssertionError):
+	pass
+
+
+class QueryCounter(object):
+	"""Counts SQL statements and DB time for each request.
+
+	The totals are kept on ``flask.g`` and returned in the ``X-Query-Count``
+	and ``X-DB-Time`` (milliseconds) response headers. Statements that fail
+	are counted too.
+	"""
+
+	def __init__(self, app=None):
+		if app is not None:
+			self.init_app(app)
+
+	def init_app(self, app):
+		for engine in get_engines(app):
+			event.listen(engine, 'before_cursor_execute', self.before_cursor_execute)
+			event.listen(engine, 'after_cursor_execute', self.after_cursor_execute)
+			event.listen(engine, 'handle_error', self.handle_error)
+		app.after_request(self.add_headers)
+		app.extensions['query_counter'] = self
+
+	def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+		statement_info(conn, context)['query_count_start'] = time.perf_counter()
+
+	def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+		self.count(conn, context)
+
+	def handle_error(self, exception_context):
+		if exception_context.connection is not None:
+			self.count(exception_context.connection, exception_context.execution_context)
+
+	def count(self, conn, context):
+		# Popped, so a statement failing after after_cursor_execute isn't counted twice.
+		started = statement_info(conn, context).pop('query_count_start', None)
+		if started is not None and has_request_context():
+			g.query_count = g.get('query_count', 0) + 1
+			g.db_time = g.get('db_time', 0.0) + time.perf_counter() - started
+
+	def add_headers(self, response):
+		response.headers['X-Query-Count'] = str(g.get('query_count', 0))
+		response.headers['X-DB-Time'] = '%.3f' % (g.get('db_time', 0.0) * 1000)
+		return response
+
+
+def budget_enforced():
+	enforce = current_app.config.get('QUERY_BUDGET_ENFORCE')
+	if enforce is None:
+		return current_app.debug or current_app.testing
+	return enforce
+
+
+def _bounds(budget):
+	if callable(budget):
+		budget = budget()
+	if isinstance(budget, str):
+		budget = (budget,)
+	if isinstance(budget, tuple) and budget and isinstance(budget[0], str):
+		budget = get_repository().query_cost(*budget)
+	if isinstance(budget, int):
+		return budget, budget
+	return budget
+
+
+def query_budget(budget):
+	"""Declare how many SQL statements a handler issues.
+
+	``budget`` is an exact count, a ``(min, max)`` range, the name of a
+	repository operation (or a tuple of them) whose declared cost on the active
+	repository is the budget, or a callable returning any of these. A callable
+	is evaluated after the handler returns. Handlers that raise are not checked.
+
+	Enforced when ``QUERY_BUDGET_ENFORCE`` is set, or in debug and testing mode
+	when it is left as ``None``.
+	"""
+	def decorator(f):
+		@wraps(f)
+		def wrapper(*args, **kwargs):
+			start = g.get('query_count', 0)
+			result = f(*args, **kwargs)
+			used = g.get('query_count', 0) - start
+			if budget_enforced():
+				bounds = _bounds(budget)
+				if bounds is not None and not bounds[0] <= used <= bounds[1]:
+					raise QueryBudgetExceeded("%s issued %d queries, budget is %s" % (f.__qualname__, used,
+						bounds[0] if bounds[0] == bounds[1] else '%d-%d' % bounds))
+			return result
+		wrapper.query_budget = budget
+		return wrapper
+	return decorator
@@ -0,0 +1,109 @@
+import json
+import logging
+import time
+import weakref
+from collections import deque
+from logging.handlers import RotatingFileHandler
+
+from flask import has_request_context, request
+from sqlalchemy import event
+
+from Flask_Rest_API import instance_file
+from Flask_Rest_API.storage import get_engines, statement_info
+
+
+EXPLAINABLE = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE', 'WITH')
+
+_handlers = weakref.WeakValueDictionary()
+
+
+def _file_handler(path, max_bytes, backups):
+	# Apps logging to the same file share one handler, so it is opened and rotated once.
+	handler = _handlers.get(path)
+	if handler is None:
+		handler = _handlers[path] = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, delay=True)
+		handler.setFormatter(logging.Formatter('%(message)s'))
+	return handler
+
+
+class SlowQueryLog(object):
+	"""Times every statement on the app's engine and logs the slow ones.
+
+	Each entry carries the bound parameters, the Flask endpoint that issued the
+	statement and its ``EXPLAIN QUERY PLAN``. Entries go to a rotating file,
+	relative to the instance folder, and the most recent ones are kept in
+	memory for ``/admin/slow-queries``. Slow statements that fail are logged
+	with their error. The logger belongs to this instance
+	rather than the global logging tree, so every app writes to its own file.
+	"""
+
+	def __init__(self, app=None):
+		self.threshold_ms = None
+		self.path = None
+		self.recent = deque(maxlen=100)
+		self.logger = logging.Logger('Flask_Rest_API.slow_queries', logging.INFO)
+		if app is not None:
+			self.init_app(app)
+
+	def init_app(self, app):
+		self.threshold_ms = app.config.get('SLOW_QUERY_THRESHOLD_MS')
+		if self.threshold_ms is None:
+			return
+		self.recent = deque(maxlen=app.config.get('SLOW_QUERY_RECENT', 100))
+		self.path = instance_file(app, app.config.get('SLOW_QUERY_LOG', 'slow_queries.log'))
+		for handler in list(self.logger.handlers):
+			self.logger.removeHandler(handler)
+		self.logger.addHandler(_file_handler(self.path, app.config.get('SLOW_QUERY_LOG_MAX_BYTES', 10 * 1024 * 1024),
+			app.config.get('SLOW_QUERY_LOG_BACKUPS', 5)))
+
+		for engine in get_engines(app):
+			event.listen(engine, 'before_cursor_execute', self.before_cursor_execute)
+			event.listen(engine, 'after_cursor_execute', self.after_cursor_execute)
+			event.listen(engine, 'handle_error', self.handle_error)
+		app.extensions['slow_query_log'] = self
+
+	def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+		statement_info(conn, context)['slow_query_start'] = time.perf_counter()
+
+	def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+		self.log(conn, cursor, statement, parameters, context, executemany)
+
+	def handle_error(self, exception_context):
+		if exception_context.connection is None:
+			return
+		context = exception_context.execution_context
+		self.log(exception_context.connection, exception_context.cursor, exception_context.statement,
+			exception_context.parameters, context, context is not None and context.executemany,
+			error=exception_context.original_exception)
+
+	def log(self, conn, cursor, statement, parameters, context, executemany, error=None):
+		started = statement_info(conn, context).pop('slow_query_start', None)
+		if started is None:
+			return
+		duration_ms = (time.perf_counter() - started) * 1000
+		if duration_ms < self.threshold_ms:
+			return
+		if executemany and parameters:
+			parameters = parameters[0]
+		entry = {
+			'time': time.time(),
+			'duration_ms': round(duration_ms, 3),
+			'statement': statement,
+			'parameters': parameters,
+			'endpoint': request.endpoint if has_request_context() else None,
+			'plan': self.explain(conn, cursor, statement, parameters),
+		}
+		if error is not None:
+			entry['error'] = '%s: %s' % (type(error).__name__, error)
+		self.recent.append(entry)
+		self.logger.info(json.dumps(entry, default=repr))
+
+	def explain(self, conn, cursor, statement, parameters):
+		if cursor is None or conn.dialect.name != 'sqlite' or not statement.lstrip().upper().startswith(EXPLAINABLE):
+			return None
+		try:
+			rows = cursor.connection.execute('EXPLAIN QUERY PLAN ' + statement, parameters or ()).fetchall()
+		except Exception as e:
+			return ['unavailable: %s' % e]
+		return [row[-1] for row in rows]
+
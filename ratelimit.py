@@ -0,0 +1,175 @@
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask import g, jsonify, request
+
+from Flask_Rest_API import instance_file
+
+
+logger = logging.getLogger(__name__)
+
+READ_METHODS = frozenset(('GET', 'HEAD', 'OPTIONS'))
+
+
+class TokenBucketTable(object):
+	"""In-memory token buckets striped over independent locks.
+
+	Each stripe is an LRU-ordered dict capped at ``max_clients / stripes``
+	entries. Clients idle longer than ``idle_timeout`` are dropped from the
+	head of the stripe as new requests come in, so memory stays bounded.
+	"""
+
+	def __init__(self, rate, burst, stripes=64, max_clients=100000, idle_timeout=600):
+		self.rate = float(rate)
+		self.burst = float(burst)
+		self.stripes = [(threading.Lock(), OrderedDict()) for _ in range(stripes)]
+		self.per_stripe = max(1, max_clients // stripes)
+		self.idle_timeout = idle_timeout
+
+	def take(self, key, now=None):
+		now = time.monotonic() if now is None else now
+		lock, buckets = self.stripes[hash(key) % len(self.stripes)]
+		with lock:
+			bucket = buckets.pop(key, None)
+			if bucket is None:
+				tokens = self.burst
+			else:
+				tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+			allowed = tokens >= 1
+			if allowed:
+				tokens -= 1
+			buckets[key] = (tokens, now)
+			while len(buckets) > self.per_stripe:
+				buckets.popitem(last=False)
+			for _ in range(2):
+				oldest = next(iter(buckets))
+				if now - buckets[oldest][1] < self.idle_timeout:
+					break
+				del buckets[oldest]
+		return allowed, tokens
+
+	def __len__(self):
+		return sum(len(buckets) for _, buckets in self.stripes)
+
+
+class SQLiteBucketTable(object):
+	"""Token buckets kept in an SQLite file shared by all worker processes.
+
+	If the write lock can't be taken within ``busy_timeout`` seconds the
+	request is let through unmetered, with ``None`` for its tokens.
+	"""
+
+	def __init__(self, path, rate, burst, idle_timeout=600, busy_timeout=1):
+		self.path = path
+		self.rate = float(rate)
+		self.burst = float(burst)
+		self.idle_timeout = idle_timeout
+		self.busy_timeout = busy_timeout
+		self.local = threading.local()
+		self.last_sweep = 0
+		self.connection().execute("CREATE TABLE IF NOT EXISTS rate_limit_buckets "
+			"(key TEXT PRIMARY KEY, tokens REAL NOT NULL, ts REAL NOT NULL) WITHOUT ROWID")
+
+	def connection(self):
+		# Opened lazily per thread, and per process after a fork.
+		conn = getattr(self.local, 'conn', None)
+		if conn is None or self.local.pid != os.getpid():
+			conn = self.local.conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+			self.local.pid = os.getpid()
+			conn.execute('PRAGMA journal_mode=WAL')
+			conn.execute('PRAGMA synchronous=OFF')
+		return conn
+
+	def take(self, key, now=None):
+		now = time.time() if now is None else now
+		conn = self.connection()
+		try:
+			conn.execute('BEGIN IMMEDIATE')
+		except sqlite3.OperationalError as e:
+			logger.warning("Rate limit table busy, not limiting this request: %s", e)
+			return True, None
+		try:
+			row = conn.execute('SELECT tokens, ts FROM rate_limit_buckets WHERE key = ?', (key,)).fetchone()
+			tokens = self.burst if row is None else min(self.burst, row[0] + (now - row[1]) * self.rate)
+			allowed = tokens >= 1
+			if allowed:
+				tokens -= 1
+			conn.execute('INSERT OR REPLACE INTO rate_limit_buckets (key, tokens, ts) VALUES (?, ?, ?)', (key, tokens, now))
+			if now - self.last_sweep > self.idle_timeout:
+				self.last_sweep = now
+				conn.execute('DELETE FROM rate_limit_buckets WHERE ts < ?', (now - self.idle_timeout,))
+			conn.execute('COMMIT')
+		except Exception:
+			conn.execute('ROLLBACK')
+			raise
+		return allowed, tokens
+
+
+class RateLimiter(object):
+	"""Per-client read and write rate limits for the video endpoints.
+
+	Clients are keyed by their remote address, or by ``X-API-Key`` when the key
+	is one of ``RATE_LIMIT_API_KEYS``; unknown keys are ignored so rotating
+	them neither escapes the limit nor floods the bucket table. Every limited
+	response carries ``X-RateLimit-Limit``, ``X-RateLimit-Remaining`` and
+	``X-RateLimit-Reset``; rejected requests get 429 with ``Retry-After``.
+	Buckets are kept in memory, or with ``RATE_LIMIT_SQLITE_PATH`` in an
+	SQLite file under the instance folder shared by all workers.
+	"""
+
+	def __init__(self, app=None):
+		self.tables = {}
+		if app is not None:
+			self.init_app(app)
+
+	def init_app(self, app):
+		if not app.config.get('RATE_LIMIT'):
+			return
+		self.endpoints = frozenset(app.config.get('RATE_LIMIT_ENDPOINTS', ('video', 'videoincrement', 'videolist', 'videohistory')))
+		self.api_keys = frozenset(app.config.get('RATE_LIMIT_API_KEYS') or ())
+		path = app.config.get('RATE_LIMIT_SQLITE_PATH')
+		for kind in ('read', 'write'):
+			rate, burst = app.config['RATE_LIMIT_%s' % kind.upper()]
+			if path:
+				self.tables[kind] = SQLiteBucketTable(instance_file(app, path), rate, burst,
+					idle_timeout=app.config.get('RATE_LIMIT_IDLE_SECONDS', 600))
+			else:
+				self.tables[kind] = TokenBucketTable(rate, burst, stripes=app.config.get('RATE_LIMIT_STRIPES', 64),
+					max_clients=app.config.get('RATE_LIMIT_MAX_CLIENTS', 100000),
+					idle_timeout=app.config.get('RATE_LIMIT_IDLE_SECONDS', 600))
+		app.before_request(self.check)
+		app.after_request(self.add_headers)
+		app.extensions['rate_limiter'] = self
+
+	def check(self):
+		if request.endpoint not in self.endpoints:
+			return None
+		kind = 'read' if request.method in READ_METHODS else 'write'
+		table = self.tables[kind]
+		api_key = request.headers.get('X-API-Key')
+		client = 'key:' + api_key if api_key in self.api_keys else request.remote_addr
+		allowed, tokens = table.take('%s:%s' % (kind, client))
+		if tokens is None:
+			return None
+		g.rate_limit = (table, tokens)
+		if not allowed:
+			response = jsonify(message="Rate limit exceeded")
+			response.status_code = 429
+			response.headers['Retry-After'] = str(int(math.ceil((1 - tokens) / table.rate)))
+			return response
+		return None
+
+	def add_headers(self, response):
+		rate_limit = g.get('rate_limit')
+		if rate_limit:
+			table, tokens = rate_limit
+			response.headers['X-RateLimit-Limit'] = str(int(table.burst))
+			response.headers['X-RateLimit-Remaining'] = str(int(tokens))
+			response.headers['X-RateLimit-Reset'] = str(int(math.ceil((table.burst - tokens) / table.rate)))
+		return response
+
@@ -0,0 +1,119 @@
+"""Bulk-load synthetic videos for scale testing.
+
+    python -m Flask_Rest_API.seed --rows 5000000 --seed 42
+
+Rows are generated reproducibly from ``--seed``: views follow a power law
+(most videos have a few hundred, a few reach millions), likes are a
+per-video like rate of the views, and names are one to a dozen words so
+their lengths vary up to the column's 100 characters. The load goes to the
+app's database in one transaction through ``executemany``, with an
+in-memory rollback journal and fsync switched off, into ``video_model`` or,
+with the split counter layout, ``video_meta`` and ``video_counters``.
+Secondary indexes on those tables are dropped for the load and rebuilt
+afterwards, followed by ``ANALYZE``.
+"""
+import argparse
+import itertools
+import math
+import random
+import time
+
+from Flask_Rest_API import db
+
+
+WORDS = ('cat', 'dog', 'tutorial', 'python', 'flask', 'api', 'music', 'live', 'remix', 'official', 'video',
+	'trailer', 'review', 'unboxing', 'how', 'to', 'build', 'a', 'the', 'best', 'of', 'compilation', 'part',
+	'episode', 'highlights', 'reaction', 'guide', 'beginner', 'advanced', 'funny', 'moments', 'travel', 'vlog',
+	'cooking', 'recipe', 'speedrun', 'walkthrough', 'explained', 'in', 'minutes', 'news', 'podcast')
+
+BATCH = 50000
+
+
+def generate(rows, seed=0, start_id=0, min_views=100, alpha=1.2, like_rate=0.04):
+	"""Yield ``(id, name, views, likes)`` tuples; the same seed gives the same rows."""
+	rng = random.Random(seed)
+	mu = math.log(like_rate)
+	for video_id in range(start_id, start_id + rows):
+		views = min(int(min_views * rng.paretovariate(alpha)), 2 ** 62)
+		likes = min(views, int(views * rng.lognormvariate(mu, 0.6)))
+		words = min(12, 1 + int(rng.expovariate(0.35)))
+		name = ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize()[:100]
+		yield video_id, name, views, likes
+
+
+def _secondary_indexes(connection, tables):
+	placeholders = ','.join('?' * len(tables))
+	return connection.execute("SELECT name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL "
+		"AND tbl_name IN (%s)" % placeholders, tables).fetchall()
+
+
+def load(engine, rows, layout='inline', truncate=False, **options):
+	tables = ['video_model'] if layout == 'inline' else ['video_meta', 'video_counters']
+	raw = engine.raw_connection()
+	try:
+		connection = raw.connection
+		isolation_level, connection.isolation_level = connection.isolation_level, None
+		journal_mode = connection.execute('PRAGMA journal_mode').fetchone()[0]
+		synchronous = connection.execute('PRAGMA synchronous').fetchone()[0]
+		connection.execute('PRAGMA journal_mode = MEMORY')
+		connection.execute('PRAGMA synchronous = OFF')
+		connection.execute('PRAGMA cache_size = -262144')
+		connection.execute('PRAGMA temp_store = MEMORY')
+		indexes = _secondary_indexes(connection, tables)
+		connection.execute('BEGIN')
+		try:
+			for name, _ in indexes:
+				connection.execute('DROP INDEX "%s"' % name)
+			if truncate:
+				for table in tables:
+					connection.execute('DELETE FROM %s' % table)
+			generated = generate(rows, **options)
+			while True:
+				batch = list(itertools.islice(generated, BATCH))
+				if not batch:
+					break
+				if layout == 'inline':
+					connection.executemany('INSERT INTO video_model (id, name, views, likes) VALUES (?, ?, ?, ?)', batch)
+				else:
+					connection.executemany('INSERT INTO video_meta (id, name) VALUES (?, ?)',
+						[(video_id, name) for video_id, name, _, _ in batch])
+					connection.executemany('INSERT INTO video_counters (id, views, likes) VALUES (?, ?, ?)',
+						[(video_id, views, likes) for video_id, _, views, likes in batch])
+			for _, sql in indexes:
+				connection.execute(sql)
+			connection.execute('COMMIT')
+		except BaseException:
+			connection.execute('ROLLBACK')
+			raise
+		connection.execute('ANALYZE')
+		connection.execute('PRAGMA synchronous = %d' % synchronous)
+		connection.execute('PRAGMA journal_mode = %s' % journal_mode)
+		connection.isolation_level = isolation_level
+	finally:
+		raw.close()
+
+
+if __name__ == "__main__":
+	from Flask_Rest_API import create_app
+
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--rows", type=int, default=1000000)
+	parser.add_argument("--seed", type=int, default=0)
+	parser.add_argument("--start-id", type=int, default=0)
+	parser.add_argument("--truncate", action="store_true", help="Delete existing videos first")
+	parser.add_argument("--min-views", type=int, default=100)
+	parser.add_argument("--alpha", type=float, default=1.2, help="Power law exponent of views; lower is more skewed")
+	parser.add_argument("--like-rate", type=float, default=0.04, help="Median likes per view")
+	args = parser.parse_args()
+
+	app = create_app()
+	if app.config.get('VIDEO_STORAGE', 'sqlalchemy') != 'sqlalchemy':
+		parser.error("Seeding only supports VIDEO_STORAGE = 'sqlalchemy'")
+	with app.app_context():
+		db.create_all()
+		engine = db.get_engine(app)
+	started = time.perf_counter()
+	load(engine, args.rows, app.config.get('VIDEO_COUNTER_LAYOUT', 'inline'), args.truncate, seed=args.seed,
+		start_id=args.start_id, min_views=args.min_views, alpha=args.alpha, like_rate=args.like_rate)
+	elapsed = time.perf_counter() - started
+	print("Loaded %d videos in %.1fs (%.0f rows/s)" % (args.rows, elapsed, args.rows / elapsed))
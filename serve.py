@@ -0,0 +1,341 @@
+"""Pre-fork production server for the video API.
+
+    python -m Flask_Rest_API.serve --bind 0.0.0.0:8000 --workers 4 --threads 8
+
+By default the master process never builds the application or opens a
+database connection. Each worker calls the app factory after fork, so
+connections, caches and background threads are created per worker, and a
+reload (SIGHUP) picks up changes to the application module. With
+``--preload`` the master builds the app once and runs the ``pre_fork`` and
+``post_fork`` hooks around each fork instead. Workers bind their own socket
+with SO_REUSEPORT and the kernel balances connections between them; where
+SO_REUSEPORT is unavailable the master binds once and workers inherit the
+socket.
+
+Keep-alive connections only hold a request thread while a request is being
+served; between requests they wait in a selector and are closed after
+``--keepalive`` idle seconds.
+
+Signals: SIGHUP starts a new generation of workers and gracefully stops the
+old one, SIGTERM/SIGINT stop all workers gracefully, waiting up to
+``--graceful-timeout`` seconds for in-flight requests. Idle keep-alive
+connections are closed straight away when a worker stops.
+"""
+import argparse
+import errno
+import importlib
+import logging
+import os
+import selectors
+import signal
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+from Flask_Rest_API import post_fork, pre_fork, worker_exit
+
+
+logger = logging.getLogger(__name__)
+
+REUSE_PORT = hasattr(socket, 'SO_REUSEPORT')
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+	protocol_version = 'HTTP/1.1'
+
+	def log_request(self, *args, **kwargs):
+		pass
+
+
+class KeepAliveRequestHandler(QuietRequestHandler):
+	"""Serves one request per ``handle`` call and leaves the connection open.
+
+	The server decides when the connection is read again, so an idle
+	keep-alive client doesn't tie up a thread between requests.
+	"""
+
+	def __init__(self, request, client_address, server):
+		# StreamRequestHandler would handle the whole connection and close it here.
+		self.request = request
+		self.client_address = client_address
+		self.server = server
+		self.timeout = server.request_timeout
+		self.close_connection = False
+		self.setup()
+
+	def handle(self):
+		"""Serve one request; returns whether the connection can be reused."""
+		try:
+			self.handle_one_request()
+		except (ConnectionError, socket.timeout) as e:
+			self.connection_dropped(e)
+			self.close_connection = True
+		return not self.close_connection
+
+	def has_buffered_request(self):
+		# A pipelined request may already be in rfile's buffer, where a selector can't see it.
+		self.connection.setblocking(False)
+		try:
+			return bool(self.rfile.peek(1))
+		except OSError:
+			return False
+		finally:
+			self.connection.settimeout(self.timeout)
+
+
+class PooledWSGIServer(BaseWSGIServer):
+	"""Werkzeug server running requests on a fixed-size thread pool.
+
+	After each response a keep-alive connection is parked in a selector
+	watched by one thread and handed back to the pool once it is readable.
+	Connections idle for ``keepalive`` seconds are closed, as are all parked
+	connections when the server drains; ``request_timeout`` bounds each read
+	and write while a request is being served.
+	"""
+
+	multithread = True
+
+	def __init__(self, host, port, app, threads=8, reuse_port=REUSE_PORT, fd=None, keepalive=5, request_timeout=30):
+		self.reuse_port = reuse_port and fd is None
+		BaseWSGIServer.__init__(self, host, port, app, handler=KeepAliveRequestHandler, fd=fd)
+		self.pool = ThreadPoolExecutor(threads, thread_name_prefix='wsgi')
+		self.keepalive = keepalive
+		self.request_timeout = request_timeout
+		self.draining = False
+		self.lock = threading.Lock()
+		self.returning = []
+		self.parked = {}
+		self.selector = selectors.DefaultSelector()
+		self.wakeup, self.waker = socket.socketpair()
+		self.selector.register(self.wakeup, selectors.EVENT_READ)
+		self.watcher = threading.Thread(target=self.watch_parked, name='wsgi-keepalive', daemon=True)
+		self.watcher.start()
+
+	def server_bind(self):
+		if self.reuse_port:
+			self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+		BaseWSGIServer.server_bind(self)
+
+	def process_request(self, request, client_address):
+		# Werkzeug writes headers and body separately; don't let Nagle delay the body.
+		if request.family in (socket.AF_INET, socket.AF_INET6):
+			request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+		try:
+			handler = self.RequestHandlerClass(request, client_address, self)
+		except Exception:
+			self.handle_error(request, client_address)
+			self.shutdown_request(request)
+			return
+		self.pool.submit(self.serve_connection, handler)
+
+	def serve_connection(self, handler):
+		try:
+			while handler.handle() and not self.draining:
+				if not handler.has_buffered_request():
+					self.park(handler)
+					return
+		except Exception:
+			self.handle_error(handler.request, handler.client_address)
+		self.close_connection(handler)
+
+	def close_connection(self, handler):
+		try:
+			handler.finish()
+		except OSError:
+			pass
+		self.shutdown_request(handler.request)
+
+	def park(self, handler):
+		with self.lock:
+			parked = not self.draining
+			if parked:
+				self.returning.append(handler)
+		if parked:
+			self.waker.send(b'\0')
+		else:
+			self.close_connection(handler)
+
+	def watch_parked(self):
+		while True:
+			for key, _ in self.selector.select(min(1.0, self.keepalive)):
+				if key.fileobj is self.wakeup:
+					self.wakeup.recv(4096)
+				else:
+					self.selector.unregister(key.fileobj)
+					del self.parked[key.data]
+					self.pool.submit(self.serve_connection, key.data)
+			with self.lock:
+				returning, self.returning = self.returning, []
+				draining = self.draining
+			now = time.monotonic()
+			for handler in returning:
+				self.parked[handler] = now
+				self.selector.register(handler.connection, selectors.EVENT_READ, handler)
+			for handler, since in list(self.parked.items()):
+				if draining or now - since >= self.keepalive:
+					self.selector.unregister(handler.connection)
+					del self.parked[handler]
+					self.close_connection(handler)
+			if draining:
+				break
+		self.selector.close()
+		self.wakeup.close()
+		self.waker.close()
+
+	def drain(self):
+		"""Close idle connections, then wait for in-flight requests to finish."""
+		with self.lock:
+			draining, self.draining = self.draining, True
+		if not draining:
+			self.waker.send(b'\0')
+		self.watcher.join()
+		self.pool.shutdown(wait=True)
+
+
+def load_app(path):
+	module, _, attr = path.partition(':')
+	app = getattr(importlib.import_module(module), attr or 'app')
+	if not hasattr(app, 'wsgi_app') and callable(app):
+		app = app()
+	return app
+
+
+def run_worker(options, fd=None, app=None):
+	signal.signal(signal.SIGINT, signal.SIG_IGN)
+	signal.signal(signal.SIGHUP, signal.SIG_IGN)
+	if app is None:
+		app = load_app(options.app)
+	else:
+		post_fork(app)
+	server = PooledWSGIServer(options.host, options.port, app, threads=options.threads, fd=fd,
+		keepalive=options.keepalive)
+	signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown).start())
+	server.serve_forever()
+	server.drain()
+	worker_exit(app)
+
+
+class Arbiter(object):
+	def __init__(self, options):
+		self.options = options
+		self.workers = {}
+		self.retiring = {}
+		self.stopping = False
+		self.reloading = False
+		self.listener = None
+		self.app = None
+
+	def bind(self):
+		if not REUSE_PORT:
+			self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+			self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+			self.listener.bind((self.options.host, self.options.port))
+			self.listener.listen(socket.SOMAXCONN)
+			self.listener.set_inheritable(True)
+
+	def spawn(self):
+		if self.app is not None:
+			pre_fork(self.app)
+		pid = os.fork()
+		if pid:
+			self.workers[pid] = time.time()
+			return pid
+		status = 0
+		try:
+			run_worker(self.options, self.listener.fileno() if self.listener else None, self.app)
+		except BaseException:
+			logger.exception("Worker %d failed", os.getpid())
+			status = 1
+		finally:
+			os._exit(status)
+
+	def kill(self, pids, sig):
+		for pid in list(pids):
+			try:
+				os.kill(pid, sig)
+			except OSError as e:
+				if e.errno != errno.ESRCH:
+					raise
+
+	def reap(self):
+		while True:
+			try:
+				pid, status = os.waitpid(-1, os.WNOHANG)
+			except ChildProcessError:
+				return
+			if not pid:
+				return
+			self.retiring.pop(pid, None)
+			if self.workers.pop(pid, None) is not None and not self.stopping:
+				logger.warning("Worker %d exited with status %d, respawning", pid, status)
+
+	def reload(self):
+		old = self.workers
+		self.workers = {}
+		for _ in range(self.options.workers):
+			self.spawn()
+		self.retiring.update((pid, time.time()) for pid in old)
+		self.kill(old, signal.SIGTERM)
+
+	def stop(self):
+		self.stopping = True
+		self.kill(list(self.workers) + list(self.retiring), signal.SIGTERM)
+		deadline = time.time() + self.options.graceful_timeout
+		while (self.workers or self.retiring) and time.time() < deadline:
+			self.reap()
+			time.sleep(0.1)
+		self.kill(list(self.workers) + list(self.retiring), signal.SIGKILL)
+		self.reap()
+
+	def run(self):
+		self.bind()
+		if self.options.preload:
+			self.app = load_app(self.options.app)
+		signal.signal(signal.SIGTERM, self.handle_stop)
+		signal.signal(signal.SIGINT, self.handle_stop)
+		signal.signal(signal.SIGHUP, self.handle_reload)
+		logger.info("Serving on %s:%d with %d workers x %d threads", self.options.host, self.options.port,
+			self.options.workers, self.options.threads)
+		while not self.stopping:
+			if self.reloading:
+				self.reloading = False
+				self.reload()
+			self.reap()
+			while len(self.workers) < self.options.workers and not self.stopping:
+				self.spawn()
+			for pid, retired_at in list(self.retiring.items()):
+				if time.time() - retired_at > self.options.graceful_timeout:
+					self.kill([pid], signal.SIGKILL)
+			time.sleep(0.2)
+		self.stop()
+
+	def handle_stop(self, signum, frame):
+		self.stopping = True
+
+	def handle_reload(self, signum, frame):
+		self.reloading = True
+
+
+def parse_args(argv=None):
+	parser = argparse.ArgumentParser(description="Pre-fork server for the video API")
+	parser.add_argument("--bind", default="127.0.0.1:8000", help="host:port to listen on")
+	parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+	parser.add_argument("--threads", type=int, default=8, help="Request threads per worker")
+	parser.add_argument("--keepalive", type=float, default=5, help="Seconds to keep an idle connection open")
+	parser.add_argument("--app", default="Flask_Rest_API:create_app",
+		help="module:attribute of the WSGI app or of a factory returning it")
+	parser.add_argument("--preload", action="store_true",
+		help="Build the app in the master and fork workers from it; reloads then keep the old code")
+	parser.add_argument("--graceful-timeout", type=float, default=30)
+	options = parser.parse_args(argv)
+	host, _, port = options.bind.rpartition(':')
+	options.host, options.port = host or '127.0.0.1', int(port)
+	return options
+
+
+if __name__ == "__main__":
+	logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(process)d] %(message)s')
+	Arbiter(parse_args()).run()
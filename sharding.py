@@ -0,0 +1,160 @@
+import bisect
+import hashlib
+import heapq
+import itertools
+import os
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.exc import IntegrityError
+
+from Flask_Rest_API.models import VideoModel
+from Flask_Rest_API.storage import VideoExists, VideoRepository
+
+
+videos = VideoModel.__table__
+
+
+def _hash(value):
+	return int(hashlib.md5(value.encode()).hexdigest()[:16], 16)
+
+
+class HashRing(object):
+	"""Consistent hash ring mapping video ids to shard indexes.
+
+	Shards are named by index, so growing from N to N + 1 shards only moves
+	the keys that land on the new shard's virtual nodes.
+	"""
+
+	def __init__(self, shard_count, vnodes=64):
+		points = sorted((_hash('shard-%d#%d' % (shard, vnode)), shard)
+			for shard in range(shard_count) for vnode in range(vnodes))
+		self.hashes = [point[0] for point in points]
+		self.shards = [point[1] for point in points]
+
+	def shard_for(self, video_id):
+		index = bisect.bisect(self.hashes, _hash(str(video_id)))
+		return self.shards[index % len(self.shards)]
+
+
+def shard_urls(root_path, pattern, count):
+	return ['sqlite:///' + os.path.join(root_path, pattern.format(shard)) for shard in range(count)]
+
+
+def _record(row):
+	return {'id': row.id, 'name': row.name, 'views': row.views, 'likes': row.likes}
+
+
+class ShardedRepository(VideoRepository):
+	"""Routes each video id to one of several SQLite files.
+
+	Point operations touch a single shard; ``get_many`` and ``scan`` fan out to
+	the shards involved and merge the results, one query per shard.
+	"""
+
+	def __init__(self, urls, vnodes=64, busy_timeout=30):
+		self.urls = list(urls)
+		self.query_costs = {'get': 1, 'create': 1, 'update': 2, 'increment': 2,
+			'get_many': (1, len(self.urls)), 'scan': len(self.urls)}
+		self.ring = HashRing(len(self.urls), vnodes)
+		self.engines = [create_engine(url, connect_args={'timeout': busy_timeout}) for url in self.urls]
+		for engine in self.engines:
+			videos.create(engine, checkfirst=True)
+
+	def engine_for(self, video_id):
+		return self.engines[self.ring.shard_for(video_id)]
+
+	def get(self, video_id):
+		with self.engine_for(video_id).connect() as conn:
+			row = conn.execute(select([videos]).where(videos.c.id == video_id)).first()
+		return _record(row) if row else None
+
+	def get_many(self, video_ids):
+		by_shard = {}
+		for video_id in video_ids:
+			by_shard.setdefault(self.ring.shard_for(video_id), []).append(video_id)
+		found = {}
+		for shard, ids in by_shard.items():
+			with self.engines[shard].connect() as conn:
+				for row in conn.execute(select([videos]).where(videos.c.id.in_(ids))):
+					found[row.id] = _record(row)
+		return found
+
+	def create(self, video_id, name, views, likes):
+		record = {'id': video_id, 'name': name, 'views': views, 'likes': likes}
+		try:
+			with self.engine_for(video_id).begin() as conn:
+				conn.execute(videos.insert().values(**record))
+		except IntegrityError:
+			raise VideoExists(video_id)
+		return record
+
+	def _update(self, video_id, values):
+		with self.engine_for(video_id).begin() as conn:
+			if not conn.execute(videos.update().where(videos.c.id == video_id).values(**values)).rowcount:
+				return None
+			return _record(conn.execute(select([videos]).where(videos.c.id == video_id)).first())
+
+	def update(self, video_id, **values):
+		return self._update(video_id, values)
+
+	def increment(self, video_id, views=0, likes=0):
+		return self._update(video_id, {'views': videos.c.views + views, 'likes': videos.c.likes + likes})
+
+	def scan(self, after=None, limit=100):
+		query = select([videos]).order_by(videos.c.id).limit(limit)
+		if after is not None:
+			query = query.where(videos.c.id > after)
+		results = []
+		for engine in self.engines:
+			with engine.connect() as conn:
+				results.append([_record(row) for row in conn.execute(query)])
+		return list(itertools.islice(heapq.merge(*results, key=lambda record: record['id']), limit))
+
+
+def reshard(old_urls, new_urls, vnodes=64, batch_size=1000):
+	"""Move rows whose shard changes when going from ``old_urls`` to ``new_urls``.
+
+	Returns the number of rows moved. Rows are copied before they are deleted
+	from their old shard, so an interrupted run can simply be repeated.
+	"""
+	old = ShardedRepository(old_urls, vnodes)
+	new = ShardedRepository(new_urls, vnodes)
+	moved = 0
+	for url, engine in zip(old.urls, old.engines):
+		after = None
+		while True:
+			query = select([videos]).order_by(videos.c.id).limit(batch_size)
+			if after is not None:
+				query = query.where(videos.c.id > after)
+			with engine.connect() as conn:
+				rows = [_record(row) for row in conn.execute(query)]
+			if not rows:
+				break
+			after = rows[-1]['id']
+			leaving = {}
+			for row in rows:
+				target = new.ring.shard_for(row['id'])
+				if new.urls[target] != url:
+					leaving.setdefault(target, []).append(row)
+			for target, batch in leaving.items():
+				with new.engines[target].begin() as conn:
+					conn.execute(videos.insert().prefix_with('OR REPLACE'), batch)
+				with engine.begin() as conn:
+					conn.execute(videos.delete().where(videos.c.id.in_([row['id'] for row in batch])))
+				moved += len(batch)
+	return moved
+
+
+if __name__ == "__main__":
+	import argparse
+
+	from flask import Flask
+
+	parser = argparse.ArgumentParser(description="Move videos between shard layouts")
+	parser.add_argument("--from", dest="old", type=int, required=True, help="Current number of shards")
+	parser.add_argument("--to", dest="new", type=int, required=True, help="New number of shards")
+	parser.add_argument("--pattern", default="shard-{}.db", help="Shard file name pattern")
+	parser.add_argument("--root", default=Flask('Flask_Rest_API').instance_path, help="Directory holding the shard files")
+	args = parser.parse_args()
+	moved = reshard(shard_urls(args.root, args.pattern, args.old), shard_urls(args.root, args.pattern, args.new))
+	print("Moved %d videos" % moved)
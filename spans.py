@@ -0,0 +1,32 @@
+# Kept apart from ``tracing`` so opening a span never imports the tracer or its exporters.
+import contextvars
+
+
+current_span = contextvars.ContextVar('current_span', default=None)
+
+
+class span(object):
+	"""Time the block as a child of the current span, if a request is being traced.
+
+	The new span is current inside the block, so spans opened there nest
+	under it. Outside a traced request this does nothing.
+	"""
+
+	def __init__(self, name, **attributes):
+		self.name = name
+		self.attributes = attributes
+		self.span = None
+
+	def __enter__(self):
+		parent = current_span.get()
+		if parent is not None:
+			self.span = parent.child(self.name, **self.attributes)
+			self.token = current_span.set(self.span)
+		return self.span
+
+	def __exit__(self, exc_type, exc, tb):
+		if self.span is not None:
+			if exc_type is not None:
+				self.span.attributes['error'] = exc_type.__name__
+			current_span.reset(self.token)
+			self.span.finish()
@@ -0,0 +1,355 @@
+import bisect
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+
+from flask import current_app
+from sqlalchemy import literal_column, select, text
+from sqlalchemy.exc import IntegrityError
+
+from Flask_Rest_API import db, instance_file
+from Flask_Rest_API.models import VideoCounterModel, VideoMetaModel, VideoModel
+
+
+# SQLite has supported UPDATE ... RETURNING since 3.35.
+SQLITE_RETURNING = sqlite3.sqlite_version_info >= (3, 35)
+
+
+class VideoExists(Exception):
+	pass
+
+
+class VideoRepository(ABC):
+	"""Storage interface used by the video resources.
+
+	Records are plain dicts with ``id``, ``name``, ``views`` and ``likes``.
+	``query_costs`` maps operation names to the SQL statements each one
+	issues, as a count or a ``(min, max)`` range; handlers' query budgets are
+	derived from it. Operations left out are not checked.
+	"""
+
+	query_costs = {}
+
+	def query_cost(self, *operations):
+		"""``(min, max)`` statements for running ``operations`` in turn, or ``None``."""
+		low = high = 0
+		for operation in operations:
+			cost = self.query_costs.get(operation)
+			if cost is None:
+				return None
+			if isinstance(cost, int):
+				cost = (cost, cost)
+			low += cost[0]
+			high += cost[1]
+		return low, high
+
+	@abstractmethod
+	def get(self, video_id):
+		"""The record for ``video_id``, or ``None``."""
+
+	@abstractmethod
+	def get_many(self, video_ids):
+		"""``{id: record}`` for the ids that exist."""
+
+	@abstractmethod
+	def create(self, video_id, name, views, likes):
+		"""Insert a video; raises ``VideoExists`` if the id is taken."""
+
+	@abstractmethod
+	def update(self, video_id, **values):
+		"""Set the given fields; returns the new record, or ``None`` if missing."""
+
+	@abstractmethod
+	def increment(self, video_id, views=0, likes=0):
+		"""Add to the counters; returns the new record, or ``None`` if missing."""
+
+	@abstractmethod
+	def scan(self, after=None, limit=100):
+		"""Up to ``limit`` records with ids greater than ``after``, by id."""
+
+
+def as_record(video):
+	return {'id': video.id, 'name': video.name, 'views': video.views, 'likes': video.likes}
+
+
+class SQLAlchemyRepository(VideoRepository):
+	query_costs = {'get': 1, 'get_many': 1, 'scan': 1, 'create': 1, 'update': 2, 'increment': 2}
+
+	def __init__(self, db):
+		self.db = db
+
+	def get(self, video_id):
+		video = VideoModel.query.get(video_id)
+		return as_record(video) if video else None
+
+	def get_many(self, video_ids):
+		videos = VideoModel.query.filter(VideoModel.id.in_(list(video_ids))).all()
+		return dict((video.id, as_record(video)) for video in videos)
+
+	def create(self, video_id, name, views, likes):
+		video = VideoModel(id=video_id, name=name, views=views, likes=likes)
+		record = as_record(video)
+		self.db.session.add(video)
+		try:
+			self.db.session.commit()
+		except IntegrityError:
+			self.db.session.rollback()
+			raise VideoExists(video_id)
+		# Built before commit so reading it back doesn't trigger a refresh SELECT.
+		return record
+
+	def update(self, video_id, **values):
+		video = VideoModel.query.get(video_id)
+		if not video:
+			return None
+		for key, value in values.items():
+			setattr(video, key, value)
+		record = as_record(video)
+		self.db.session.commit()
+		return record
+
+	def increment(self, video_id, views=0, likes=0):
+		updated = VideoModel.query.filter_by(id=video_id).update({
+			VideoModel.views: VideoModel.views + views,
+			VideoModel.likes: VideoModel.likes + likes,
+		}, synchronize_session=False)
+		self.db.session.commit()
+		if not updated:
+			return None
+		return self.get(video_id)
+
+	def scan(self, after=None, limit=100):
+		query = VideoModel.query
+		if after is not None:
+			query = query.filter(VideoModel.id > after)
+		return [as_record(video) for video in query.order_by(VideoModel.id).limit(limit)]
+
+
+class SplitCounterRepository(VideoRepository):
+	"""SQLAlchemy storage with counters kept apart from video metadata.
+
+	``views`` and ``likes`` live in the narrow ``video_counters`` table, so
+	counter updates rewrite small rows and leave ``video_meta`` pages alone.
+	Reads probe both tables by primary key in one ``UNION ALL`` statement and
+	reassemble the record without a join. Updates return the record with
+	``RETURNING``, reading the other table's columns in scalar subqueries;
+	SQLite older than 3.35 reads it back with a second statement instead.
+	"""
+
+	meta = VideoMetaModel.__table__
+	counters = VideoCounterModel.__table__
+	query_costs = {'get': 1, 'get_many': 1, 'scan': 1, 'create': 2,
+		'update': (1, 2) if SQLITE_RETURNING else (2, 3), 'increment': 1 if SQLITE_RETURNING else 2}
+
+	# SQLAlchemy 1.3 can't compile RETURNING for SQLite, so these are spelled out.
+	UPDATE_NAME = ('UPDATE video_meta SET name = :name WHERE id = :id RETURNING id, name, '
+		'(SELECT views FROM video_counters WHERE video_counters.id = video_meta.id), '
+		'(SELECT likes FROM video_counters WHERE video_counters.id = video_meta.id)')
+	UPDATE_COUNTERS = ('UPDATE video_counters SET %s WHERE id = :id RETURNING id, '
+		'(SELECT name FROM video_meta WHERE video_meta.id = video_counters.id), views, likes')
+
+	def __init__(self, db):
+		self.db = db
+
+	def _read(self, condition):
+		null = literal_column('NULL')
+		query = select([self.meta.c.id, self.meta.c.name, null.label('views'), null.label('likes')]).where(condition(self.meta.c.id)) \
+			.union_all(select([self.counters.c.id, null, self.counters.c.views, self.counters.c.likes]).where(condition(self.counters.c.id)))
+		records = {}
+		for video_id, name, views, likes in self.db.session.execute(query):
+			record = records.setdefault(video_id, {'id': video_id})
+			if name is not None:
+				record['name'] = name
+			else:
+				record['views'] = views
+				record['likes'] = likes
+		return dict((video_id, record) for video_id, record in records.items() if len(record) == 4)
+
+	def get(self, video_id):
+		return self._read(lambda column: column == video_id).get(video_id)
+
+	def get_many(self, video_ids):
+		video_ids = list(video_ids)
+		return self._read(lambda column: column.in_(video_ids))
+
+	def create(self, video_id, name, views, likes):
+		try:
+			self.db.session.execute(self.meta.insert().values(id=video_id, name=name))
+			self.db.session.execute(self.counters.insert().values(id=video_id, views=views, likes=likes))
+			self.db.session.commit()
+		except IntegrityError:
+			self.db.session.rollback()
+			raise VideoExists(video_id)
+		return {'id': video_id, 'name': name, 'views': views, 'likes': likes}
+
+	def _update(self, video_id, name=None, counters=None, add=False):
+		if not SQLITE_RETURNING:
+			return self._update_and_read(video_id, name, counters, add)
+		session = self.db.session
+		row = None
+		if name is not None:
+			row = session.execute(text(self.UPDATE_NAME), {'id': video_id, 'name': name}).first()
+		if counters and (row or name is None):
+			assignments = ', '.join('%s = %s:%s' % (key, key + ' + ' if add else '', key) for key in counters)
+			row = session.execute(text(self.UPDATE_COUNTERS % assignments), dict(counters, id=video_id)).first()
+		session.commit()
+		return dict(zip(('id', 'name', 'views', 'likes'), row)) if row else None
+
+	def _update_and_read(self, video_id, name, counters, add):
+		updated = 0
+		if name is not None:
+			updated += self.db.session.execute(self.meta.update().where(self.meta.c.id == video_id).values(name=name)).rowcount
+		if counters:
+			if add:
+				counters = dict((key, self.counters.c[key] + value) for key, value in counters.items())
+			updated += self.db.session.execute(self.counters.update().where(self.counters.c.id == video_id).values(**counters)).rowcount
+		record = self.get(video_id) if updated else None
+		self.db.session.commit()
+		return record
+
+	def update(self, video_id, **values):
+		counters = dict((key, values[key]) for key in ('views', 'likes') if key in values)
+		return self._update(video_id, values.get('name'), counters)
+
+	def increment(self, video_id, views=0, likes=0):
+		return self._update(video_id, counters={'views': views, 'likes': likes}, add=True)
+
+	def scan(self, after=None, limit=100):
+		page = select([self.meta.c.id]).order_by(self.meta.c.id).limit(limit)
+		if after is not None:
+			page = page.where(self.meta.c.id > after)
+		found = self._read(lambda column: column.in_(page))
+		return [found[video_id] for video_id in sorted(found)]
+
+	def split_existing(self):
+		"""Copy rows from ``video_model`` into the split tables."""
+		session = self.db.session
+		session.execute(self.meta.insert().from_select(['id', 'name'], select([VideoModel.id, VideoModel.name])).prefix_with('OR IGNORE'))
+		session.execute(self.counters.insert().from_select(['id', 'views', 'likes'],
+			select([VideoModel.id, VideoModel.views, VideoModel.likes])).prefix_with('OR IGNORE'))
+		session.commit()
+
+
+class MemoryRepository(VideoRepository):
+	"""Lock-protected in-memory engine.
+
+	Rows are stored as ``[name, views, likes]`` lists keyed by id; records are
+	built on the way out so callers never hold references into the table. A
+	sorted list of ids serves ``scan`` without sorting the table each call.
+	"""
+
+	query_costs = dict.fromkeys(('get', 'get_many', 'scan', 'create', 'update', 'increment'), 0)
+
+	def __init__(self):
+		self.rows = {}
+		self.ids = []
+		self.lock = threading.Lock()
+
+	def _record(self, video_id, row):
+		return {'id': video_id, 'name': row[0], 'views': row[1], 'likes': row[2]}
+
+	def get(self, video_id):
+		with self.lock:
+			row = self.rows.get(video_id)
+			return self._record(video_id, row) if row else None
+
+	def get_many(self, video_ids):
+		with self.lock:
+			return dict((video_id, self._record(video_id, self.rows[video_id]))
+				for video_id in video_ids if video_id in self.rows)
+
+	def create(self, video_id, name, views, likes):
+		with self.lock:
+			if video_id in self.rows:
+				raise VideoExists(video_id)
+			row = self.rows[video_id] = [name, views, likes]
+			bisect.insort(self.ids, video_id)
+			return self._record(video_id, row)
+
+	def update(self, video_id, **values):
+		with self.lock:
+			row = self.rows.get(video_id)
+			if not row:
+				return None
+			if 'name' in values:
+				row[0] = values['name']
+			if 'views' in values:
+				row[1] = values['views']
+			if 'likes' in values:
+				row[2] = values['likes']
+			return self._record(video_id, row)
+
+	def increment(self, video_id, views=0, likes=0):
+		with self.lock:
+			row = self.rows.get(video_id)
+			if not row:
+				return None
+			row[1] += views
+			row[2] += likes
+			return self._record(video_id, row)
+
+	def scan(self, after=None, limit=100):
+		with self.lock:
+			start = 0 if after is None else bisect.bisect_right(self.ids, after)
+			return [self._record(video_id, self.rows[video_id]) for video_id in self.ids[start:start + limit]]
+
+
+def create_repository(app):
+	engine = app.config.get('VIDEO_STORAGE', 'sqlalchemy')
+	if engine == 'sqlalchemy' and app.config.get('VIDEO_COUNTER_LAYOUT', 'inline') == 'split':
+		repository = SplitCounterRepository(db)
+	elif engine == 'sqlalchemy':
+		repository = SQLAlchemyRepository(db)
+	elif engine == 'memory':
+		repository = MemoryRepository()
+	elif engine == 'sharded':
+		from Flask_Rest_API.sharding import ShardedRepository, shard_urls
+		pattern = instance_file(app, app.config.get('VIDEO_SHARD_PATH', 'shard-{}.db'))
+		repository = ShardedRepository(shard_urls(app.instance_path, pattern, app.config.get('VIDEO_SHARDS', 4)))
+	else:
+		raise ValueError("Unknown VIDEO_STORAGE engine: %r" % engine)
+
+	if app.config.get('VIDEO_CACHE_SERVER'):
+		from Flask_Rest_API.cache import CachedRepository, MemcacheClient
+		client = MemcacheClient(app.config['VIDEO_CACHE_SERVER'], pool_size=app.config.get('VIDEO_CACHE_POOL_SIZE', 8))
+		repository = CachedRepository(repository, client, ttl=app.config.get('VIDEO_CACHE_TTL', 300),
+			lease_ttl=app.config.get('VIDEO_CACHE_LEASE_TTL', 10))
+	return repository
+
+
+def init_app(app):
+	app.extensions['video_repository'] = create_repository(app)
+
+
+def get_engines(app):
+	repository = app.extensions['video_repository']
+	repository = getattr(repository, 'repository', repository)
+	return [db.get_engine(app)] + list(getattr(repository, 'engines', []))
+
+
+def statement_info(conn, context):
+	"""Scratch space for engine event listeners that lasts one statement.
+
+	It lives on the execution context, so it is dropped with the statement
+	whether that succeeds or fails. The few statements run without a context
+	(dialect setup on first connect) share one slot on the connection.
+	"""
+	if context is None:
+		return conn.info.setdefault('statement_info', {})
+	info = getattr(context, '_statement_info', None)
+	if info is None:
+		info = context._statement_info = {}
+	return info
+
+
+def get_repository():
+	return current_app.extensions['video_repository']
+
+
+if __name__ == "__main__":
+	from Flask_Rest_API import create_app
+
+	with create_app().app_context():
+		db.create_all()
+		SplitCounterRepository(db).split_existing()
+	print("Copied video_model rows into video_meta and video_counters")
@@ -0,0 +1,29 @@
+import pytest
+
+from Flask_Rest_API import create_app
+
+
+@pytest.fixture(autouse=True)
+def isolated_settings(monkeypatch):
+	# A settings file from the environment would leak into every test app.
+	monkeypatch.delenv('FLASK_REST_API_SETTINGS', raising=False)
+
+
+@pytest.fixture
+def make_app(tmp_path):
+	"""Build a test app on an in-memory database; keyword arguments override config."""
+	def make(**config):
+		settings = {'TESTING': True, 'CREATE_TABLES': True}
+		settings.update(config)
+		return create_app(settings, instance_path=str(tmp_path / 'instance'))
+	return make
+
+
+@pytest.fixture
+def app(make_app):
+	return make_app()
+
+
+@pytest.fixture
+def client(app):
+	return app.test_client()
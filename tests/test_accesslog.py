@@ -0,0 +1,85 @@
+import json
+import os
+import time
+
+from Flask_Rest_API import worker_exit
+from Flask_Rest_API.accesslog import JSONLWriter
+
+
+def read(path):
+	return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_writer_rotates(tmp_path):
+	path = tmp_path / 'log.jsonl'
+	writer = JSONLWriter(str(path), max_bytes=50, backups=2)
+	for i in range(4):
+		writer.write([{'i': i, 'padding': 'x' * 40}])
+	assert not path.exists()
+	assert read(tmp_path / 'log.jsonl.1') == [{'i': 3, 'padding': 'x' * 40}]
+	assert read(tmp_path / 'log.jsonl.2') == [{'i': 2, 'padding': 'x' * 40}]
+	assert not (tmp_path / 'log.jsonl.3').exists()
+
+
+def test_writer_counts_drops(tmp_path):
+	path = tmp_path / 'log-{pid}.jsonl'
+	writer = JSONLWriter(str(path), max_queue=2, flush_interval=0.01)
+	assert '{pid}' not in writer.path
+	writer.thread = False  # keep the queue full until started
+	for i in range(5):
+		writer.put({'i': i})
+	assert writer.dropped == 3
+	writer.thread = None
+	writer.start()
+	deadline = time.time() + 5
+	records = []
+	while len(records) < 3 and time.time() < deadline:
+		time.sleep(0.01)
+		with open(writer.path) as f:
+			records = [json.loads(line) for line in f]
+	assert [record.get('i') for record in records[:2]] == [0, 1]
+	assert records[2]['dropped'] == 3
+
+
+def test_stop_writes_queued_records(tmp_path):
+	path = tmp_path / 'log.jsonl'
+	writer = JSONLWriter(str(path), batch_size=10, flush_interval=60)
+	for i in range(25):
+		writer.put({'i': i})
+	writer.stop()
+	assert [record['i'] for record in read(path)] == list(range(25))
+	assert writer.thread is None
+	writer.put({'i': 25})
+	writer.stop()
+	assert read(path)[-1] == {'i': 25}
+
+
+def test_worker_exit_drains_access_log(make_app, tmp_path):
+	path = tmp_path / 'access-{pid}.jsonl'
+	app = make_app(ACCESS_LOG=str(path), ACCESS_LOG_FLUSH_INTERVAL=60)
+	client = app.test_client()
+	for _ in range(3):
+		client.get('/video/1')
+	worker_exit(app)
+	assert len(read(tmp_path / ('access-%d.jsonl' % os.getpid()))) == 3
+
+
+def test_access_log_record(make_app, tmp_path):
+	app = make_app(ACCESS_LOG=str(tmp_path / 'access.jsonl'))
+	records = []
+	app.extensions['access_log'].writer.put = records.append
+	client = app.test_client()
+	client.put('/video/7', data={'name': 'a', 'views': 1, 'likes': 0})
+	client.get('/video/7?x=1')
+	put, get = records
+	assert (put['method'], put['status'], put['video_id']) == ('PUT', 201, 7)
+	assert get['route'] == '/video/<int:video_id>'
+	assert get['path'] == '/video/7'
+	assert get['queries'] >= 1
+	assert get['bytes'] > 0
+	assert get['latency_ms'] >= 0
+
+
+def test_relative_path_is_in_instance_folder(make_app):
+	app = make_app(ACCESS_LOG='access.jsonl')
+	assert app.extensions['access_log'].writer.path == os.path.join(app.instance_path, 'access.jsonl')
@@ -0,0 +1,82 @@
+import threading
+import time
+
+from Flask_Rest_API.admission import HIGH, LOW, NORMAL, AdmissionController, _Budget
+
+
+def test_budget_queues_then_sheds():
+	budget = _Budget(limit=1, max_queue=4)
+	assert budget.acquire(0.01, NORMAL)
+	started = time.monotonic()
+	assert not budget.acquire(0.05, NORMAL)
+	assert time.monotonic() - started >= 0.05
+	assert budget.stats() == {'limit': 1, 'in_flight': 1, 'queued': 0, 'admitted': 1, 'shed': 1}
+
+	admitted = []
+	waiter = threading.Thread(target=lambda: admitted.append(budget.acquire(5, NORMAL)))
+	waiter.start()
+	while not budget.stats()['queued']:
+		time.sleep(0.001)
+	budget.release()
+	waiter.join()
+	assert admitted == [True]
+
+
+def test_low_priority_shed_first():
+	budget = _Budget(limit=1, max_queue=4)
+	assert budget.acquire(0, NORMAL)
+	waiters = [threading.Thread(target=budget.acquire, args=(0.5, NORMAL)) for _ in range(2)]
+	for waiter in waiters:
+		waiter.start()
+	while budget.stats()['queued'] < 2:
+		time.sleep(0.001)
+	# The queue is half full: over a low priority request's share, under the others'.
+	assert not budget.acquire(0.5, LOW)
+	assert budget.stats()['shed'] == 1
+	for _ in waiters:
+		budget.release()
+	for waiter in waiters:
+		waiter.join()
+
+
+def app(environ, start_response):
+	start_response('200 OK', [('Content-Type', 'text/plain')])
+	return [b'ok']
+
+
+def call(controller, method, path):
+	response = {}
+
+	def start_response(status, headers):
+		response.update(status=status, headers=dict(headers))
+	body = b''.join(controller({'REQUEST_METHOD': method, 'PATH_INFO': path}, start_response))
+	return response['status'], response['headers'], body
+
+
+def test_rejects_with_retry_after():
+	controller = AdmissionController(app, read_limit=1, write_limit=1, max_queue=0, queue_timeout=0, retry_after=2)
+	controller.budgets['write'].acquire(0, NORMAL)
+	status, headers, body = call(controller, 'POST', '/video/1/increment')
+	assert status.startswith('503')
+	assert headers['Retry-After'] == '2'
+	assert body == b'{"message": "Server is overloaded, retry later"}'
+	# Reads have their own budget.
+	assert call(controller, 'GET', '/video/1')[0] == '200 OK'
+	assert controller.stats()['read'] == {'limit': 1, 'in_flight': 0, 'queued': 0, 'admitted': 1, 'shed': 0}
+
+
+def test_priorities():
+	controller = AdmissionController(app)
+	assert controller.priority('/admin/stats') == HIGH
+	assert controller.priority('/videos') == LOW
+	assert controller.priority('/video/1/history') == LOW
+	assert controller.priority('/video/1') == NORMAL
+
+
+def test_installed_by_config(make_app):
+	flask_app = make_app(ADMISSION_CONTROL=True, ADMISSION_READ_LIMIT=3)
+	controller = flask_app.extensions['admission']
+	assert flask_app.wsgi_app is controller
+	assert flask_app.test_client().get('/video/1').status_code == 404
+	assert controller.stats()['read']['admitted'] == 1
+	assert controller.stats()['read']['limit'] == 3
@@ -0,0 +1,52 @@
+import os
+
+from Flask_Rest_API import create_app, post_fork, pre_fork
+
+
+def test_testing_apps_get_private_databases(make_app):
+	first, second = make_app(), make_app()
+	assert first.config['SQLALCHEMY_DATABASE_URI'] == 'sqlite://'
+	first.test_client().put('/video/1', data={'name': 'a', 'views': 0, 'likes': 0})
+	assert first.test_client().get('/video/1').status_code == 200
+	assert second.test_client().get('/video/1').status_code == 404
+
+
+def test_debug_database_in_instance_folder(tmp_path):
+	app = create_app({'DEBUG': True}, instance_path=str(tmp_path / 'instance'))
+	assert app.config['SQLALCHEMY_DATABASE_URI'] == 'sqlite:///' + os.path.join(str(tmp_path), 'instance', 'database.db')
+
+
+def test_production_keeps_the_package_database(tmp_path):
+	app = create_app(instance_path=str(tmp_path / 'instance'))
+	assert app.config['SQLALCHEMY_DATABASE_URI'] == 'sqlite:///database.db'
+
+
+def test_explicit_database_wins(make_app, tmp_path):
+	uri = 'sqlite:///' + str(tmp_path / 'videos.db')
+	assert make_app(SQLALCHEMY_DATABASE_URI=uri).config['SQLALCHEMY_DATABASE_URI'] == uri
+
+
+def test_settings_file(make_app, tmp_path, monkeypatch):
+	settings = tmp_path / 'settings.py'
+	settings.write_text("VIDEO_STORAGE = 'memory'\n")
+	monkeypatch.setenv('FLASK_REST_API_SETTINGS', str(settings))
+	assert make_app().config['VIDEO_STORAGE'] == 'memory'
+	assert make_app(VIDEO_STORAGE='sqlalchemy').config['VIDEO_STORAGE'] == 'sqlalchemy'
+
+
+def test_fork_hooks_reach_extensions(make_app, tmp_path):
+	# Disposing the engines would drop an in-memory database.
+	app = make_app(SQLALCHEMY_DATABASE_URI='sqlite:///' + str(tmp_path / 'videos.db'))
+	calls = []
+
+	class Extension(object):
+		def pre_fork(self):
+			calls.append('pre')
+
+		def post_fork(self):
+			calls.append('post')
+	app.extensions['probe'] = Extension()
+	pre_fork(app)
+	post_fork(app)
+	assert calls == ['pre', 'post']
+	assert app.test_client().get('/videos').status_code == 200
@@ -0,0 +1,141 @@
+import asyncio
+import json
+
+import pytest
+from sqlalchemy import text
+
+from Flask_Rest_API import asgi
+from Flask_Rest_API.asgi import VideoASGI
+
+
+@pytest.fixture
+def flask_app(make_app, tmp_path):
+	# Executor threads each need to see the same database.
+	return make_app(SQLALCHEMY_DATABASE_URI='sqlite:///' + str(tmp_path / 'videos.db'), VIDEO_HISTORY=True)
+
+
+@pytest.fixture
+def application(flask_app):
+	application = VideoASGI(flask_app, max_workers=2)
+	yield application
+	application.readers.shutdown()
+	application.writers.shutdown()
+
+
+def call(application, method, path, body=b'', headers=()):
+	messages = []
+	received = []
+
+	async def receive():
+		received.append(True)
+		return {'type': 'http.request', 'body': body, 'more_body': False}
+
+	async def send(message):
+		messages.append(message)
+	headers = [(b'content-length', str(len(body)).encode())] + list(headers)
+	scope = {'type': 'http', 'method': method, 'path': path, 'query_string': b'', 'headers': headers}
+	asyncio.run(application(scope, receive, send))
+	return messages[0]['status'], json.loads(messages[1]['body']), bool(received)
+
+
+FORM = [(b'content-type', b'application/x-www-form-urlencoded')]
+
+
+def test_video_lifecycle(application):
+	assert call(application, 'GET', '/video/1')[:2] == (404, {'message': "Could not find video with that id"})
+	assert call(application, 'PUT', '/video/1', b'name=a&views=1&likes=0', FORM)[:2] == \
+		(201, {'id': 1, 'name': 'a', 'views': 1, 'likes': 0})
+	assert call(application, 'PUT', '/video/1', b'name=a&views=1&likes=0', FORM)[0] == 409
+	status, video, _ = call(application, 'PATCH', '/video/1', json.dumps({'views': 5}).encode(),
+		[(b'content-type', b'application/json')])
+	assert (status, video) == (200, {'id': 1, 'name': 'a', 'views': 5, 'likes': 0})
+	assert call(application, 'GET', '/video/1')[:2] == (200, video)
+	assert call(application, 'PATCH', '/video/2', b'views=1', FORM)[0] == 404
+
+
+def test_validation_and_routing(application):
+	status, payload, _ = call(application, 'PUT', '/video/1', b'name=a&views=x&likes=0', FORM)
+	assert (status, payload) == (400, {'message': {'views': "Views of the video"}})
+	assert call(application, 'PUT', '/video/1', b'[1]', [(b'content-type', b'application/json')])[0] == 400
+	assert call(application, 'GET', '/videos')[0] == 404
+	assert call(application, 'DELETE', '/video/1')[0] == 405
+
+
+def test_unhandled_errors_answer_500(application, flask_app, caplog):
+	def fail(video_id):
+		raise RuntimeError("database is gone")
+	flask_app.extensions['video_repository'].get = fail
+	status, payload, _ = call(application, 'GET', '/video/1')
+	assert status == 500
+	assert 'internal error' in payload['message']
+	assert 'database is gone' in caplog.text
+
+
+def test_oversized_body_rejected_before_reading(application):
+	headers = [(b'content-length', str(asgi.MAX_BODY + 1).encode())]
+	status, _, received = call(application, 'PUT', '/video/1', b'', headers + FORM)
+	assert status == 413
+	assert not received
+
+
+def test_lifespan_runs_background_jobs(flask_app):
+	application = VideoASGI(flask_app, max_workers=2)
+	history = flask_app.extensions['view_history']
+	messages = iter([{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}])
+	sent = []
+
+	async def receive():
+		message = next(messages)
+		if message['type'] == 'lifespan.shutdown':
+			assert history.thread is not None and history.thread.is_alive()
+			history.record(1, views=3)
+		return message
+
+	async def send(message):
+		sent.append(message['type'])
+	asyncio.run(application({'type': 'lifespan'}, receive, send))
+	assert sent == ['lifespan.startup.complete', 'lifespan.shutdown.complete']
+	assert history.stopping.is_set()
+	with history.engine.connect() as conn:
+		assert conn.execute(text('SELECT views FROM video_history_minute WHERE video_id = 1')).scalar() == 3
+
+
+async def exchange(application, request):
+	server = await asyncio.start_server(lambda r, w: asgi._handle_connection(application, r, w), '127.0.0.1', 0)
+	port = server.sockets[0].getsockname()[1]
+	reader, writer = await asyncio.open_connection('127.0.0.1', port)
+	writer.write(request)
+	await writer.drain()
+	response = await asyncio.wait_for(reader.read(), 5)
+	writer.close()
+	server.close()
+	await server.wait_closed()
+	return response
+
+
+@pytest.mark.parametrize('headers, status', [
+	(b'Content-Length: nope\r\n', b'400'),
+	(b'Content-Length: -1\r\n', b'400'),
+	(b'Content-Length: %d\r\n' % (asgi.MAX_BODY + 1), b'413'),
+	(b'Transfer-Encoding: chunked\r\n', b'411'),
+])
+def test_builtin_server_checks_content_length(application, headers, status):
+	request = b'PUT /video/1 HTTP/1.1\r\nHost: test\r\n' + headers + b'\r\n'
+	response = asyncio.run(exchange(application, request))
+	assert response.startswith(b'HTTP/1.1 ' + status)
+	assert b'connection: close' in response
+
+
+@pytest.mark.parametrize('request_line', [b'GET /video/1', b'GET  /video/1 HTTP/1.1', b'GARBAGE'])
+def test_builtin_server_rejects_malformed_request_line(application, request_line):
+	response = asyncio.run(exchange(application, request_line + b'\r\nHost: test\r\n\r\n'))
+	assert response.startswith(b'HTTP/1.1 400')
+
+
+def test_builtin_server_keep_alive(application):
+	body = b'name=a&views=1&likes=0'
+	request = (b'PUT /video/1 HTTP/1.1\r\nHost: test\r\nContent-Type: application/x-www-form-urlencoded\r\n'
+		b'Content-Length: %d\r\n\r\n%s' % (len(body), body)) + b'GET /video/1 HTTP/1.1\r\nHost: test\r\nConnection: close\r\n\r\n'
+	response = asyncio.run(exchange(application, request))
+	assert response.count(b'HTTP/1.1 ') == 2
+	assert b'HTTP/1.1 201' in response and b'HTTP/1.1 200' in response
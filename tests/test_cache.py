@@ -0,0 +1,117 @@
+import pytest
+
+from Flask_Rest_API.cache import CachedRepository, MemcacheClient
+from Flask_Rest_API.memcache_server import start_server
+from Flask_Rest_API.storage import MemoryRepository
+
+
+class CountingRepository(MemoryRepository):
+	def __init__(self):
+		MemoryRepository.__init__(self)
+		self.loads = 0
+		self.before_load = None
+
+	def get_many(self, video_ids):
+		self.loads += 1
+		records = MemoryRepository.get_many(self, video_ids)
+		if self.before_load is not None:
+			hook, self.before_load = self.before_load, None
+			hook()
+		return records
+
+
+@pytest.fixture
+def server():
+	server = start_server()
+	yield server
+	server.shutdown()
+	server.server_close()
+
+
+@pytest.fixture
+def client(server):
+	client = MemcacheClient(server.server_address)
+	yield client
+	client.close()
+
+
+@pytest.fixture
+def backing():
+	return CountingRepository()
+
+
+@pytest.fixture
+def repository(backing, client):
+	return CachedRepository(backing, client)
+
+
+def test_reads_through_and_then_hits(repository, backing):
+	backing.create(1, 'one', 1, 0)
+	assert repository.get(1)['name'] == 'one'
+	assert repository.get(1)['name'] == 'one'
+	assert backing.loads == 1
+	assert repository.client.hits == 1
+
+
+def test_get_many_only_loads_missing(repository, backing):
+	for video_id in (1, 2, 3):
+		backing.create(video_id, 'v', video_id, 0)
+	repository.get(1)
+	assert sorted(repository.get_many([1, 2, 3, 4])) == [1, 2, 3]
+	assert backing.loads == 2
+	assert sorted(repository.get_many([1, 2, 3])) == [1, 2, 3]
+	assert backing.loads == 2
+
+
+def test_writes_invalidate(repository):
+	repository.create(1, 'one', 1, 0)
+	repository.get(1)
+	repository.update(1, name='uno')
+	assert repository.get(1)['name'] == 'uno'
+	repository.increment(1, views=4)
+	assert repository.get(1)['views'] == 5
+
+
+def test_write_during_fill_is_not_overwritten_by_stale_value(repository, backing):
+	backing.create(1, 'old', 1, 0)
+	# The write commits and invalidates after the reader loaded the old row.
+	backing.before_load = lambda: repository.update(1, name='new')
+	assert repository.get(1)['name'] == 'old'
+	assert repository.get(1)['name'] == 'new'
+
+
+def test_concurrent_fill_without_lease_does_not_store(repository, backing, client):
+	backing.create(1, 'one', 1, 0)
+	assert client.lease_multi(['video:1'], 10)
+	repository.get(1)
+	assert client.get('video:1') is None
+	assert backing.loads == 1
+
+
+def test_missing_video_releases_lease(repository, client, server):
+	assert repository.get(7) is None
+	# The delete is noreply; a round trip on the same connection waits for it.
+	client.get('video:7')
+	assert b'video:7' not in server.store.items
+
+
+def test_cache_outage_falls_back_to_backing_store(backing):
+	server = start_server()
+	address = server.server_address
+	server.shutdown()
+	server.server_close()
+	repository = CachedRepository(backing, MemcacheClient(address, retry_interval=60))
+	backing.create(1, 'one', 1, 0)
+	assert repository.get(1)['name'] == 'one'
+	assert repository.update(1, name='uno')['name'] == 'uno'
+
+
+def test_server_cas_semantics(client):
+	leases = client.lease_multi(['k'], 10)
+	assert list(leases) == ['k']
+	assert client.lease_multi(['k'], 10) == {}
+	client.cas_multi({'k': (b'v1', leases['k'])})
+	assert client.get('k') == b'v1'
+	# The cas id changed with the store, so the old lease can't write again.
+	client.cas_multi({'k': (b'v2', leases['k'])})
+	assert client.get('k') == b'v1'
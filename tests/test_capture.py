@@ -0,0 +1,125 @@
+import http.client
+import io
+import json
+import socketserver
+import threading
+
+import pytest
+
+from Flask_Rest_API import worker_exit
+from Flask_Rest_API.benchmarks import replay
+from Flask_Rest_API.capture import TrafficCapture
+
+
+class Writer(object):
+	def __init__(self):
+		self.records = []
+
+	def put(self, record):
+		self.records.append(record)
+
+
+def echo(environ, start_response):
+	body = environ['wsgi.input'].read(int(environ.get('CONTENT_LENGTH') or 0))
+	start_response('200 OK', [('Content-Type', 'application/octet-stream')])
+	return [body]
+
+
+def call(app, environ):
+	environ = dict({'REQUEST_METHOD': 'PUT', 'PATH_INFO': '/video/1', 'wsgi.input': io.BytesIO()}, **environ)
+	return b''.join(app(environ, lambda status, headers, exc_info=None: None))
+
+
+def test_chunked_body_reaches_the_app():
+	writer = Writer()
+	app = TrafficCapture(echo, writer)
+	assert call(app, {'wsgi.input': io.BytesIO(b'name=a'), 'wsgi.input_terminated': True}) == b'name=a'
+	assert writer.records[0]['body'] == 'name=a'
+
+
+def test_unframed_body_is_left_alone():
+	writer = Writer()
+	stream = io.BytesIO(b'name=a')
+	app = TrafficCapture(lambda environ, start_response: [environ['wsgi.input'].read()], writer)
+	assert call(app, {'wsgi.input': stream}) == b'name=a'
+
+
+def test_oversized_bodies_pass_through_uncaptured():
+	writer = Writer()
+	app = TrafficCapture(echo, writer, max_body=4)
+	assert call(app, {'wsgi.input': io.BytesIO(b'name=a'), 'CONTENT_LENGTH': '6'}) == b'name=a'
+	assert call(app, {'wsgi.input': io.BytesIO(b'name=a'), 'wsgi.input_terminated': True}) == b'name=a'
+	assert writer.records == []
+
+
+def test_malformed_content_length_is_answered_by_the_app(make_app):
+	app = make_app(CAPTURE_TRAFFIC=True, CAPTURE_SAMPLE_RATE=1.0)
+	records = []
+	app.extensions['traffic_capture'].writer.put = records.append
+	client = app.test_client()
+	for length in ('', 'abc', '-1'):
+		response = client.put('/video/1', data={'name': 'a', 'views': 1, 'likes': 0},
+			environ_overrides={'CONTENT_LENGTH': length})
+		assert response.status_code == 400
+	response = client.put('/video/1?name=a&views=1&likes=0', environ_overrides={'CONTENT_LENGTH': 'abc'})
+	assert response.status_code == 201
+	assert [record['status'] for record in records] == [400, 400, 400, 201]
+
+
+def test_worker_exit_writes_captured_requests(make_app):
+	app = make_app(CAPTURE_TRAFFIC=True, CAPTURE_SAMPLE_RATE=1.0)
+	app.test_client().get('/video/1')
+	worker_exit(app)
+	with open(app.extensions['traffic_capture'].writer.path) as f:
+		assert [json.loads(line)['status'] for line in f] == [404]
+
+
+def test_capture_and_replay(make_app, tmp_path):
+	app = make_app(CAPTURE_TRAFFIC=True, CAPTURE_SAMPLE_RATE=1.0)
+	capture = app.extensions['traffic_capture']
+	assert capture.writer.path == str(tmp_path / 'instance' / 'traffic.jsonl')
+	records = []
+	capture.writer.put = records.append
+	client = app.test_client()
+	client.put('/video/1', data={'name': 'a', 'views': 1, 'likes': 0})
+	client.get('/video/1')
+	path = tmp_path / 'traffic.jsonl'
+	path.write_text(''.join(json.dumps(record) + '\n' for record in records))
+
+	target = replay.TestClientTarget(replay.scratch_app(str(tmp_path)))
+	results = replay.replay(replay.load(str(path)), target, speed=0, concurrency=1)
+	summary, diffs = replay.report(results, 1.0)
+	assert (summary['requests'], summary['errors'], diffs) == (2, 0, [])
+
+
+def test_scratch_app_copies_the_database(make_app, tmp_path):
+	source = make_app(SQLALCHEMY_DATABASE_URI='sqlite:///' + str(tmp_path / 'source.db'))
+	source.test_client().put('/video/1', data={'name': 'a', 'views': 1, 'likes': 0})
+	(tmp_path / 'scratch').mkdir()
+	copy = replay.scratch_app(str(tmp_path / 'scratch'), copy_from=source)
+	copy.test_client().put('/video/2', data={'name': 'b', 'views': 1, 'likes': 0})
+	assert copy.test_client().get('/video/1').status_code == 200
+	assert source.test_client().get('/video/2').status_code == 404
+
+
+class HangUp(socketserver.StreamRequestHandler):
+	"""Reads the request line and closes the connection without answering."""
+
+	def handle(self):
+		self.server.seen.append(self.rfile.readline().split()[0])
+
+
+def test_http_target_resends_only_safe_methods():
+	server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), HangUp)
+	server.seen = []
+	threading.Thread(target=server.serve_forever, daemon=True).start()
+	try:
+		target = replay.HTTPTarget('http://127.0.0.1:%d' % server.server_address[1])
+		for method in ('PUT', 'PATCH', 'POST', 'GET'):
+			del server.seen[:]
+			with pytest.raises((OSError, http.client.HTTPException)):
+				target.send(method, '/video/1', b'views=1', 'application/x-www-form-urlencoded')
+			assert server.seen == [method.encode()] * (2 if method == 'GET' else 1)
+	finally:
+		server.shutdown()
+		server.server_close()
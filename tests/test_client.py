@@ -0,0 +1,141 @@
+import asyncio
+import http.client
+import socket
+import threading
+
+import pytest
+
+from Flask_Rest_API.client import APIError, AsyncVideoClient, VideoClient
+from Flask_Rest_API.serve import PooledWSGIServer
+
+
+class ScriptedServer(object):
+	"""Answers each request with the next scripted reply; ``None`` drops the connection."""
+
+	def __init__(self, replies):
+		self.replies = list(replies)
+		self.requests = []
+		self.sock = socket.socket()
+		self.sock.bind(('127.0.0.1', 0))
+		self.sock.listen(16)
+		self.url = 'http://127.0.0.1:%d' % self.sock.getsockname()[1]
+		threading.Thread(target=self.run, daemon=True).start()
+
+	def run(self):
+		while True:
+			try:
+				conn, _ = self.sock.accept()
+			except OSError:
+				return
+			threading.Thread(target=self.serve, args=(conn,), daemon=True).start()
+
+	def serve(self, conn):
+		stream = conn.makefile('rb')
+		with conn:
+			while True:
+				line = stream.readline()
+				if not line:
+					return
+				length = 0
+				while True:
+					header = stream.readline()
+					if header in (b'\r\n', b''):
+						break
+					if header.lower().startswith(b'content-length:'):
+						length = int(header.split(b':')[1])
+				stream.read(length)
+				self.requests.append(line.split()[0].decode())
+				reply = self.replies.pop(0)
+				if reply is None:
+					return
+				status, headers, body = reply
+				conn.sendall(b'HTTP/1.1 %d X\r\nContent-Type: application/json\r\nContent-Length: %d\r\n%s\r\n%s'
+					% (status, len(body), b''.join(b'%s: %s\r\n' % header for header in headers), body))
+
+	def close(self):
+		self.sock.close()
+
+
+VIDEO = b'{"id": 1, "name": "a", "views": 0, "likes": 0}'
+
+
+@pytest.fixture
+def scripted():
+	servers = []
+
+	def start(*replies):
+		server = ScriptedServer(replies)
+		servers.append(server)
+		return server
+	yield start
+	for server in servers:
+		server.close()
+
+
+def test_get_retried_after_dropped_connection(scripted):
+	server = scripted(None, (200, [], VIDEO))
+	with VideoClient(server.url, coalesce=False, backoff=0) as client:
+		assert client.get(1)['name'] == 'a'
+	assert server.requests == ['GET', 'GET']
+
+
+@pytest.mark.parametrize('call', [
+	lambda client: client.create(1, 'a'),
+	lambda client: client.increment(1, views=1),
+])
+def test_non_idempotent_writes_not_resent(scripted, call):
+	server = scripted(None, (201, [], VIDEO))
+	with VideoClient(server.url, backoff=0) as client:
+		with pytest.raises((OSError, http.client.HTTPException)):
+			call(client)
+	assert len(server.requests) == 1
+
+
+def test_overload_statuses_retried_after_retry_after(scripted):
+	server = scripted((503, [(b'Retry-After', b'0')], b'{}'), (429, [], b'{}'), (201, [], VIDEO))
+	with VideoClient(server.url, backoff=0) as client:
+		assert client.create(1, 'a')['id'] == 1
+	assert server.requests == ['PUT', 'PUT', 'PUT']
+
+
+def test_retries_are_bounded(scripted):
+	server = scripted(*[(503, [], b'{"message": "busy"}')] * 3)
+	with VideoClient(server.url, retries=2, backoff=0) as client:
+		with pytest.raises(APIError) as error:
+			client.create(1, 'a')
+	assert error.value.status == 503
+	assert len(server.requests) == 3
+
+
+def test_async_client_retries(scripted):
+	server = scripted(None, (200, [], VIDEO), None)
+
+	async def run():
+		async with AsyncVideoClient(server.url, coalesce=False, backoff=0) as client:
+			assert (await client.get(1))['name'] == 'a'
+			with pytest.raises(ConnectionError):
+				await client.create(2, 'b')
+	asyncio.run(run())
+	assert server.requests == ['GET', 'GET', 'PUT']
+
+
+def test_against_the_app(make_app, tmp_path):
+	app = make_app(SQLALCHEMY_DATABASE_URI='sqlite:///' + str(tmp_path / 'videos.db'))
+	server = PooledWSGIServer('127.0.0.1', 0, app, threads=4, reuse_port=False)
+	threading.Thread(target=server.serve_forever, daemon=True).start()
+	try:
+		with VideoClient('http://127.0.0.1:%d' % server.server_port) as client:
+			assert client.create(1, 'a', views=1)['views'] == 1
+			with pytest.raises(APIError) as error:
+				client.create(1, 'a')
+			assert error.value.status == 409
+			results = client.bulk_create([{'id': i, 'name': 'v', 'views': 0, 'likes': 0} for i in range(2, 40)])
+			assert [result['id'] for result in results] == list(range(2, 40))
+			assert client.increment(1, views=2)['views'] == 3
+			assert client.get(1)['views'] == 3
+			assert client.get(1000) is None
+			assert sorted(client.get_many([1, 2, 1000])) == [1, 2]
+	finally:
+		server.shutdown()
+		server.drain()
+		server.server_close()
@@ -0,0 +1,35 @@
+import pytest
+
+from Flask_Rest_API.history import HOUR
+
+
+@pytest.fixture
+def app(make_app):
+	return make_app(VIDEO_HISTORY=True)
+
+
+def test_changes_are_recorded(app, client):
+	client.put('/video/1', data={'name': 'a', 'views': 10, 'likes': 0})
+	client.patch('/video/1', data={'views': 15})
+	client.post('/video/1/increment', data={'views': 2, 'likes': 1})
+	history = app.extensions['view_history']
+	assert history.flush() == 1
+
+	points = client.get('/video/1/history?resolution=minute').get_json()['points']
+	assert [(point['views'], point['likes']) for point in points] == [(7, 1)]
+
+	history.rollup()
+	points = client.get('/video/1/history?resolution=hour').get_json()['points']
+	assert [(point['views'], point['likes']) for point in points] == [(7, 1)]
+	assert points[0]['time'] % HOUR == 0
+
+
+def test_rename_records_nothing(app, client):
+	client.put('/video/1', data={'name': 'a', 'views': 10, 'likes': 0})
+	client.patch('/video/1', data={'name': 'b'})
+	assert app.extensions['view_history'].flush() == 0
+
+
+def test_disabled(make_app):
+	client = make_app().test_client()
+	assert client.get('/video/1/history').status_code == 404
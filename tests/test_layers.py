@@ -0,0 +1,17 @@
+from Flask_Rest_API.benchmarks import layers
+
+
+def test_run_times_every_stage():
+	results = layers.run(number=3, repeat=2, warmup=1, rows=10)
+	assert list(results) == ['routing', 'parse_args', 'query.first', 'repository.get', 'marshal', 'output_json',
+		'increment+commit', 'GET /video/1']
+	for result in results.values():
+		assert result['rounds'] == 2 and result['number'] == 3
+		assert 0 < result['min_us'] <= result['median_us']
+
+
+def test_compare_flags_regressions(capsys):
+	baseline = {'routing': {'min_us': 10.0}, 'marshal': {'min_us': 10.0}}
+	current = {'routing': {'min_us': 10.5}, 'marshal': {'min_us': 12.0}, 'new': {'min_us': 1.0}}
+	assert layers.compare(baseline, current, 0.1) == ['marshal']
+	assert 'new' in capsys.readouterr().out
@@ -0,0 +1,37 @@
+import time
+
+from Flask_Rest_API.benchmarks import loadgen, replay
+
+
+def test_smoke(client):
+	# What test.py used to walk through by hand against a running server.
+	videos = [{'name': 'John', 'views': 12000, 'likes': 10}, {'name': 'Jack', 'views': 14000, 'likes': 14},
+		{'name': 'Anna', 'views': 18000, 'likes': 41}, {'name': 'Brad', 'views': 2000, 'likes': 5}]
+	for video_id, video in enumerate(videos):
+		assert client.put('/video/%d' % video_id, data=video).get_json() == dict(video, id=video_id)
+	assert client.get('/video/2').get_json() == dict(videos[2], id=2)
+	assert client.patch('/video/2', data={'views': 15500}).get_json() == dict(videos[2], id=2, views=15500)
+
+
+def test_closed_loop(tmp_path):
+	# The in-memory test database is one connection, which threads can't share.
+	target = replay.TestClientTarget(replay.scratch_app(str(tmp_path)))
+	loadgen.seed(target, 10)
+	samples = loadgen.run(target, concurrency=2, duration=0.2, warmup=0, writes=0.5, chooser=loadgen.KeyChooser(10))
+	results = loadgen.summarize(samples, 0.2)
+	assert results['all']['errors'] == 0
+	assert results['read']['requests'] and results['write']['requests']
+
+
+def test_open_loop_measures_from_the_schedule():
+	class SlowTarget(object):
+		def send(self, method, path, body, content_type):
+			time.sleep(0.05)
+			return 200, b'{}'
+	# One thread can serve 20 requests/s but 100/s are scheduled, so latency grows with the backlog.
+	samples = loadgen.run(SlowTarget(), concurrency=1, duration=0.3, warmup=0, writes=0, rate=100,
+		chooser=loadgen.KeyChooser(10, 'zipf'))
+	assert len(samples) == 30
+	latencies = [latency for _, _, latency in samples]
+	assert latencies[-1] > 1.0
+	assert latencies[-1] > latencies[0] + 1.0
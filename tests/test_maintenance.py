@@ -0,0 +1,47 @@
+import sqlite3
+import time
+
+import pytest
+
+
+COUNT = 'WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c LIMIT 100000) SELECT count(*) FROM c'
+
+
+@pytest.fixture
+def maintenance(make_app, tmp_path):
+	app = make_app(SQLALCHEMY_DATABASE_URI='sqlite:///' + str(tmp_path / 'videos.db'))
+	return app.extensions['db_maintenance']
+
+
+def test_run_once(maintenance):
+	maintenance.budget = 10
+	results = maintenance.run_once()
+	assert results == {'optimize': 'ok', 'incremental_vacuum': 'ok', 'wal_checkpoint': 'ok'}
+	assert maintenance.stats()['last_steps'] == results
+
+
+def test_budget_skips_remaining_steps(maintenance):
+	maintenance.budget = 0
+	assert set(maintenance.run_once().values()) == {'skipped'}
+
+
+class FailingVacuum(sqlite3.Connection):
+	def execute(self, statement, *args):
+		if statement.startswith('PRAGMA incremental_vacuum'):
+			raise RuntimeError("vacuum failed")
+		return sqlite3.Connection.execute(self, statement, *args)
+
+
+def test_progress_handler_cleared_after_failure(make_app):
+	# An in-memory database keeps handing out the same connection.
+	app = make_app(SQLALCHEMY_ENGINE_OPTIONS={'connect_args': {'factory': FailingVacuum}})
+	maintenance = app.extensions['db_maintenance']
+	maintenance.budget = 0.05
+	with pytest.raises(RuntimeError):
+		maintenance.run_once()
+	time.sleep(0.1)
+	raw = maintenance.engine.raw_connection()
+	try:
+		assert raw.connection.execute(COUNT).fetchone()[0] == 100000
+	finally:
+		raw.close()
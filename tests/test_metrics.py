@@ -0,0 +1,90 @@
+import os
+import threading
+
+from Flask_Rest_API import post_fork, worker_exit
+
+
+FORM = {'name': 'a', 'views': 1, 'likes': 0}
+
+
+def requests_total(metrics):
+	return sum(value for (name, _), value in metrics.collect()['counters'].items()
+		if name == 'video_api_requests_total')
+
+
+def test_exited_threads_fold_into_process_totals(make_app):
+	app = make_app(METRICS=True)
+	metrics = app.extensions['metrics']
+	client = app.test_client()
+	client.put('/video/1', data=FORM)
+
+	def get():
+		app.test_client().get('/video/1')
+	threads = [threading.Thread(target=get) for _ in range(5)]
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+	del thread, threads
+	assert len(metrics.accumulators) == 1
+	assert requests_total(metrics) == 6
+	assert 'video_api_requests_total{method="GET",resource="Video.get",status="200"} 5' in metrics.render()
+
+
+def test_snapshot_files_are_removed(make_app, tmp_path):
+	app = make_app(METRICS=True, METRICS_DIR=str(tmp_path / 'metrics'))
+	metrics = app.extensions['metrics']
+	directory = metrics.directory
+	dead = os.path.join(directory, 'metrics-999999999-1.json')
+	with open(dead, 'w') as f:
+		f.write('{"counters": [["video_api_requests_total", "", 3]]}')
+	app.test_client().get('/video/1')
+	assert 'video_api_requests_total' in app.test_client().get('/metrics').get_data(as_text=True)
+	own = metrics.snapshot_path()
+	assert os.path.basename(own) == 'metrics-%d-%d.json' % (os.getpid(), metrics.started)
+	assert not os.path.exists(dead)
+	assert os.path.exists(own)
+
+	worker_exit(app)
+	assert not os.path.exists(own)
+	assert not metrics.thread.is_alive()
+
+
+def test_concurrent_snapshot_writes(make_app, tmp_path):
+	app = make_app(METRICS=True, METRICS_DIR=str(tmp_path / 'metrics'))
+	metrics = app.extensions['metrics']
+	app.test_client().get('/video/1')
+	errors = []
+
+	def write():
+		try:
+			for _ in range(50):
+				metrics.write_snapshot()
+		except Exception as e:
+			errors.append(e)
+
+	threads = [threading.Thread(target=write) for _ in range(4)]
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+	assert errors == []
+	assert os.listdir(metrics.directory) == [os.path.basename(metrics.snapshot_path())]
+	assert requests_total(metrics) == 1
+
+
+def test_post_fork_starts_fresh(make_app, tmp_path):
+	app = make_app(METRICS=True, METRICS_DIR=str(tmp_path / 'metrics'))
+	metrics = app.extensions['metrics']
+	app.test_client().get('/video/1')
+	old = metrics.accumulators[0]
+	post_fork(app)
+	metrics.retire(old)
+	assert requests_total(metrics) == 0
+	worker_exit(app)
+
+
+def test_relative_directory_is_in_instance_folder(make_app):
+	app = make_app(METRICS=True, METRICS_DIR='metrics')
+	assert app.extensions['metrics'].directory == os.path.join(app.instance_path, 'metrics')
+	assert os.path.isdir(os.path.join(app.instance_path, 'metrics'))
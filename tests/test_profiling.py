@@ -0,0 +1,75 @@
+import os
+import threading
+
+import pytest
+
+from Flask_Rest_API.profiling import _collapse
+
+
+@pytest.fixture
+def profiled(make_app, tmp_path):
+	def make(**config):
+		settings = {'PROFILING': True, 'ADMIN_TOKEN': 'secret', 'PROFILE_DIR': str(tmp_path / 'profiles'),
+			'PROFILE_FLUSH_INTERVAL': 3600}
+		settings.update(config)
+		app = make_app(**settings)
+		return app, app.extensions['profiler']
+	return make
+
+
+def test_trace_mode_writes_folded_stacks(profiled, tmp_path):
+	app, profiler = profiled(PROFILE_MODE='trace')
+	client = app.test_client()
+	client.get('/video/1', headers={'X-Profile': '1', 'X-Admin-Token': 'secret'})
+	profiler.flush()
+	path = tmp_path / 'profiles' / ('Video.get.%d.folded' % os.getpid())
+	lines = path.read_text().splitlines()
+	assert lines
+	for line in lines:
+		stack, count = line.rsplit(' ', 1)
+		assert int(count) >= 0
+	assert any('get (core.py)' in line for line in lines)
+
+
+def test_requires_admin_token(profiled, tmp_path):
+	app, profiler = profiled(PROFILE_MODE='trace')
+	app.test_client().get('/video/1', headers={'X-Profile': '1', 'X-Admin-Token': 'wrong'})
+	assert profiler.stacks == {}
+	assert profiler.thread is None
+
+
+def test_sample_mode(profiled):
+	app, profiler = profiled()
+	blocked = threading.Event()
+	release = threading.Event()
+
+	def busy():
+		blocked.set()
+		release.wait(5)
+	thread = threading.Thread(target=busy)
+	thread.start()
+	blocked.wait(5)
+	profiler.active[thread.ident] = 'Video.get'
+	profiler.sample()
+	release.set()
+	thread.join()
+	(stack, count), = profiler.stacks['Video.get'].items()
+	assert 'busy (test_profiling.py);wait (threading.py)' in stack
+	assert count == 1
+
+
+def test_unknown_mode(make_app):
+	with pytest.raises(ValueError):
+		make_app(PROFILING=True, PROFILE_MODE='wall')
+
+
+def test_default_directory_is_in_instance_folder(make_app):
+	app = make_app(PROFILING=True)
+	assert app.extensions['profiler'].directory == os.path.join(app.instance_path, 'profiles')
+
+
+def test_collapse_root_first():
+	def inner():
+		import sys
+		return _collapse(sys._getframe(), lambda code: code.co_name)
+	assert inner().endswith('test_collapse_root_first;inner')
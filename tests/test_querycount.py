@@ -0,0 +1,157 @@
+import pytest
+from flask import Flask, g
+
+from Flask_Rest_API import db
+from Flask_Rest_API.querycount import QueryBudgetExceeded, query_budget
+
+
+def query_count(response):
+	return int(response.headers['X-Query-Count'])
+
+
+@pytest.fixture
+def video(client):
+	assert client.put('/video/1', data={'name': 'first', 'views': 10, 'likes': 1}).status_code == 201
+	assert client.put('/video/2', data={'name': 'second', 'views': 20, 'likes': 2}).status_code == 201
+
+
+def test_headers_on_every_response(client):
+	response = client.get('/video/1')
+	assert response.status_code == 404
+	assert query_count(response) == 1
+	assert float(response.headers['X-DB-Time']) >= 0
+
+
+@pytest.mark.parametrize('method, path, data, expected', [
+	('get', '/video/1', None, 1),
+	('post', '/video/1/increment', {'views': 1}, 2),
+	('get', '/videos', None, 1),
+	('get', '/videos?ids=1,2', None, 1),
+	('get', '/videos?after=1&limit=5', None, 1),
+])
+def test_endpoint_query_counts(client, video, method, path, data, expected):
+	response = getattr(client, method)(path, data=data)
+	assert response.status_code == 200
+	assert query_count(response) == expected
+
+
+def test_memory_engine_issues_no_queries(make_app):
+	client = make_app(VIDEO_STORAGE='memory').test_client()
+	assert query_count(client.put('/video/1', data={'name': 'a', 'views': 1, 'likes': 0})) == 0
+	assert query_count(client.get('/video/1')) == 0
+	assert query_count(client.post('/video/1/increment', data={'likes': 1})) == 0
+	assert query_count(client.get('/videos?ids=1')) == 0
+
+
+def budget_app(budget, statements, **config):
+	app = Flask(__name__)
+	app.config.update(dict({'TESTING': True}, **config))
+
+	@app.route('/')
+	@query_budget(budget)
+	def index():
+		g.query_count = g.get('query_count', 0) + statements
+		return 'ok'
+	return app
+
+
+@pytest.mark.parametrize('budget, statements', [(1, 1), ((1, 2), 2), ((0, 2), 0)])
+def test_budget_within_bounds(budget, statements):
+	assert budget_app(budget, statements).test_client().get('/').status_code == 200
+
+
+@pytest.mark.parametrize('budget, statements', [(1, 0), (1, 2), ((1, 2), 3), ((1, 2), 0)])
+def test_budget_outside_bounds(budget, statements):
+	with pytest.raises(QueryBudgetExceeded):
+		budget_app(budget, statements).test_client().get('/')
+
+
+def test_budget_not_enforced_outside_testing():
+	app = budget_app(1, 5, TESTING=False, QUERY_BUDGET_ENFORCE=None)
+	assert app.test_client().get('/').status_code == 200
+
+
+def test_budget_from_repository_cost(app):
+	repository = app.extensions['video_repository']
+	assert repository.query_cost('get') == (1, 1)
+	assert repository.query_cost('get', 'update') == (3, 3)
+	assert repository.query_cost('unknown') is None
+
+
+def test_cached_reads_within_budget(make_app):
+	from Flask_Rest_API.memcache_server import start_server
+	server = start_server()
+	try:
+		client = make_app(VIDEO_CACHE_SERVER='%s:%d' % server.server_address).test_client()
+		client.put('/video/1', data={'name': 'a', 'views': 1, 'likes': 0})
+		assert query_count(client.get('/video/1')) == 1
+		assert query_count(client.get('/video/1')) == 0
+	finally:
+		server.shutdown()
+		server.server_close()
+
+
+@pytest.mark.parametrize('config, expected', [
+	({}, 1),
+	({'VIDEO_COUNTER_LAYOUT': 'split'}, 2),
+	({'VIDEO_STORAGE': 'memory'}, 0),
+])
+def test_put_budget_follows_layout(make_app, config, expected):
+	client = make_app(**config).test_client()
+	response = client.put('/video/1', data={'name': 'a', 'views': 1, 'likes': 0})
+	assert response.status_code == 201
+	assert query_count(response) == expected
+	response = client.put('/video/1', data={'name': 'a', 'views': 1, 'likes': 0})
+	assert response.status_code == 409
+
+
+def test_failed_statements_counted(client, app):
+	client.put('/video/1', data={'name': 'a', 'views': 1, 'likes': 0})
+	for _ in range(5):
+		response = client.put('/video/1', data={'name': 'a', 'views': 1, 'likes': 0})
+		assert response.status_code == 409
+		assert query_count(response) == 1
+	with app.app_context():
+		with db.engine.connect() as conn:
+			assert not conn.info.get('statement_info')
+			assert 'query_count_start' not in conn.info
+
+
+@pytest.mark.parametrize('path', ['/video/1', '/videos', '/videos?ids=1'])
+def test_split_layout_reads(make_app, path):
+	client = make_app(VIDEO_COUNTER_LAYOUT='split').test_client()
+	client.put('/video/1', data={'name': 'a', 'views': 1, 'likes': 0})
+	response = client.get(path)
+	assert response.status_code == 200
+	assert query_count(response) == 1
+
+
+@pytest.mark.parametrize('config, data, expected', [
+	({}, {'name': 'b'}, 2),
+	({}, {'views': 5}, 2),
+	({}, {}, 1),
+	({'VIDEO_HISTORY': True}, {'views': 5}, 3),
+	({'VIDEO_HISTORY': True}, {'name': 'b'}, 2),
+	({'VIDEO_COUNTER_LAYOUT': 'split'}, {'name': 'b'}, 1),
+	({'VIDEO_COUNTER_LAYOUT': 'split'}, {'views': 5}, 1),
+	({'VIDEO_COUNTER_LAYOUT': 'split'}, {'name': 'b', 'likes': 3}, 2),
+	({'VIDEO_COUNTER_LAYOUT': 'split', 'VIDEO_HISTORY': True}, {'name': 'b', 'views': 5}, 3),
+	({'VIDEO_STORAGE': 'memory', 'VIDEO_HISTORY': True}, {'views': 5}, 0),
+])
+def test_patch_budget_follows_layout(make_app, config, data, expected):
+	client = make_app(**config).test_client()
+	client.put('/video/1', data={'name': 'a', 'views': 1, 'likes': 0})
+	response = client.patch('/video/1', data=data)
+	assert response.status_code == 200
+	assert response.get_json() == dict({'id': 1, 'name': 'a', 'views': 1, 'likes': 0}, **data)
+	assert query_count(response) == expected
+	assert client.patch('/video/2', data=data).status_code == 404
+
+
+@pytest.mark.parametrize('layout', ['inline', 'split'])
+def test_increment_budget(make_app, layout):
+	client = make_app(VIDEO_COUNTER_LAYOUT=layout).test_client()
+	client.put('/video/1', data={'name': 'a', 'views': 1, 'likes': 0})
+	response = client.post('/video/1/increment', data={'views': 2, 'likes': 1})
+	assert response.get_json() == {'id': 1, 'name': 'a', 'views': 3, 'likes': 1}
+	assert query_count(response) == (2 if layout == 'inline' else 1)
@@ -0,0 +1,67 @@
+import json
+
+from Flask_Rest_API import db
+
+
+def slow_entries(path):
+	with open(path) as f:
+		return [json.loads(line) for line in f]
+
+
+def test_logs_slow_statements_with_plan(make_app, tmp_path):
+	path = tmp_path / 'slow.log'
+	app = make_app(SLOW_QUERY_THRESHOLD_MS=0, SLOW_QUERY_LOG=str(path), ADMIN_TOKEN='secret')
+	client = app.test_client()
+	client.get('/video/1')
+	entries = slow_entries(path)
+	select = [entry for entry in entries if entry['statement'].lstrip().startswith('SELECT')]
+	assert select and select[-1]['endpoint'] == 'video'
+	assert select[-1]['plan']
+	response = client.get('/admin/slow-queries', headers={'X-Admin-Token': 'secret'})
+	assert response.status_code == 200
+
+
+def test_logs_failed_statements(make_app, tmp_path):
+	path = tmp_path / 'slow.log'
+	app = make_app(SLOW_QUERY_THRESHOLD_MS=0, SLOW_QUERY_LOG=str(path))
+	client = app.test_client()
+	client.put('/video/1', data={'name': 'a', 'views': 1, 'likes': 0})
+	for _ in range(3):
+		assert client.put('/video/1', data={'name': 'a', 'views': 1, 'likes': 0}).status_code == 409
+	failed = [entry for entry in slow_entries(path) if 'error' in entry]
+	assert len(failed) == 3
+	assert failed[-1]['statement'].lstrip().startswith('INSERT')
+	assert 'IntegrityError' in failed[-1]['error']
+	with app.app_context():
+		with db.engine.connect() as conn:
+			assert 'slow_query_start' not in conn.info
+			assert not conn.info.get('statement_info')
+
+
+def test_apps_sharing_a_file_log_each_statement_once(make_app, tmp_path):
+	path = tmp_path / 'slow.log'
+	apps = [make_app(SLOW_QUERY_THRESHOLD_MS=0, SLOW_QUERY_LOG=str(path)) for _ in range(3)]
+	handlers = set(handler for app in apps for handler in app.extensions['slow_query_log'].logger.handlers)
+	assert len(handlers) == 1
+	before = len(slow_entries(path))
+	with apps[0].app_context():
+		db.session.execute('SELECT 1')
+		db.session.remove()
+	assert len(slow_entries(path)) == before + 1
+
+
+def test_apps_with_different_files_stay_separate(make_app, tmp_path):
+	first = make_app(SLOW_QUERY_THRESHOLD_MS=0, SLOW_QUERY_LOG=str(tmp_path / 'a.log'))
+	make_app(SLOW_QUERY_THRESHOLD_MS=0, SLOW_QUERY_LOG=str(tmp_path / 'b.log'))
+	before = len(slow_entries(tmp_path / 'b.log'))
+	with first.app_context():
+		db.session.execute('SELECT 1')
+		db.session.remove()
+	assert len(slow_entries(tmp_path / 'b.log')) == before
+
+
+def test_relative_log_path_is_in_instance_folder(make_app):
+	app = make_app(SLOW_QUERY_LOG='slow_queries.log')
+	path = app.extensions['slow_query_log'].path
+	assert path.startswith(app.instance_path)
+	assert not path.startswith(app.root_path + '/')
@@ -0,0 +1,102 @@
+import os
+import sqlite3
+
+import pytest
+
+from Flask_Rest_API.ratelimit import SQLiteBucketTable, TokenBucketTable
+
+
+@pytest.fixture
+def app(make_app):
+	return make_app(RATE_LIMIT=True, RATE_LIMIT_READ=(1, 2), RATE_LIMIT_WRITE=(1, 1), RATE_LIMIT_API_KEYS=['known'])
+
+
+def test_burst_then_429(client):
+	first = client.get('/videos')
+	assert first.status_code == 200
+	assert first.headers['X-RateLimit-Limit'] == '2'
+	assert first.headers['X-RateLimit-Remaining'] == '1'
+	assert client.get('/videos').status_code == 200
+	rejected = client.get('/videos')
+	assert rejected.status_code == 429
+	assert int(rejected.headers['Retry-After']) >= 1
+
+
+def test_reads_and_writes_are_separate(client):
+	assert client.put('/video/1', data={'name': 'a', 'views': 0, 'likes': 0}).status_code == 201
+	assert client.patch('/video/1', data={'name': 'b'}).status_code == 429
+	assert client.get('/video/1').status_code == 200
+
+
+def test_unknown_api_keys_share_the_address_bucket(client):
+	statuses = [client.get('/videos', headers={'X-API-Key': 'rotating-%d' % i}).status_code for i in range(3)]
+	assert statuses == [200, 200, 429]
+	assert len(client.application.extensions['rate_limiter'].tables['read']) == 1
+
+
+def test_known_api_key_has_its_own_bucket(client):
+	client.get('/videos')
+	client.get('/videos')
+	assert client.get('/videos').status_code == 429
+	assert client.get('/videos', headers={'X-API-Key': 'known'}).status_code == 200
+
+
+def test_unlimited_endpoints(client):
+	for _ in range(5):
+		assert 'X-RateLimit-Limit' not in client.get('/admin/admission').headers
+
+
+def test_bucket_refills():
+	table = TokenBucketTable(rate=2, burst=1)
+	assert table.take('a', now=0) == (True, 0)
+	assert table.take('a', now=0.1)[0] is False
+	assert table.take('a', now=0.6)[0] is True
+
+
+def test_bucket_table_is_bounded():
+	table = TokenBucketTable(rate=1, burst=1, stripes=2, max_clients=10)
+	for i in range(100):
+		table.take('client-%d' % i, now=0)
+	assert len(table) <= 10
+
+
+def test_sqlite_table_shared_between_connections(tmp_path):
+	path = str(tmp_path / 'buckets.db')
+	first = SQLiteBucketTable(path, rate=1, burst=2)
+	second = SQLiteBucketTable(path, rate=1, burst=2)
+	assert first.take('a', now=100)[0] is True
+	assert second.take('a', now=100)[0] is True
+	assert first.take('a', now=100)[0] is False
+
+
+def test_sqlite_table_fails_open_when_locked(tmp_path):
+	path = str(tmp_path / 'buckets.db')
+	table = SQLiteBucketTable(path, rate=1, burst=1, busy_timeout=0.01)
+	holder = sqlite3.connect(path, isolation_level=None)
+	holder.execute('BEGIN IMMEDIATE')
+	try:
+		assert table.take('a') == (True, None)
+	finally:
+		holder.execute('ROLLBACK')
+	assert table.take('a')[0] is True
+
+
+def test_locked_sqlite_table_lets_requests_through(make_app, tmp_path):
+	path = str(tmp_path / 'buckets.db')
+	app = make_app(RATE_LIMIT=True, RATE_LIMIT_SQLITE_PATH=path)
+	for table in app.extensions['rate_limiter'].tables.values():
+		table.busy_timeout = 0.01
+	holder = sqlite3.connect(path, isolation_level=None)
+	holder.execute('BEGIN IMMEDIATE')
+	try:
+		response = app.test_client().get('/videos')
+	finally:
+		holder.execute('ROLLBACK')
+	assert response.status_code == 200
+	assert 'X-RateLimit-Remaining' not in response.headers
+
+
+def test_relative_sqlite_path_is_in_instance_folder(make_app):
+	app = make_app(RATE_LIMIT=True, RATE_LIMIT_SQLITE_PATH='rate_limits.db')
+	for table in app.extensions['rate_limiter'].tables.values():
+		assert table.path == os.path.join(app.instance_path, 'rate_limits.db')
@@ -0,0 +1,52 @@
+import sqlite3
+
+import pytest
+from sqlalchemy import create_engine
+
+from Flask_Rest_API import db, models  # noqa: F401 registers the tables
+from Flask_Rest_API.seed import generate, load
+
+
+def test_generate_is_reproducible():
+	rows = list(generate(1000, seed=42))
+	assert rows == list(generate(1000, seed=42))
+	assert rows != list(generate(1000, seed=43))
+	assert [row[0] for row in rows] == list(range(1000))
+	for _, name, views, likes in rows:
+		assert 0 < len(name) <= 100
+		assert views >= 100
+		assert 0 <= likes <= views
+	assert list(generate(3, seed=42, start_id=10))[0][0] == 10
+
+
+@pytest.fixture
+def engine(tmp_path):
+	engine = create_engine('sqlite:///' + str(tmp_path / 'seed.db'))
+	db.metadata.create_all(engine)
+	engine.execute('CREATE INDEX ix_video_meta_name ON video_meta (name)')
+	return engine
+
+
+def test_load_inline(engine):
+	load(engine, 500, seed=1)
+	load(engine, 200, seed=1, truncate=True, start_id=1000)
+	assert engine.execute('SELECT count(*), min(id) FROM video_model').fetchone() == (200, 1000)
+	row = engine.execute('SELECT id, name, views, likes FROM video_model ORDER BY id LIMIT 1').fetchone()
+	assert tuple(row) == next(generate(1, seed=1, start_id=1000))
+	assert engine.execute('PRAGMA journal_mode').scalar() == 'delete'
+
+
+def test_load_split_rebuilds_indexes(engine):
+	load(engine, 300, layout='split', seed=2)
+	assert engine.execute('SELECT count(*) FROM video_meta').scalar() == 300
+	assert engine.execute('SELECT sum(views) FROM video_counters').scalar() == sum(
+		views for _, _, views, _ in generate(300, seed=2))
+	assert engine.execute("SELECT count(*) FROM sqlite_master WHERE name = 'ix_video_meta_name'").scalar() == 1
+	assert engine.execute("SELECT count(*) FROM sqlite_stat1").scalar() > 0
+
+
+def test_failed_load_rolls_back(engine):
+	load(engine, 10, seed=3)
+	with pytest.raises(sqlite3.IntegrityError):
+		load(engine, 10, seed=3)  # duplicate ids
+	assert engine.execute('SELECT count(*) FROM video_model').scalar() == 10
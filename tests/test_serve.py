@@ -0,0 +1,114 @@
+import socket
+import threading
+import time
+
+import pytest
+from flask import Flask
+
+from Flask_Rest_API.serve import PooledWSGIServer
+
+
+REQUEST = b'GET / HTTP/1.1\r\nHost: test\r\n\r\n'
+
+
+def make_app():
+	app = Flask(__name__)
+	app.route('/')(lambda: 'ok')
+
+	@app.route('/slow')
+	def slow():
+		time.sleep(0.3)
+		return 'ok'
+	return app
+
+
+@pytest.fixture
+def serve():
+	servers = []
+
+	def start(**options):
+		server = PooledWSGIServer('127.0.0.1', 0, make_app(), reuse_port=False, **options)
+		threading.Thread(target=server.serve_forever, daemon=True).start()
+		servers.append(server)
+		return server
+	yield start
+	for server in servers:
+		server.shutdown()
+		server.drain()
+		server.server_close()
+
+
+def connect(server):
+	return socket.create_connection(server.server_address, timeout=2)
+
+
+def read_response(conn):
+	data = b''
+	while not data.endswith(b'ok'):
+		chunk = conn.recv(4096)
+		if not chunk:
+			break
+		data += chunk
+	return data
+
+
+def test_idle_keepalive_connections_do_not_hold_threads(serve):
+	server = serve(threads=2)
+	idle = [connect(server) for _ in range(2)]
+	for conn in idle:
+		conn.sendall(REQUEST)
+		assert read_response(conn).startswith(b'HTTP/1.1 200')
+	third = connect(server)
+	third.sendall(REQUEST)
+	assert read_response(third).startswith(b'HTTP/1.1 200')
+	# The parked connections are still usable.
+	idle[0].sendall(REQUEST)
+	assert read_response(idle[0]).startswith(b'HTTP/1.1 200')
+
+
+def test_pipelined_requests(serve):
+	conn = connect(serve(threads=1))
+	conn.sendall(REQUEST * 3)
+	data = b''
+	while data.count(b'ok') < 3:
+		data += conn.recv(4096)
+	assert data.count(b'HTTP/1.1 200') == 3
+
+
+def test_idle_connection_closed_after_keepalive(serve):
+	conn = connect(serve(keepalive=0.2))
+	conn.sendall(REQUEST)
+	read_response(conn)
+	started = time.monotonic()
+	assert conn.recv(4096) == b''
+	assert time.monotonic() - started < 1.5
+
+
+def test_connection_close_header(serve):
+	conn = connect(serve())
+	conn.sendall(b'GET / HTTP/1.1\r\nHost: test\r\nConnection: close\r\n\r\n')
+	assert read_response(conn).startswith(b'HTTP/1.1 200')
+	assert conn.recv(4096) == b''
+
+
+def test_drain_closes_idle_connections(serve):
+	server = serve(keepalive=60)
+	conn = connect(server)
+	conn.sendall(REQUEST)
+	read_response(conn)
+	server.shutdown()
+	started = time.monotonic()
+	server.drain()
+	assert time.monotonic() - started < 1
+	assert conn.recv(4096) == b''
+
+
+def test_drain_finishes_in_flight_requests(serve):
+	server = serve()
+	conn = connect(server)
+	conn.sendall(b'GET /slow HTTP/1.1\r\nHost: test\r\n\r\n')
+	time.sleep(0.1)
+	server.shutdown()
+	server.drain()
+	assert read_response(conn).startswith(b'HTTP/1.1 200')
+	assert conn.recv(4096) == b''
@@ -0,0 +1,79 @@
+import os
+
+import pytest
+
+from Flask_Rest_API.sharding import HashRing, ShardedRepository, reshard, shard_urls
+
+
+SHARDS = 3
+
+
+@pytest.fixture
+def client(make_app, tmp_path):
+	app = make_app(VIDEO_STORAGE='sharded', VIDEO_SHARDS=SHARDS, VIDEO_SHARD_PATH=str(tmp_path / 'shard-{}.db'))
+	client = app.test_client()
+	for video_id in range(1, 11):
+		assert client.put('/video/%d' % video_id, data={'name': 'v%d' % video_id, 'views': video_id, 'likes': 0}).status_code == 201
+	client.repository = app.extensions['video_repository']
+	return client
+
+
+def test_list_scans_every_shard(client):
+	response = client.get('/videos?limit=4')
+	assert response.status_code == 200
+	assert [video['id'] for video in response.get_json()] == [1, 2, 3, 4]
+	assert response.headers['X-Query-Count'] == str(SHARDS)
+
+	response = client.get('/videos?after=8')
+	assert [video['id'] for video in response.get_json()] == [9, 10]
+
+
+def test_list_by_ids_queries_the_shards_involved(client):
+	ring = client.repository.ring
+	ids = [1, 5, 7, 10]
+	response = client.get('/videos?ids=' + ','.join(map(str, ids)))
+	assert response.status_code == 200
+	assert [video['id'] for video in response.get_json()] == ids
+	assert response.headers['X-Query-Count'] == str(len(set(ring.shard_for(video_id) for video_id in ids)))
+
+	response = client.get('/videos?ids=4')
+	assert response.headers['X-Query-Count'] == '1'
+
+
+def test_point_operations(client):
+	assert client.get('/video/3').headers['X-Query-Count'] == '1'
+	response = client.post('/video/3/increment', data={'views': 2})
+	assert response.get_json()['views'] == 5
+	assert response.headers['X-Query-Count'] == '2'
+
+
+def test_ring_only_moves_keys_to_new_shard():
+	before, after = HashRing(4), HashRing(5)
+	for video_id in range(1000):
+		shard = after.shard_for(video_id)
+		assert shard == before.shard_for(video_id) or shard == 4
+
+
+def test_reshard(tmp_path):
+	old = shard_urls(str(tmp_path), 'shard-{}.db', 2)
+	new = shard_urls(str(tmp_path), 'shard-{}.db', 3)
+	repository = ShardedRepository(old)
+	for video_id in range(1, 101):
+		repository.create(video_id, 'v%d' % video_id, video_id, 0)
+
+	moved = reshard(old, new, batch_size=7)
+	assert 0 < moved < 100
+	assert reshard(old, new) == 0
+
+	resharded = ShardedRepository(new)
+	assert [record['id'] for record in resharded.scan(limit=1000)] == list(range(1, 101))
+	for video_id in range(1, 101):
+		shard = resharded.ring.shard_for(video_id)
+		with resharded.engines[shard].connect() as conn:
+			assert conn.execute('SELECT name FROM video_model WHERE id = ?', video_id).scalar() == 'v%d' % video_id
+
+
+def test_default_shards_are_in_instance_folder(make_app):
+	app = make_app(VIDEO_STORAGE='sharded', VIDEO_SHARDS=2)
+	assert app.extensions['video_repository'].urls == [
+		'sqlite:///' + os.path.join(app.instance_path, 'shard-%d.db' % shard) for shard in range(2)]
@@ -0,0 +1,53 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+from flask_restful import marshal
+
+from Flask_Rest_API.benchmarks.startup import parse_importtime
+from Flask_Rest_API.core import resource_fields
+from Flask_Rest_API.models import VideoModel
+
+OPTIONAL = ('Flask_Rest_API.admission', 'Flask_Rest_API.ratelimit', 'Flask_Rest_API.profiling',
+	'Flask_Rest_API.capture', 'Flask_Rest_API.metrics', 'Flask_Rest_API.tracing', 'Flask_Rest_API.accesslog',
+	'flask_restful.inputs', 'pytz', 'aniso8601')
+
+CHILD = """
+import json, sys
+from Flask_Rest_API import create_app
+create_app({'TESTING': True, 'CREATE_TABLES': True}).test_client().get('/video/1')
+json.dump(sorted(sys.modules), sys.stdout)
+"""
+
+
+def test_default_app_skips_optional_imports():
+	env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+	env.pop('FLASK_REST_API_SETTINGS', None)
+	output = subprocess.run([sys.executable, '-c', CHILD], env=env, stdout=subprocess.PIPE, check=True).stdout
+	modules = set(json.loads(output))
+	assert 'Flask_Rest_API.core' in modules
+	assert modules.isdisjoint(OPTIONAL)
+
+
+@pytest.mark.parametrize('record', [
+	{'id': 1, 'name': 'a', 'views': 2, 'likes': 3},
+	{'id': 1, 'name': None, 'views': None, 'likes': 3},
+	{'id': '4', 'name': 5, 'views': 6.0, 'likes': 0},
+	VideoModel(id=1, name='a', views=2, likes=3),
+])
+def test_fields_match_flask_restful(record):
+	from flask_restful import fields
+	reference = {'id': fields.Integer, 'name': fields.String, 'views': fields.Integer, 'likes': fields.Integer}
+	assert marshal(record, resource_fields) == marshal(record, reference)
+
+
+def test_parse_importtime():
+	stderr = '\n'.join([
+		'import time: self [us] | cumulative | imported package',
+		'import time:       120 |        120 |   _io',
+		'import time:      2500 |      10400 | flask',
+		'some other line',
+	])
+	assert parse_importtime(stderr) == [('   _io', 120, 120), (' flask', 2500, 10400)]
@@ -0,0 +1,101 @@
+import pytest
+
+from Flask_Rest_API import db
+from Flask_Rest_API.storage import MemoryRepository, VideoExists, VideoRepository, get_repository
+
+
+ENGINES = {
+	'inline': {},
+	'split': {'VIDEO_COUNTER_LAYOUT': 'split'},
+	'memory': {'VIDEO_STORAGE': 'memory'},
+}
+
+
+@pytest.fixture(params=sorted(ENGINES) + ['sharded'])
+def repository(request, make_app, tmp_path):
+	config = dict(ENGINES.get(request.param, {}))
+	if request.param == 'sharded':
+		config.update(VIDEO_STORAGE='sharded', VIDEO_SHARDS=3, VIDEO_SHARD_PATH=str(tmp_path / 'shard-{}.db'))
+	app = make_app(**config)
+	with app.app_context():
+		yield get_repository()
+		db.session.remove()
+
+
+def test_create_and_get(repository):
+	assert repository.create(1, 'one', 10, 2) == {'id': 1, 'name': 'one', 'views': 10, 'likes': 2}
+	assert repository.get(1) == {'id': 1, 'name': 'one', 'views': 10, 'likes': 2}
+	assert repository.get(2) is None
+
+
+def test_create_existing_raises(repository):
+	repository.create(1, 'one', 0, 0)
+	with pytest.raises(VideoExists):
+		repository.create(1, 'again', 0, 0)
+	assert repository.get(1)['name'] == 'one'
+
+
+def test_get_many_skips_missing(repository):
+	for video_id in (1, 2, 3):
+		repository.create(video_id, 'v%d' % video_id, video_id, 0)
+	assert repository.get_many([3, 1, 9]) == {
+		1: {'id': 1, 'name': 'v1', 'views': 1, 'likes': 0},
+		3: {'id': 3, 'name': 'v3', 'views': 3, 'likes': 0},
+	}
+	assert repository.get_many([]) == {}
+
+
+def test_update(repository):
+	repository.create(1, 'one', 10, 2)
+	assert repository.update(1, name='uno') == {'id': 1, 'name': 'uno', 'views': 10, 'likes': 2}
+	assert repository.update(1, views=50, likes=7) == {'id': 1, 'name': 'uno', 'views': 50, 'likes': 7}
+	assert repository.get(1) == {'id': 1, 'name': 'uno', 'views': 50, 'likes': 7}
+	assert repository.update(2, name='missing') is None
+
+
+def test_increment(repository):
+	repository.create(1, 'one', 10, 2)
+	assert repository.increment(1, views=5) == {'id': 1, 'name': 'one', 'views': 15, 'likes': 2}
+	assert repository.increment(1, likes=3) == {'id': 1, 'name': 'one', 'views': 15, 'likes': 5}
+	assert repository.increment(2, views=1) is None
+
+
+def test_scan_pages_in_id_order(repository):
+	for video_id in (5, 1, 9, 3, 7):
+		repository.create(video_id, 'v%d' % video_id, 0, 0)
+	assert [record['id'] for record in repository.scan(limit=3)] == [1, 3, 5]
+	assert [record['id'] for record in repository.scan(after=5, limit=3)] == [7, 9]
+	assert repository.scan(after=9) == []
+
+
+def test_repository_interface_is_abstract():
+	with pytest.raises(TypeError):
+		VideoRepository()
+
+	class Partial(VideoRepository):
+		def get(self, video_id):
+			return None
+
+	with pytest.raises(TypeError):
+		Partial()
+
+
+def test_memory_scan_uses_sorted_index():
+	repository = MemoryRepository()
+	for video_id in (30, 10, 20):
+		repository.create(video_id, 'v', 0, 0)
+	assert repository.ids == [10, 20, 30]
+	assert [record['id'] for record in repository.scan(after=10)] == [20, 30]
+	assert [record['id'] for record in repository.scan(after=15, limit=1)] == [20]
+
+
+def test_split_updates_without_returning(make_app, monkeypatch):
+	from Flask_Rest_API import storage
+	monkeypatch.setattr(storage, 'SQLITE_RETURNING', False)
+	with make_app(VIDEO_COUNTER_LAYOUT='split').app_context():
+		repository = get_repository()
+		repository.create(1, 'one', 1, 0)
+		assert repository.update(1, name='uno', likes=4) == {'id': 1, 'name': 'uno', 'views': 1, 'likes': 4}
+		assert repository.increment(1, views=2) == {'id': 1, 'name': 'uno', 'views': 3, 'likes': 4}
+		assert repository.update(2, name='missing') is None
+		db.session.remove()
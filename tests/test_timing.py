@@ -0,0 +1,29 @@
+import re
+
+from Flask_Rest_API.timing import phase
+
+
+def timings(response):
+	header = response.headers['Server-Timing']
+	return dict((name, float(value)) for name, value in re.findall(r'(\w+);dur=([\d.]+)', header))
+
+
+def test_server_timing_phases(make_app):
+	app = make_app(SERVER_TIMING_SAMPLE_RATE=1.0)
+	client = app.test_client()
+	put = timings(client.put('/video/1', data={'name': 'a', 'views': 1, 'likes': 0}))
+	assert set(put) == {'parse', 'db', 'marshal', 'encode', 'app'}
+	get = timings(client.get('/video/1'))
+	assert set(get) == {'db', 'marshal', 'encode', 'app'}
+	assert get['app'] >= get['db'] + get['marshal'] + get['encode'] - 0.01
+
+
+def test_unsampled_requests_have_no_header(make_app):
+	client = make_app(SERVER_TIMING_SAMPLE_RATE=0.0).test_client()
+	assert 'Server-Timing' not in client.get('/video/1').headers
+
+
+def test_phase_outside_a_request():
+	with phase('parse') as timed:
+		pass
+	assert timed.timings is None
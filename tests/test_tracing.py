@@ -0,0 +1,125 @@
+import json
+import os
+import socket
+import time
+
+import pytest
+
+from Flask_Rest_API import db, worker_exit
+from Flask_Rest_API.accesslog import JSONLWriter
+from Flask_Rest_API.tracing import UDPWriter, span_writer
+
+TRACEPARENT = '00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01'
+
+
+@pytest.fixture
+def traced(make_app, tmp_path):
+	def make(**config):
+		settings = {'TRACING': True, 'TRACE_SAMPLE_RATE': 0.0, 'TRACE_SLOW_MS': 10000,
+			'TRACE_EXPORT': str(tmp_path / 'traces.jsonl')}
+		settings.update(config)
+		app = make_app(**settings)
+		exported = []
+		app.extensions['tracer'].writer.put = exported.append
+		app.test_client().put('/video/1', data={'name': 'a', 'views': 1, 'likes': 0})
+		del exported[:]
+		return app.test_client(), exported
+	return make
+
+
+def test_fast_unsampled_requests_are_dropped(traced):
+	client, exported = traced()
+	response = client.get('/video/1')
+	assert len(response.headers['X-Trace-Id']) == 32
+	assert exported == []
+
+
+def test_sampled_trace_has_nested_spans(traced):
+	client, exported = traced(TRACE_SAMPLE_RATE=1.0)
+	response = client.get('/video/1')
+	names = [record['name'] for record in exported]
+	assert 'Video.get' in names and 'sql' in names
+	assert set(record['trace_id'] for record in exported) == {response.headers['X-Trace-Id']}
+	root = next(record for record in exported if record['name'] == 'Video.get')
+	assert root['parent_id'] is None
+	assert root['attributes']['status'] == 200
+
+
+def test_slow_requests_are_kept(traced):
+	client, exported = traced(TRACE_SLOW_MS=0)
+	client.get('/video/1')
+	assert any(record['name'] == 'Video.get' for record in exported)
+
+
+def test_traceparent_honored_only_from_trusted_peers(traced):
+	client, exported = traced()
+	response = client.get('/video/1', headers={'traceparent': TRACEPARENT})
+	assert response.headers['X-Trace-Id'] == '0af7651916cd43dd8448eb211c80319c'
+	assert exported == []
+
+	client, exported = traced(TRACE_TRUSTED_PEERS=['127.0.0.1'])
+	client.get('/video/1', headers={'traceparent': TRACEPARENT})
+	root = next(record for record in exported if record['name'] == 'Video.get')
+	assert root['trace_id'] == '0af7651916cd43dd8448eb211c80319c'
+	assert root['parent_id'] == 'b7ad6b7169203331'
+
+
+def test_failed_statement_span_ends_with_error(traced):
+	client, exported = traced(TRACE_SAMPLE_RATE=1.0)
+	assert client.put('/video/1', data={'name': 'a', 'views': 1, 'likes': 0}).status_code == 409
+	failed = [record for record in exported if record['name'] == 'sql' and 'error' in record['attributes']]
+	assert len(failed) == 1
+	assert failed[0]['attributes']['error'] == 'IntegrityError'
+	assert failed[0]['attributes']['statement'].lstrip().startswith('INSERT')
+	with client.application.app_context():
+		with db.engine.connect() as conn:
+			assert 'trace_spans' not in conn.info
+			assert not conn.info.get('statement_info')
+
+
+def test_server_errors_are_kept(make_app):
+	app = make_app(TRACING=True, TRACE_SAMPLE_RATE=0.0, TRACE_SLOW_MS=10000)
+	tracer = app.extensions['tracer']
+	root = {'duration_ms': 1.0, 'attributes': {'status': 200}}
+	assert not tracer.keep(root, False)
+	assert tracer.keep(dict(root, attributes={'status': 503}), False)
+	assert tracer.keep(dict(root, attributes={'status': 200, 'error': 'OperationalError'}), False)
+
+
+def test_file_export_uses_jsonl_writer(make_app, tmp_path):
+	path = tmp_path / 'traces.jsonl'
+	app = make_app(TRACING=True, TRACE_SAMPLE_RATE=1.0, TRACE_EXPORT=str(path), TRACE_FLUSH_INTERVAL=0.01)
+	assert type(app.extensions['tracer'].writer) is JSONLWriter
+	app.test_client().get('/video/1')
+	deadline = time.time() + 5
+	while not (path.exists() and path.read_text()) and time.time() < deadline:
+		time.sleep(0.01)
+	names = [json.loads(line)['name'] for line in path.read_text().splitlines()]
+	assert 'Video.get' in names
+
+
+def test_worker_exit_writes_queued_spans(make_app, tmp_path):
+	path = tmp_path / 'traces.jsonl'
+	app = make_app(TRACING=True, TRACE_SAMPLE_RATE=1.0, TRACE_EXPORT=str(path), TRACE_FLUSH_INTERVAL=60)
+	app.test_client().get('/video/1')
+	worker_exit(app)
+	assert 'Video.get' in [json.loads(line)['name'] for line in path.read_text().splitlines()]
+
+
+def test_relative_export_is_in_instance_folder(make_app):
+	app = make_app(TRACING=True)
+	assert app.extensions['tracer'].writer.path == os.path.join(app.instance_path, 'traces.jsonl')
+
+
+def test_udp_writer_sends_datagrams():
+	receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+	receiver.bind(('127.0.0.1', 0))
+	receiver.settimeout(5)
+	try:
+		writer = span_writer('udp://127.0.0.1:%d' % receiver.getsockname()[1])
+		assert isinstance(writer, UDPWriter)
+		writer.write([{'name': 'a'}, {'name': 'b'}])
+		lines = receiver.recv(65536).decode().splitlines()
+	finally:
+		receiver.close()
+	assert [json.loads(line)['name'] for line in lines] == ['a', 'b']
@@ -0,0 +1,73 @@
+import pytest
+from flask_restful import reqparse
+from werkzeug.exceptions import BadRequest
+
+from Flask_Rest_API.core import video_increment_args, video_put_args, video_update_args
+from Flask_Rest_API.validation import Field, Schema, ValidationError
+
+
+def reqparse_put_args():
+	parser = reqparse.RequestParser()
+	parser.add_argument("name", type=str, help="Name of the video is required", required=True)
+	parser.add_argument("views", type=int, help="Views of the video", required=True)
+	parser.add_argument("likes", type=int, help="Likes on the video", required=True)
+	return parser
+
+
+def parse(app, parser, **request):
+	with app.test_request_context('/video/1', method='PUT', **request):
+		try:
+			return dict(parser.parse_args())
+		except BadRequest as e:
+			return e.data
+
+
+@pytest.mark.parametrize('request_kwargs', [
+	{'data': {'name': 'a', 'views': '1', 'likes': '2'}},
+	{'data': {'name': 'a', 'views': '1'}},
+	{'data': {'name': 'a', 'views': 'x', 'likes': '2'}},
+	{'query_string': {'name': 'a', 'views': '1', 'likes': '2'}},
+	{'json': {'name': 'a', 'views': 1, 'likes': 2}},
+	{'json': {'name': 'a', 'views': '7', 'likes': 2}},
+	{'json': {'views': 1, 'likes': 2}},
+])
+def test_matches_reqparse(app, request_kwargs):
+	assert parse(app, video_put_args, **request_kwargs) == parse(app, reqparse_put_args(), **request_kwargs)
+
+
+def test_json_body_must_be_an_object(client):
+	response = client.put('/video/1', json=[1, 2])
+	assert response.status_code == 400
+	assert response.get_json() == {'message': "Request body must be a JSON object"}
+
+
+def test_put_errors_name_the_field(client):
+	response = client.put('/video/1', data={'name': 'a', 'views': 'many', 'likes': 0})
+	assert response.status_code == 400
+	assert response.get_json() == {'message': {'views': "Views of the video"}}
+
+
+def test_patch_validates_once(client, monkeypatch):
+	client.put('/video/1', data={'name': 'a', 'views': 1, 'likes': 0})
+	calls = []
+	validate = video_update_args.validate
+	monkeypatch.setattr(video_update_args, 'validate', lambda data: calls.append(data) or validate(data))
+	assert client.patch('/video/1', data={'views': 5}).status_code == 200
+	assert len(calls) == 1
+	response = client.patch('/video/1', data={'views': 'many'})
+	assert response.status_code == 400
+	assert response.get_json() == {'message': {'views': "Views of the video"}}
+	assert len(calls) == 2
+
+
+def test_optional_fields_and_defaults():
+	assert video_update_args.validate({'views': '3'}) == {'name': None, 'views': 3, 'likes': None}
+	assert video_increment_args.validate({}) == {'views': 0, 'likes': 0}
+	assert video_update_args.validate({'name': None}) == {'name': None, 'views': None, 'likes': None}
+
+
+def test_validation_error():
+	schema = Schema(Field('count', type=int, required=True))
+	with pytest.raises(ValidationError) as error:
+		schema.validate({})
+	assert (error.value.field, error.value.message) == ('count', "Missing required parameter count")
@@ -0,0 +1,101 @@
+import random
+import time
+from functools import wraps
+
+import flask_restful
+from flask import g, has_request_context
+from flask_restful.representations.json import output_json
+from flask_restful.utils import unpack
+
+from Flask_Rest_API.spans import span
+
+
+class phase(object):
+	"""Add the time spent in the block to the sampled request's ``name`` phase.
+
+	The block is also traced as a span of the same name.
+	"""
+
+	def __init__(self, name):
+		self.name = name
+		self.timings = None
+		self.span = span(name)
+
+	def __enter__(self):
+		self.span.__enter__()
+		if has_request_context():
+			self.timings = g.get('server_timing')
+			if self.timings is not None:
+				self.start = time.perf_counter()
+		return self
+
+	def __exit__(self, *exc_info):
+		if self.timings is not None:
+			self.timings[self.name] = self.timings.get(self.name, 0.0) + time.perf_counter() - self.start
+		self.span.__exit__(*exc_info)
+
+
+def parse_args(parser):
+	with phase('parse'):
+		return parser.parse_args()
+
+
+class marshal_with(flask_restful.marshal_with):
+	"""``flask_restful.marshal_with`` that times the marshalling step alone."""
+
+	def __call__(self, f):
+		@wraps(f)
+		def wrapper(*args, **kwargs):
+			resp = f(*args, **kwargs)
+			with phase('marshal'):
+				if isinstance(resp, tuple):
+					data, code, headers = unpack(resp)
+					return flask_restful.marshal(data, self.fields, self.envelope), code, headers
+				return flask_restful.marshal(resp, self.fields, self.envelope)
+		return wrapper
+
+
+def timed_output_json(data, code, headers=None):
+	with phase('encode'):
+		return output_json(data, code, headers)
+
+
+class ServerTiming(object):
+	"""Adds a ``Server-Timing`` header to a sample of responses.
+
+	A ``SERVER_TIMING_SAMPLE_RATE`` share of requests record the time spent
+	parsing arguments, in SQL (from the query counter), marshalling and
+	encoding JSON, plus the whole handler as ``app``, all in milliseconds.
+	"""
+
+	def __init__(self, app=None):
+		self.sample_rate = 0.0
+		if app is not None:
+			self.init_app(app)
+
+	def init_app(self, app):
+		self.sample_rate = app.config.get('SERVER_TIMING_SAMPLE_RATE', 0.0)
+		if not self.sample_rate:
+			return
+		app.before_request(self.start_request)
+		app.after_request(self.add_header)
+		app.extensions['server_timing'] = self
+
+	def init_api(self, api):
+		# Also installed when unsampled so traces get an encode span.
+		api.representations['application/json'] = timed_output_json
+
+	def start_request(self):
+		if self.sample_rate >= 1 or random.random() < self.sample_rate:
+			g.server_timing = {}
+			g.server_timing_start = time.perf_counter()
+
+	def add_header(self, response):
+		timings = g.get('server_timing')
+		if timings is None:
+			return response
+		timings['db'] = g.get('db_time', 0.0)
+		timings['app'] = time.perf_counter() - g.server_timing_start
+		response.headers['Server-Timing'] = ', '.join('%s;dur=%.3f' % (name, timings[name] * 1000)
+			for name in ('parse', 'db', 'marshal', 'encode', 'app') if name in timings)
+		return response
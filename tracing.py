@@ -0,0 +1,211 @@
+import json
+import random
+import re
+import socket
+import time
+
+from flask import g, request
+from sqlalchemy import event
+
+from Flask_Rest_API import instance_file
+from Flask_Rest_API.accesslog import JSONLWriter
+from Flask_Rest_API.metrics import resource_name
+from Flask_Rest_API.spans import current_span
+from Flask_Rest_API.storage import get_engines, statement_info
+
+
+TRACEPARENT = re.compile(r'^[0-9a-f]{2}-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+TRACE_ID = re.compile(r'^[0-9a-fA-F]{1,32}$')
+
+# Spans kept per request, so a runaway loop of queries can't grow a trace without bound.
+MAX_TRACE_SPANS = 1000
+
+
+def _new_id(bits):
+	return '%0*x' % (bits // 4, random.getrandbits(bits))
+
+
+class Span(object):
+	__slots__ = ('trace', 'trace_id', 'span_id', 'parent_id', 'name', 'attributes', 'start', 'started')
+
+	def __init__(self, trace, name, trace_id, parent_id=None, attributes=None):
+		self.trace = trace
+		self.trace_id = trace_id
+		self.span_id = _new_id(64)
+		self.parent_id = parent_id
+		self.name = name
+		self.attributes = attributes or {}
+		self.start = time.time()
+		self.started = time.perf_counter()
+
+	def child(self, name, **attributes):
+		return Span(self.trace, name, self.trace_id, self.span_id, attributes)
+
+	def finish(self):
+		record = {
+			'trace_id': self.trace_id,
+			'span_id': self.span_id,
+			'parent_id': self.parent_id,
+			'name': self.name,
+			'start': self.start,
+			'duration_ms': (time.perf_counter() - self.started) * 1000,
+			'attributes': self.attributes,
+		}
+		if len(self.trace) < MAX_TRACE_SPANS:
+			self.trace.append(record)
+		return record
+
+
+class UDPWriter(JSONLWriter):
+	"""``JSONLWriter`` sending each batch as datagrams to ``(host, port)``."""
+
+	def __init__(self, address, **kwargs):
+		self.address = address
+		JSONLWriter.__init__(self, 'udp://%s:%d' % address, **kwargs)
+
+	def write(self, batch):
+		lines = [json.dumps(record, default=str) for record in batch]
+		sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+		try:
+			# Keep each datagram under the usual 64 KiB UDP limit.
+			chunk, size = [], 0
+			for line in lines:
+				if chunk and size + len(line) > 60000:
+					sock.sendto('\n'.join(chunk).encode(), self.address)
+					chunk, size = [], 0
+				chunk.append(line)
+				size += len(line) + 1
+			sock.sendto('\n'.join(chunk).encode(), self.address)
+		finally:
+			sock.close()
+
+
+def span_writer(target, **kwargs):
+	"""A ``JSONLWriter`` for a JSONL path, or a ``UDPWriter`` for ``udp://host:port``."""
+	if target.startswith('udp://'):
+		host, _, port = target[len('udp://'):].rpartition(':')
+		return UDPWriter((host, int(port)), **kwargs)
+	return JSONLWriter(target, **kwargs)
+
+
+class Tracer(object):
+	"""Request tracing with spans for SQL statements, cache calls and serialization.
+
+	Every request collects its spans in memory and the decision to keep them
+	is made when it ends (tail sampling): a trace is exported when the
+	request took at least ``TRACE_SLOW_MS``, failed with a 5xx or an
+	exception, was picked for the ``TRACE_SAMPLE_RATE`` share of requests, or
+	arrived with a W3C ``traceparent`` whose sampled flag is set from one of
+	``TRACE_TRUSTED_PEERS``; other clients can't force a trace. The trace id
+	is taken from ``traceparent`` or ``X-Trace-Id`` when present and is
+	returned in ``X-Trace-Id``. Kept spans are written by a ``JSONLWriter``
+	to ``TRACE_EXPORT``, a JSONL path relative to the instance folder or
+	``udp://host:port``.
+	"""
+
+	def __init__(self, app=None):
+		self.writer = None
+		if app is not None:
+			self.init_app(app)
+
+	def init_app(self, app):
+		self.sample_rate = app.config.get('TRACE_SAMPLE_RATE', 0.01)
+		self.slow_ms = app.config.get('TRACE_SLOW_MS', 250)
+		self.trusted_peers = frozenset(app.config.get('TRACE_TRUSTED_PEERS') or ())
+		target = app.config.get('TRACE_EXPORT', 'traces.jsonl')
+		if not target.startswith('udp://'):
+			target = instance_file(app, target)
+		self.writer = span_writer(target, max_bytes=app.config.get('TRACE_MAX_BYTES', 10 * 1024 * 1024),
+			backups=app.config.get('TRACE_BACKUPS', 5),
+			batch_size=app.config.get('TRACE_BATCH_SIZE', 256),
+			flush_interval=app.config.get('TRACE_FLUSH_INTERVAL', 1.0),
+			max_queue=app.config.get('TRACE_QUEUE_SIZE', 10000))
+		for engine in get_engines(app):
+			event.listen(engine, 'before_cursor_execute', self.before_cursor_execute)
+			event.listen(engine, 'after_cursor_execute', self.after_cursor_execute)
+			event.listen(engine, 'handle_error', self.handle_error)
+		app.before_request(self.start_request)
+		app.after_request(self.add_header)
+		app.teardown_request(self.end_request)
+		app.extensions['tracer'] = self
+
+	def post_fork(self):
+		self.writer.post_fork()
+
+	def stop(self):
+		self.writer.stop()
+
+	def start_request(self):
+		trace_id = parent_id = None
+		sampled = random.random() < self.sample_rate
+		match = TRACEPARENT.match(request.headers.get('traceparent', ''))
+		if match:
+			trace_id, parent_id = match.group(1), match.group(2)
+			if request.remote_addr in self.trusted_peers:
+				sampled = sampled or bool(int(match.group(3), 16) & 1)
+		elif TRACE_ID.match(request.headers.get('X-Trace-Id', '')):
+			trace_id = request.headers['X-Trace-Id'].lower().zfill(32)
+		root = Span([], resource_name(), trace_id or _new_id(128), parent_id,
+			dict(request.view_args or {}, method=request.method, path=request.path))
+		g.trace_sampled = sampled
+		g.trace_span = root
+		g.trace_token = current_span.set(root)
+
+	def add_header(self, response):
+		root = g.get('trace_span')
+		if root is not None:
+			root.attributes['status'] = response.status_code
+			response.headers['X-Trace-Id'] = root.trace_id
+		return response
+
+	def end_request(self, exc=None):
+		root = g.pop('trace_span', None)
+		if root is None:
+			return
+		if exc is not None:
+			root.attributes['error'] = type(exc).__name__
+		current_span.reset(g.pop('trace_token'))
+		record = root.finish()
+		if self.keep(record, g.pop('trace_sampled')):
+			for span_record in root.trace:
+				self.writer.put(span_record)
+
+	def keep(self, root, sampled):
+		attributes = root['attributes']
+		return (sampled or root['duration_ms'] >= self.slow_ms or 'error' in attributes
+			or attributes.get('status', 200) >= 500)
+
+	def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+		parent = current_span.get()
+		if parent is not None:
+			statement_info(conn, context)['trace_span'] = parent.child('sql', statement=statement[:200])
+
+	def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+		sql_span = statement_info(conn, context).pop('trace_span', None)
+		if sql_span is not None:
+			sql_span.finish()
+
+	def handle_error(self, exception_context):
+		if exception_context.connection is None:
+			return
+		sql_span = statement_info(exception_context.connection, exception_context.execution_context).pop('trace_span', None)
+		if sql_span is not None:
+			sql_span.attributes['error'] = type(exception_context.original_exception).__name__
+			sql_span.finish()
+
+
+if __name__ == "__main__":
+	import argparse
+
+	parser = argparse.ArgumentParser(description="Collect spans sent to udp://host:port into a JSONL file")
+	parser.add_argument("--bind", default="127.0.0.1:6831")
+	parser.add_argument("--out", default="traces.jsonl")
+	args = parser.parse_args()
+	host, _, port = args.bind.rpartition(':')
+	sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+	sock.bind((host, int(port)))
+	with open(args.out, 'a') as out:
+		while True:
+			data, _ = sock.recvfrom(65536)
+			out.write(data.decode() + '\n')
+			out.flush()
@@ -0,0 +1,62 @@
+from flask import request
+from flask_restful import abort
+
+
+class ValidationError(ValueError):
+	def __init__(self, field, message):
+		ValueError.__init__(self, message)
+		self.field = field
+		self.message = message
+
+
+class Field(object):
+	def __init__(self, name, type=str, required=False, default=None, help=None):
+		self.name = name
+		self.type = type
+		self.required = required
+		self.default = default
+		self.help = help
+
+
+class Schema(object):
+	"""Single-pass replacement for a ``reqparse.RequestParser``.
+
+	The field list is compiled once into a tuple of plain values. Each request
+	reads one source: the JSON body when the request is JSON, otherwise the
+	query string and form. Conversion, defaults and error messages follow
+	reqparse: errors abort with ``{"message": {field: help}}`` for the first
+	failing field.
+	"""
+
+	def __init__(self, *fields):
+		self.fields = tuple((field.name, field.type, field.required, field.default,
+			field.help or "Missing required parameter %s" % field.name) for field in fields)
+
+	def validate(self, data):
+		result = {}
+		for name, convert, required, default, help in self.fields:
+			if name not in data:
+				if required:
+					raise ValidationError(name, help)
+				result[name] = default
+				continue
+			value = data[name]
+			if value is not None:
+				try:
+					value = convert(value)
+				except (TypeError, ValueError):
+					raise ValidationError(name, help)
+			result[name] = value
+		return result
+
+	def parse_args(self):
+		if request.is_json:
+			data = request.get_json()
+			if not isinstance(data, dict):
+				abort(400, message="Request body must be a JSON object")
+		else:
+			data = request.values
+		try:
+			return self.validate(data)
+		except ValidationError as e:
+			abort(400, message={e.field: e.message})